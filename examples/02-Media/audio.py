@@ -8,6 +8,7 @@ import os
 from media.media import *   #导入media模块，用于初始化vb buffer
 from media.pyaudio import * #导入pyaudio模块，用于采集和播放音频
 import media.wave as wave   #导入wav模块，用于保存和加载wav音频文件
+from libs.AudioService import AudioPlayer, WavWriter #常驻音频输出服务和流式wav写入
 
 def exit_check():
     try:
@@ -18,6 +19,7 @@ def exit_check():
     return False
 
 def record_audio(filename, duration):
+    wf = None
     CHUNK = 44100//25  #设置音频chunk值
     FORMAT = paInt16       #设置采样精度,支持16bit(paInt16)/24bit(paInt24)/32bit(paInt32)
     CHANNELS = 2           #设置声道数,支持单声道(1)/立体声(2)
@@ -42,62 +44,59 @@ def record_audio(filename, duration):
         #启用音频3A功能：自动噪声抑制(ANS)
         stream.enable_audio3a(AUDIO_3A_ENABLE_ANS)
 
-        frames = []
-        #采集音频数据并存入列表
+        #创建wav文件并写入文件头，采集到的数据块直接写入文件，不在内存中累积
+        #开启1s的双缓冲，SD卡写入卡顿时不阻塞采集
+        wf = WavWriter(filename, CHANNELS, p.get_sample_size(FORMAT), RATE,
+                       buffer_size=CHUNK * CHANNELS * p.get_sample_size(FORMAT) * 25)
         for i in range(0, int(RATE / CHUNK * duration)):
             data = stream.read()
-            frames.append(data)
+            wf.write(data) #存储wav音频数据
             if exit_check():
                 break
-        #将列表中的数据保存到wav文件中
-        wf = wave.open(filename, 'wb') #创建wav 文件
-        wf.set_channels(CHANNELS) #设置wav 声道数
-        wf.set_sampwidth(p.get_sample_size(FORMAT))  #设置wav 采样精度
-        wf.set_framerate(RATE)  #设置wav 采样率
-        wf.write_frames(b''.join(frames)) #存储wav音频数据
-        wf.close() #关闭wav文件
     except BaseException as e:
             print(f"Exception {e}")
     finally:
+        if wf:
+            wf.close() #回填wav文件头中的长度并关闭文件
         stream.stop_stream() #停止采集音频数据
         stream.close()#关闭音频输入流
         p.terminate()#释放音频对象
         MediaManager.deinit() #释放vb buffer
 
-def play_audio(filename):
+#player为常驻的AudioPlayer时直接复用已打开的输出流，连续播放多个文件之间没有重新初始化的间隔
+def play_audio(filename, player=None):
+    own_player = player is None
+    wf = None
     try:
         wf = wave.open(filename, 'rb')#打开wav文件
         CHUNK = int(wf.get_framerate()/25)#设置音频chunk值
 
-        p = PyAudio()
-        p.initialize(CHUNK) #初始化PyAudio对象
-        MediaManager.init()    #vb buffer初始化
-
-        #创建音频输出流，设置的音频参数均为wave中获取到的参数
-        stream = p.open(format=p.get_format_from_width(wf.get_sampwidth()),
-                    channels=wf.get_channels(),
-                    rate=wf.get_framerate(),
-                    output=True,frames_per_buffer=CHUNK)
-
-        #设置音频输出流的音量
-        stream.volume(vol=85)
+        if own_player:
+            #创建音频输出服务，设置的音频参数均为wave中获取到的参数
+            player = AudioPlayer(rate=wf.get_framerate(),
+                        channels=wf.get_channels(),
+                        sample_width=wf.get_sampwidth(),
+                        chunk=CHUNK)
+            player.create()
+            #设置音频输出流的音量
+            player.volume(85)
 
         data = wf.read_frames(CHUNK)#从wav文件中读取数一帧数据
 
         while data:
-            stream.write(data)  #将帧数据写入到音频输出流中
+            player.write(data)  #将帧数据送入播放队列
             data = wf.read_frames(CHUNK) #从wav文件中读取数一帧数据
             if exit_check():
+                player.flush() #丢弃尚未播放的数据
                 break
+        player.wait_done() #等待队列中的数据播放完成
     except BaseException as e:
             print(f"Exception {e}")
     finally:
-        stream.stop_stream() #停止音频输出流
-        stream.close()#关闭音频输出流
-        p.terminate()#释放音频对象
-        wf.close()#关闭wav文件
-
-        MediaManager.deinit() #释放vb buffer
+        if wf:
+            wf.close()#关闭wav文件
+        if own_player and player:
+            player.destroy()#停止播放线程，关闭音频输出流并释放vb buffer
 
 
 def loop_audio(duration):
@@ -157,6 +156,7 @@ def audio_recorder(filename, duration):
     CHANNELS = 1           #设置声道数,支持单声道(1)/立体声(2)
     RATE = 44100           #设置采样率
 
+    wf = None
     p = PyAudio()
     p.initialize(CHUNK)    #初始化PyAudio对象
     MediaManager.init()    #vb buffer初始化
@@ -178,24 +178,20 @@ def audio_recorder(filename, duration):
         print("enable audio 3a:ans")
 
         print("start record...")
-        frames = []
-        #采集音频数据并存入列表
+        #创建wav文件并写入文件头，采集到的数据块直接写入文件，不在内存中累积
+        wf = WavWriter(filename, CHANNELS, p.get_sample_size(FORMAT), RATE,
+                       buffer_size=CHUNK * CHANNELS * p.get_sample_size(FORMAT) * 25)
         for i in range(0, int(RATE / CHUNK * duration)):
             data = input_stream.read()
-            frames.append(data)
+            wf.write(data) #存储wav音频数据
             if exit_check():
                 break
         print("stop record...")
-        #将列表中的数据保存到wav文件中
-        wf = wave.open(filename, 'wb') #创建wav 文件
-        wf.set_channels(CHANNELS) #设置wav 声道数
-        wf.set_sampwidth(p.get_sample_size(FORMAT))  #设置wav 采样精度
-        wf.set_framerate(RATE)  #设置wav 采样率
-        wf.write_frames(b''.join(frames)) #存储wav音频数据
-        wf.close() #关闭wav文件
     except BaseException as e:
             print(f"Exception {e}")
     finally:
+        if wf:
+            wf.close() #回填wav文件头中的长度并关闭文件
         input_stream.stop_stream() #停止采集音频数据
         input_stream.close()#关闭音频输入流
 
@@ -73,7 +73,7 @@ class BodySegmentationApp(AIBase):
     # 绘制分割结果，将创建的mask图像copy到pl.osd_img上
     def draw_result(self,pl,res_img):
         with ScopedTiming("draw osd",self.debug_mode > 0):
-            res_img.copy_to(pl.osd_img)
+            pl.osd_img.copy_from(res_img)
 
 
 if __name__=="__main__":
@@ -197,6 +197,57 @@ class HandKPClassApp(AIBase):
             return gesture_str
 
 # 自定义动态手势识别任务类
+# 定长的logit历史环形缓冲区，维护滑动窗口内logit的累加和，append为O(1)，内存不随运行时间增长
+class LogitHistory:
+    def __init__(self,capacity=20):
+        # 最多保存的帧数
+        self.capacity=capacity
+        # 预分配的logit缓冲区，首次append时根据类别数分配
+        self.buf=None
+        # 窗口内logit的累加和
+        self.total=None
+        # 下一帧写入的位置和当前保存的帧数
+        self.head=0
+        self.count=0
+
+    def __len__(self):
+        return self.count
+
+    # 加入一帧logit，窗口已满时覆盖最旧的一帧
+    def append(self,logit):
+        logit=logit.reshape((-1,))
+        if self.buf is None:
+            self.buf=np.zeros((self.capacity,len(logit)))
+            self.total=np.zeros(len(logit))
+        if self.count==self.capacity:
+            self.total-=self.buf[self.head]
+        else:
+            self.count+=1
+        self.buf[self.head,:]=logit
+        self.total+=logit
+        self.head=(self.head+1)%self.capacity
+        if self.head==0 and self.count==self.capacity:
+            # 每写满一轮重新求和一次，消除浮点累加误差
+            self.total=np.sum(self.buf,axis=0)
+
+    # 最新一帧的logit
+    def last(self):
+        return self.buf[(self.head-1)%self.capacity]
+
+    # 只保留最新一帧
+    def keep_last(self):
+        if self.count==0:
+            return
+        last=self.last().copy()
+        self.clear()
+        self.append(last)
+
+    def clear(self):
+        self.head=0
+        self.count=0
+        if self.total is not None:
+            self.total[:]=0
+
 class DynamicGestureApp(AIBase):
     def __init__(self,kmodel_path,model_input_size,rgb888p_size=[1920,1080],display_size=[1920,1080],debug_mode=0):
         super().__init__(kmodel_path,model_input_size,rgb888p_size,debug_mode)
@@ -285,13 +336,13 @@ class DynamicGestureApp(AIBase):
     def postprocess(self,results,his_logit, history):
         with ScopedTiming("postprocess",self.debug_mode > 0):
             his_logit.append(results[0])
-            avg_logit = sum(np.array(his_logit))
+            # 保持原来(1,C)的形状，draw_result中用output2[0]取出(C,)的一行再按类别索引
+            avg_logit = his_logit.total.reshape((1,len(his_logit.total))).copy()
             idx_ = np.argmax(avg_logit)
             idx = self.gesture_process_output(idx_, history)
             if (idx_ != idx):
-                his_logit_last = his_logit[-1]
-                his_logit = []
-                his_logit.append(his_logit_last)
+                # 只保留最新一帧，原地修改调用者持有的历史
+                his_logit.keep_last()
             return idx, avg_logit
 
     # 手势处理函数
@@ -307,8 +358,9 @@ class DynamicGestureApp(AIBase):
                 if (history[-1] != history[len(history)-2]) :
                     pred = history[-1]
         history.append(pred)
-        if (len(history) > self.max_hist_len) :
-            history = history[-self.max_hist_len:]
+        # 原地裁剪，保证调用者持有的history长度有界
+        while (len(history) > self.max_hist_len) :
+            history.pop(0)
         return history[-1]
 
     # 计算crop参数
@@ -332,7 +384,7 @@ class DynamicGestureApp(AIBase):
     # 重写逆初始化
     def deinit(self):
         with ScopedTiming("deinit",self.debug_mode > 0):
-            del self.kpu
+            self.release_kmodel()
             del self.ai2d_resize
             del self.ai2d_crop
             self.tensors.clear()
@@ -395,7 +447,7 @@ class DynamicGesture:
         self.pre_state = self.TRIGGER
         self.draw_state = self.TRIGGER
         self.vec_flag = []
-        self.his_logit = []
+        self.his_logit = LogitHistory(self.max_hist_len)
         self.history = [2]
         self.s_start = time.time_ns()
         self.m_start=None
@@ -473,7 +525,7 @@ class DynamicGesture:
                             draw_img_np[:self.bin_width,:self.bin_height,:] = self.zuo_argb
                             self.cur_state = self.LEFT
                     self.m_start = time.time_ns()
-            self.his_logit = []
+            self.his_logit.clear()
         else:
             idx,avg_logit=output1,output2[0]
             if (self.cur_state == self.UP):
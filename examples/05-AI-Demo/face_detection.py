@@ -1,4 +1,5 @@
-from libs.PipeLine import PipeLine, ScopedTiming
+from libs.PipeLine import PipeLine, ScopedTiming, InferScheduler
+from libs import Profiler, MemStats
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
 import os
@@ -18,7 +19,8 @@ import aidemo
 # 自定义人脸检测类，继承自AIBase基类
 class FaceDetectionApp(AIBase):
     def __init__(self, kmodel_path, model_input_size, anchors, confidence_threshold=0.5, nms_threshold=0.2, rgb888p_size=[224,224], display_size=[1920,1080], debug_mode=0):
-        super().__init__(kmodel_path, model_input_size, rgb888p_size, debug_mode)  # 调用基类的构造函数
+        # 调用基类的构造函数，后处理由aidemo生成新的检测框列表，不保存kmodel输出，输出复用持久buffer，不再每帧分配新的array
+        super().__init__(kmodel_path, model_input_size, rgb888p_size, debug_mode, output_mode="reuse")
         self.kmodel_path = kmodel_path  # 模型文件路径
         self.model_input_size = model_input_size  # 模型输入分辨率
         self.confidence_threshold = confidence_threshold  # 置信度阈值
@@ -102,19 +104,37 @@ if __name__ == "__main__":
     anchors = np.fromfile(anchors_path, dtype=np.float)
     anchors = anchors.reshape((anchor_len, det_dim))
 
+    # 聚合性能统计，开启后各阶段耗时汇总到预分配的直方图中，每5秒打印一次次数、平均、最大和p95耗时，不再逐帧打印
+    profile = False
+    if profile:
+        Profiler.enable(interval_ms=5000)
+    # 内存统计，开启后每5秒打印各阶段的堆分配、最低空闲堆和GC暂停时间
+    # gc_free_threshold大于0时只有空闲堆低于该值才回收，不再每帧强制回收，例如2*1024*1024
+    mem_profile = False
+    if mem_profile:
+        MemStats.enable(gc_free_threshold=0, interval_ms=5000)
+
     # 初始化PipeLine，用于图像处理流程
     pl = PipeLine(rgb888p_size=rgb888p_size, display_size=display_size, display_mode=display_mode)
     pl.create()  # 创建PipeLine实例
     # 初始化自定义人脸检测实例
     face_det = FaceDetectionApp(kmodel_path, model_input_size=[320, 320], anchors=anchors, confidence_threshold=confidence_threshold, nms_threshold=nms_threshold, rgb888p_size=rgb888p_size, display_size=display_size, debug_mode=0)
     face_det.config_preprocess()  # 配置预处理
-    while True:
+    # 流水线模式，采集、推理、绘制显示在不同线程中并行执行
+    async_mode = False
+    if async_mode:
+        stats = pl.run_async(face_det.run, lambda res: face_det.draw_result(pl, res))
+        print(stats)
+    # 推理调度器，stride为1且不设置目标帧率和帧差阈值时每帧推理
+    # 例如InferScheduler(target_fps=30, diff_thresh=2)可按目标帧率自动跳帧，并在画面静止时跳过推理
+    sched = InferScheduler(stride=1)
+    while not async_mode:
         with ScopedTiming("total",1):
             img = pl.get_frame()            # 获取当前帧数据
-            res = face_det.run(img)         # 推理当前帧
+            res = sched.run(img, face_det.run)  # 推理当前帧，跳过的帧沿用上一次的结果
             face_det.draw_result(pl, res)   # 绘制结果
             pl.show_image()                 # 显示结果
-            gc.collect()                    # 垃圾回收
+            MemStats.collect()              # 垃圾回收，开启内存统计时按GC策略回收
     face_det.deinit()                       # 反初始化
     pl.destroy()                            # 销毁PipeLine实例
 
@@ -1,6 +1,8 @@
 from libs.PipeLine import PipeLine, ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.Tracker import ROITracker
+from libs.FaceDatabase import FaceDatabase, FaceStore
 import os
 import ujson
 from media.media import *
@@ -207,7 +209,7 @@ class FaceRegistrationApp(AIBase):
 
 # 人脸识别任务类
 class FaceRecognition:
-    def __init__(self,face_det_kmodel,face_reg_kmodel,det_input_size,reg_input_size,database_dir,anchors,confidence_threshold=0.25,nms_threshold=0.3,face_recognition_threshold=0.75,rgb888p_size=[1280,720],display_size=[1920,1080],debug_mode=0):
+    def __init__(self,face_det_kmodel,face_reg_kmodel,det_input_size,reg_input_size,database_dir,anchors,confidence_threshold=0.25,nms_threshold=0.3,face_recognition_threshold=0.75,rgb888p_size=[1280,720],display_size=[1920,1080],track_max_age=10,debug_mode=0):
         # 人脸检测模型路径
         self.face_det_kmodel=face_det_kmodel
         # 人脸识别模型路径
@@ -230,14 +232,16 @@ class FaceRecognition:
         self.display_size=[ALIGN_UP(display_size[0],16),display_size[1]]
         # debug_mode模式
         self.debug_mode=debug_mode
-        self.max_register_face = 100                  # 数据库最多人脸个数
         self.feature_num = 128                        # 人脸识别特征维度
-        self.valid_register_face = 0                  # 已注册人脸数
-        self.db_name= []
-        self.db_data= []
+        # 人脸特征数据库，特征归一化后连续存放，查询为一次矩阵乘法
+        self.db=FaceDatabase(self.feature_num,debug_mode=self.debug_mode)
+        # 打包的人脸特征存储(faces.kfdb及其人名表faces.kfdb.names)，由人脸注册任务生成
+        self.store=FaceStore(self.database_dir+"faces.kfdb",self.feature_num)
         self.face_det=FaceDetApp(self.face_det_kmodel,model_input_size=self.det_input_size,anchors=self.anchors,confidence_threshold=self.confidence_threshold,nms_threshold=self.nms_threshold,rgb888p_size=self.rgb888p_size,display_size=self.display_size,debug_mode=0)
         self.face_reg=FaceRegistrationApp(self.face_reg_kmodel,model_input_size=self.reg_input_size,rgb888p_size=self.rgb888p_size,display_size=self.display_size)
         self.face_det.config_preprocess()
+        # 人脸跟踪，同一个人脸每track_max_age帧才重新识别一次，未识别的人脸每帧重新识别，track_max_age为0时每帧都识别
+        self.tracker=ROITracker(max_age=track_max_age,min_score=self.face_recognition_threshold)
         # 人脸数据库初始化
         self.database_init()
 
@@ -245,69 +249,63 @@ class FaceRecognition:
     def run(self,input_np):
         # 执行人脸检测
         det_boxes,landms=self.face_det.run(input_np)
-        recg_res = []
-        for landm in landms:
-            # 针对每个人脸五官点，推理得到人脸特征，并计算特征在数据库中相似度
-            self.face_reg.config_preprocess(landm)
-            feature=self.face_reg.run(input_np)
-            res = self.database_search(feature)
-            recg_res.append(res)
+        tracks=self.tracker.update([[det[0],det[1],det[0]+det[2],det[1]+det[3]] for det in det_boxes])
+        # 只对新出现、识别结果过期或未识别的人脸批量推理得到人脸特征，并一次性计算所有特征在数据库中相似度
+        idx=self.tracker.stale_indices(tracks)
+        if idx:
+            features=self.face_reg.run_batch(input_np,[landms[i] for i in idx])
+            matches=self.db.search_batch(features)
+            for j in range(len(idx)):
+                if matches:
+                    self.tracker.set_result(tracks[idx[j]],self.format_result(matches[j]),matches[j][1])
+                else:
+                    # 数据库中无人脸
+                    self.tracker.set_result(tracks[idx[j]],'unknown')
+        recg_res = [track.result for track in tracks]
         return det_boxes,recg_res
 
     def database_init(self):
-        # 数据初始化，构建数据库人名列表和数据库特征列表
+        # 数据初始化，构建数据库人名列表和数据库特征矩阵
         with ScopedTiming("database_init", self.debug_mode > 1):
-            db_file_list = os.listdir(self.database_dir)
-            for db_file in db_file_list:
-                if not db_file.endswith('.bin'):
-                    continue
-                if self.valid_register_face >= self.max_register_face:
-                    break
-                valid_index = self.valid_register_face
-                full_db_file = self.database_dir + db_file
-                with open(full_db_file, 'rb') as f:
-                    data = f.read()
-                feature = np.frombuffer(data, dtype=np.float)
-                self.db_data.append(feature)
-                name = db_file.split('.')[0]
-                self.db_name.append(name)
-                self.valid_register_face += 1
+            # 兼容旧的每人一个.bin文件的数据库，首次运行时导入打包存储
+            self.store.import_dir(self.database_dir)
+            if self.store.exists():
+                # 整个特征矩阵一次读入
+                self.db.load_store(self.store)
 
     def database_reset(self):
         # 数据库清空
         with ScopedTiming("database_reset", self.debug_mode > 1):
             print("database clearing...")
-            self.db_name = []
-            self.db_data = []
-            self.valid_register_face = 0
+            self.db.reset()
             print("database clear Done!")
 
+    # 根据数据库查询结果生成识别结果字符串
+    def format_result(self,match):
+        name,score=match
+        if score < self.face_recognition_threshold:
+            # 小于人脸识别阈值，未识别
+            return 'unknown'
+        # 识别成功
+        return 'name: {}, score:{}'.format(name,score)
+
     def database_search(self,feature):
         # 数据库查询
         with ScopedTiming("database_search", self.debug_mode > 1):
-            v_id = -1
-            v_score_max = 0.0
-            # 将当前人脸特征归一化
-            feature /= np.linalg.norm(feature)
-            # 遍历当前人脸数据库，统计最高得分
-            for i in range(self.valid_register_face):
-                db_feature = self.db_data[i]
-                db_feature /= np.linalg.norm(db_feature)
-                # 计算数据库特征与当前人脸特征相似度
-                v_score = np.dot(feature, db_feature)/2 + 0.5
-                if v_score > v_score_max:
-                    v_score_max = v_score
-                    v_id = i
-            if v_id == -1:
+            res=self.db.search(feature)
+            if not res:
                 # 数据库中无人脸
                 return 'unknown'
-            elif v_score_max < self.face_recognition_threshold:
-                # 小于人脸识别阈值，未识别
-                return 'unknown'
-            else:
-                # 识别成功
-                result = 'name: {}, score:{}'.format(self.db_name[v_id],v_score_max)
-                return result
+            return self.format_result(res[0])
+
+    def database_search_batch(self,features):
+        # 一帧中所有人脸特征批量查询数据库
+        with ScopedTiming("database_search_batch", self.debug_mode > 1):
+            res=self.db.search_batch(features)
+            if not res:
+                # 数据库中无人脸
+                return ['unknown' for _ in features]
+            return [self.format_result(match) for match in res]
 
     # 绘制识别结果
     def draw_result(self,pl,dets,recg_results):
@@ -1,6 +1,7 @@
 from libs.PipeLine import PipeLine, ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.FaceDatabase import FaceStore
 import os
 import ujson
 from media.media import *
@@ -231,6 +232,8 @@ class FaceRegistration:
         self.display_size=[ALIGN_UP(display_size[0],16),display_size[1]]
         # debug_mode模式
         self.debug_mode=debug_mode
+        # 打包的人脸特征存储，注册时在末尾追加一行特征，不再每人生成一个.bin文件
+        self.store=FaceStore(self.database_dir+"faces.kfdb")
         self.face_det=FaceDetApp(self.face_det_kmodel,model_input_size=self.det_input_size,anchors=self.anchors,confidence_threshold=self.confidence_threshold,nms_threshold=self.nms_threshold,debug_mode=0)
         self.face_reg=FaceRegistrationApp(self.face_reg_kmodel,model_input_size=self.reg_input_size,rgb888p_size=self.rgb888p_size)
 
@@ -245,9 +248,10 @@ class FaceRegistration:
                 for landm in landms:
                     self.face_reg.config_preprocess(landm,input_image_size=[input_np.shape[3],input_np.shape[2]])
                     reg_result = self.face_reg.run(input_np)
-                    with open(self.database_dir+'{}.bin'.format(db_i_name), "wb") as file:
-                        file.write(reg_result.tobytes())
-                        print('Success!')
+                    # 重复注册时先删除旧条目，特征归一化后追加到存储末尾
+                    self.store.remove(db_i_name)
+                    self.store.append(db_i_name,reg_result/np.linalg.norm(reg_result))
+                    print('Success!')
             else:
                 print('Only one person in a picture when you sign up')
         else:
@@ -285,7 +289,6 @@ if __name__=="__main__":
     det_dim=4
     anchors = np.fromfile(anchors_path, dtype=np.float)
     anchors = anchors.reshape((anchor_len,det_dim))
-    max_register_face = 100              #数据库最多人脸个数
     feature_num = 128                    #人脸识别特征维度
 
     fr=FaceRegistration(face_det_kmodel_path,face_reg_kmodel_path,det_input_size=face_det_input_size,reg_input_size=face_reg_input_size,database_dir=database_dir,anchors=anchors,confidence_threshold=confidence_threshold,nms_threshold=nms_threshold)
@@ -302,6 +305,9 @@ if __name__=="__main__":
         # 人脸注册
         fr.run(rgb888p_img_ndarry,img_file)
         gc.collect()
+    # 移除重复注册留下的已删除条目，没有注册成功的图像时存储文件不存在
+    if fr.store.exists():
+        fr.store.compact()
     fr.face_det.deinit()
     fr.face_reg.deinit()
 
@@ -1,6 +1,7 @@
 from libs.PipeLine import PipeLine, ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.Tracker import ROITracker
 import os
 import ujson
 from media.media import *
@@ -155,7 +156,7 @@ class HandRecognitionApp(AIBase):
         return x
 
 class HandRecognition:
-    def __init__(self,hand_det_kmodel,hand_kp_kmodel,det_input_size,kp_input_size,labels,anchors,confidence_threshold=0.25,nms_threshold=0.3,nms_option=False,strides=[8,16,32],rgb888p_size=[1280,720],display_size=[1920,1080],debug_mode=0):
+    def __init__(self,hand_det_kmodel,hand_kp_kmodel,det_input_size,kp_input_size,labels,anchors,confidence_threshold=0.25,nms_threshold=0.3,nms_option=False,strides=[8,16,32],rgb888p_size=[1280,720],display_size=[1920,1080],track_max_age=5,debug_mode=0):
         # 手掌检测模型路径
         self.hand_det_kmodel=hand_det_kmodel
         # 手掌关键点模型路径
@@ -184,15 +185,16 @@ class HandRecognition:
         self.hand_det=HandDetApp(self.hand_det_kmodel,model_input_size=self.det_input_size,anchors=self.anchors,confidence_threshold=self.confidence_threshold,nms_threshold=self.nms_threshold,nms_option=self.nms_option,strides=self.strides,rgb888p_size=self.rgb888p_size,display_size=self.display_size,debug_mode=0)
         self.hand_rec=HandRecognitionApp(self.hand_kp_kmodel,model_input_size=self.kp_input_size,labels=self.labels,rgb888p_size=self.rgb888p_size,display_size=self.display_size)
         self.hand_det.config_preprocess()
+        # 手掌跟踪，同一只手每track_max_age帧才重新识别一次手势，track_max_age为0时每帧都识别
+        self.tracker=ROITracker(max_age=track_max_age)
 
     # run函数
     def run(self,input_np):
         # 执行手掌检测
         det_boxes=self.hand_det.run(input_np)
-        hand_rec_res=[]
         hand_det_res=[]
         for det_box in det_boxes:
-            # 对检测到的每一个手掌执行手势识别
+            # 筛选出有效的手掌框
             x1, y1, x2, y2 = det_box[2],det_box[3],det_box[4],det_box[5]
             w,h= int(x2 - x1),int(y2 - y1)
             if (h<(0.1*self.rgb888p_size[1])):
@@ -201,10 +203,16 @@ class HandRecognition:
                 continue
             if (w<(0.15*self.rgb888p_size[0]) and ((x1<(0.01*self.rgb888p_size[0])) or (x2>(0.99*self.rgb888p_size[0])))):
                 continue
-            self.hand_rec.config_preprocess(det_box)
-            text=self.hand_rec.run(input_np)
             hand_det_res.append(det_box)
-            hand_rec_res.append(text)
+        # 对所有有效手掌框批量执行手势识别
+        tracks=self.tracker.update([[det_box[2],det_box[3],det_box[4],det_box[5]] for det_box in hand_det_res])
+        # 只对新出现或识别结果过期的手掌批量识别手势
+        idx=self.tracker.stale_indices(tracks)
+        if idx:
+            rec_res=self.hand_rec.run_batch(input_np,[hand_det_res[i] for i in idx])
+            for j in range(len(idx)):
+                self.tracker.set_result(tracks[idx[j]],rec_res[j])
+        hand_rec_res=[track.result for track in tracks]
         return hand_det_res,hand_rec_res
 
     # 绘制效果，绘制识别结果和检测框
@@ -1,6 +1,8 @@
 from libs.PipeLine import ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.Utils import shares_memory
+from libs.KWSStream import StreamingKWS
 from media.pyaudio import *                     # 音频模块
 from media.media import *                       # 软件抽象模块，主要封装媒体数据链路以及媒体缓冲区
 import media.wave as wave                       # wav音频处理模块
@@ -8,7 +10,6 @@ import nncase_runtime as nn                     # nncase运行模块，封装了
 import ulab.numpy as np                         # 类似python numpy操作，但也会有一些接口不同
 import aidemo                                   # aidemo模块，封装ai demo相关前处理、后处理等操作
 import time                                     # 时间统计
-import struct                                   # 字节字符转换模块
 import gc                                       # 垃圾回收模块
 import os,sys                                   # 操作系统接口模块
 
@@ -19,29 +20,41 @@ class KWSApp(AIBase):
         self.kmodel_path = kmodel_path  # 模型文件路径
         self.threshold=threshold
         self.debug_mode = debug_mode  # 是否开启调试模式
+        # 预分配的特征输入和cache状态输入
+        self.feats_np = np.zeros((1, 30, 40), dtype=np.float)
         self.cache_np = np.zeros((1, 256, 105), dtype=np.float)
+        # from_numpy不保证与array共享内存，这里只检查一次：共享时输入tensor只创建一次，之后原地更新array，
+        # 每次推理不再调用from_numpy和set_input_tensor；不共享时每次推理重新创建输入tensor，cache直接换成模型输出的array
+        self.feats_tensor = nn.from_numpy(self.feats_np)
+        self.cache_tensor = nn.from_numpy(self.cache_np)
+        self.input_alias = shares_memory(self.feats_np,self.feats_tensor) and shares_memory(self.cache_np,self.cache_tensor)
+        if self.input_alias:
+            self.bound_input_tensors[0]=self.feats_tensor
+            self.bound_input_tensors[1]=self.cache_tensor
 
     # 自定义预处理，返回模型输入tensor列表
     def preprocess(self,pcm_data):
-        pcm_data_list=[]
-        # 获取音频流数据
-        for i in range(0, len(pcm_data), 2):
-            # 每两个字节组织成一个有符号整数，然后将其转换为浮点数，即为一次采样的数据，加入到当前一帧（0.3s）的数据列表中
-            int_pcm_data = struct.unpack("<h", pcm_data[i:i+2])[0]
-            float_pcm_data = float(int_pcm_data)
-            pcm_data_list.append(float_pcm_data)
-        # 将pcm数据处理为模型输入的特征向量
-        mp_feats = aidemo.kws_preprocess(fp, pcm_data_list)[0]
+        # 将音频流数据按int16一次性解析，并整体转换为浮点数，即为当前一帧（0.3s）的采样数据
+        pcm_int16 = np.frombuffer(pcm_data, dtype=np.int16)
+        pcm_float = np.array(pcm_int16, dtype=np.float)
+        # 将pcm数据处理为模型输入的特征向量，kws_preprocess只接受list
+        mp_feats = aidemo.kws_preprocess(fp, pcm_float.tolist())[0]
+        if self.input_alias:
+            # 特征写入已绑定的输入array，直接复用输入tensor
+            self.feats_np[0, :, :] = np.array(mp_feats).reshape((30, 40))
+            return [self.feats_tensor,self.cache_tensor]
         mp_feats_np = np.array(mp_feats).reshape((1, 30, 40))
-        audio_input_tensor = nn.from_numpy(mp_feats_np)
-        cache_input_tensor = nn.from_numpy(self.cache_np)
-        return [audio_input_tensor,cache_input_tensor]
+        return [nn.from_numpy(mp_feats_np),nn.from_numpy(self.cache_np)]
 
     # 自定义当前任务的后处理，results是模型输出array列表
     def postprocess(self, results):
         with ScopedTiming("postprocess", self.debug_mode > 0):
             logits_np = results[0]
-            self.cache_np= results[1]
+            # cache状态作为下一次推理的输入：输入tensor复用时原地写入已绑定的array，否则直接换成本次输出的array
+            if self.input_alias:
+                self.cache_np[:] = results[1]
+            else:
+                self.cache_np = results[1]
             max_logits = np.max(logits_np, axis=1)[0]
             max_p = np.max(max_logits)
             idx = np.argmax(max_logits)
@@ -63,6 +76,7 @@ if __name__ == "__main__":
     CHANNELS = 1                # 通道数 1为单声道，2为立体声
     FORMAT = paInt16            # 音频输入输出格式 paInt16
     CHUNK = int(0.3 * 16000)    # 每次读取音频数据的帧数，设置为0.3s的帧数16000*0.3=4800
+    HOP = CHUNK                 # 相邻两次推理的间隔帧数，小于CHUNK时窗口重叠
     reply_wav_file = "/sdcard/examples/utils/wozai.wav"         # kws唤醒词回复音频路径
 
     # 初始化音频预处理接口
@@ -78,13 +92,18 @@ if __name__ == "__main__":
     output_stream = p.open(format=FORMAT,channels=CHANNELS,rate=SAMPLE_RATE,output=True,frames_per_buffer=CHUNK)
     # 初始化自定义关键词唤醒实例
     kws = KWSApp(kmodel_path,threshold=THRESH,debug_mode=0)
+    # 流式唤醒引擎，后台线程采集音频写入环形缓冲区，主循环按窗口推理，播放回复音频时不会阻塞采集
+    stream = StreamingKWS(kws,window=CHUNK,hop=HOP)
 
     try:
+        stream.start(input_stream.read)
         while True:
             os.exitpoint()                      # 检查是否有退出信号
+            res=stream.step()
+            if res is None:
+                time.sleep_ms(5)                # 缓冲区中没有完整窗口，等待采集
+                continue
             with ScopedTiming("total",1):
-                pcm_data=input_stream.read()
-                res=kws.run(pcm_data)
                 if res:
                     print("====Detected XiaonanXiaonan!====")
                     wf = wave.open(reply_wav_file, "rb")
@@ -100,6 +119,8 @@ if __name__ == "__main__":
     except Exception as e:
         sys.print_exception(e)                  # 打印异常信息
     finally:
+        stream.stop()
+        print(stream.stats())
         input_stream.stop_stream()
         output_stream.stop_stream()
         input_stream.close()
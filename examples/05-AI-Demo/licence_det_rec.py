@@ -1,6 +1,7 @@
 from libs.PipeLine import PipeLine, ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.Tracker import ROITracker,poly_to_box
 import os
 import ujson
 from media.media import *
@@ -91,7 +92,7 @@ class LicenceRecognitionApp(AIBase):
 
 # 车牌识别任务类
 class LicenceRec:
-    def __init__(self,licence_det_kmodel,licence_rec_kmodel,det_input_size,rec_input_size,confidence_threshold=0.25,nms_threshold=0.3,rgb888p_size=[1920,1080],display_size=[1920,1080],debug_mode=0):
+    def __init__(self,licence_det_kmodel,licence_rec_kmodel,det_input_size,rec_input_size,confidence_threshold=0.25,nms_threshold=0.3,rgb888p_size=[1920,1080],display_size=[1920,1080],track_max_age=10,debug_mode=0):
         # 车牌检测模型路径
         self.licence_det_kmodel=licence_det_kmodel
         # 车牌识别模型路径
@@ -113,6 +114,8 @@ class LicenceRec:
         self.licence_det=LicenceDetectionApp(self.licence_det_kmodel,model_input_size=self.det_input_size,confidence_threshold=self.confidence_threshold,nms_threshold=self.nms_threshold,rgb888p_size=self.rgb888p_size,display_size=self.display_size,debug_mode=0)
         self.licence_rec=LicenceRecognitionApp(self.licence_rec_kmodel,model_input_size=self.rec_input_size,rgb888p_size=self.rgb888p_size)
         self.licence_det.config_preprocess()
+        # 车牌跟踪，同一个车牌每track_max_age帧才重新识别一次，track_max_age为0时每帧都识别
+        self.tracker=ROITracker(max_age=track_max_age)
 
     # run函数
     def run(self,input_np):
@@ -122,13 +125,19 @@ class LicenceRec:
         imgs_array_boxes = aidemo.ocr_rec_preprocess(input_np,[self.rgb888p_size[1],self.rgb888p_size[0]],det_boxes)
         imgs_array = imgs_array_boxes[0]
         boxes = imgs_array_boxes[1]
-        rec_res = []
-        for img_array in imgs_array:
-            # 对每一个检测到的车牌进行识别
-            self.licence_rec.config_preprocess(input_image_size=[img_array.shape[3],img_array.shape[2]])
-            licence_str=self.licence_rec.run(img_array)
-            rec_res.append(licence_str)
-            gc.collect()
+        tracks=self.tracker.update([poly_to_box(det_box) for det_box in det_boxes])
+        # 只对新出现或识别结果过期的车牌批量进行识别
+        idx=self.tracker.stale_indices(tracks)
+        imgs=[]
+        rois=[]
+        for i in idx:
+            img_array=imgs_array[i]
+            imgs.append(img_array)
+            rois.append({"input_image_size":[img_array.shape[3],img_array.shape[2]]})
+        rec_res=self.licence_rec.run_batch(imgs,rois)
+        for j in range(len(idx)):
+            self.tracker.set_result(tracks[idx[j]],rec_res[j])
+        rec_res=[track.result for track in tracks]
         return det_boxes,rec_res
 
     # 绘制车牌检测识别效果
@@ -1,6 +1,7 @@
 from libs.PipeLine import PipeLine, ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.Tracker import ROITracker,poly_to_box
 import os
 import ujson
 from media.media import *
@@ -162,7 +163,7 @@ class OCRRecognitionApp(AIBase):
 
 
 class OCRDetRec:
-    def __init__(self,ocr_det_kmodel,ocr_rec_kmodel,det_input_size,rec_input_size,dict_path,mask_threshold=0.25,box_threshold=0.3,rgb888p_size=[1920,1080],display_size=[1920,1080],debug_mode=0):
+    def __init__(self,ocr_det_kmodel,ocr_rec_kmodel,det_input_size,rec_input_size,dict_path,mask_threshold=0.25,box_threshold=0.3,rgb888p_size=[1920,1080],display_size=[1920,1080],track_max_age=10,debug_mode=0):
         # OCR检测模型路径
         self.ocr_det_kmodel=ocr_det_kmodel
         # OCR识别模型路径
@@ -186,20 +187,27 @@ class OCRDetRec:
         self.ocr_det=OCRDetectionApp(self.ocr_det_kmodel,model_input_size=self.det_input_size,mask_threshold=self.mask_threshold,box_threshold=self.box_threshold,rgb888p_size=self.rgb888p_size,display_size=self.display_size,debug_mode=0)
         self.ocr_rec=OCRRecognitionApp(self.ocr_rec_kmodel,model_input_size=self.rec_input_size,dict_path=self.dict_path,rgb888p_size=self.rgb888p_size,display_size=self.display_size)
         self.ocr_det.config_preprocess()
+        # 文本框跟踪，同一个文本框每track_max_age帧才重新识别一次，track_max_age为0时每帧都识别
+        self.tracker=ROITracker(max_age=track_max_age)
 
     # run函数
     def run(self,input_np):
         # 先进行OCR检测
         det_res=self.ocr_det.run(input_np)
-        boxes=[]
-        ocr_res=[]
-        for det in det_res:
-            # 对得到的每个检测框执行OCR识别
-            self.ocr_rec.config_preprocess(input_image_size=[det[0].shape[2],det[0].shape[1]],input_np=det[0])
-            ocr_str=self.ocr_rec.run(det[0])
-            ocr_res.append(ocr_str)
-            boxes.append(det[1])
-            gc.collect()
+        boxes=[det[1] for det in det_res]
+        tracks=self.tracker.update([poly_to_box(box) for box in boxes])
+        # 只对新出现或识别结果过期的文本框批量执行OCR识别
+        idx=self.tracker.stale_indices(tracks)
+        imgs=[]
+        rois=[]
+        for i in idx:
+            det=det_res[i]
+            imgs.append(det[0])
+            rois.append({"input_image_size":[det[0].shape[2],det[0].shape[1]],"input_np":det[0]})
+        ocr_res=self.ocr_rec.run_batch(imgs,rois)
+        for j in range(len(idx)):
+            self.tracker.set_result(tracks[idx[j]],ocr_res[j])
+        ocr_res=[track.result for track in tracks]
         return boxes,ocr_res
 
     # 绘制OCR检测识别效果
@@ -15,6 +15,73 @@ import gc
 import sys
 import aicube
 
+# 自学习特征库，特征归一化后常驻内存，查询时一次矩阵乘法计算与所有特征的相似度
+class FeatureLibrary:
+    def __init__(self,capacity=16):
+        # 特征文件名列表，与特征矩阵的行一一对应
+        self.names=[]
+        # 特征文件名到行索引的映射
+        self.rows={}
+        # 类别名列表和每一行特征的类别索引
+        self.categories=[]
+        self.category_ids=[]
+        self.category_ids_np=None
+        # 特征矩阵，容量不足时按2倍扩容
+        self.capacity=capacity
+        self.features=None
+
+    # 从目录中一次性加载所有特征文件
+    def load(self,database_path):
+        for feature_name in os.listdir(database_path):
+            if not feature_name.endswith(".bin"):
+                continue
+            with open(database_path + feature_name, 'rb') as f:
+                data = f.read()
+            self.set(feature_name,np.frombuffer(data, dtype=np.float))
+
+    # 新增或更新一个特征，特征文件名格式为"类别_序号.bin"
+    def set(self,name,feature):
+        feature=feature.reshape((-1,))
+        feature=feature/np.linalg.norm(feature)
+        if self.features is None:
+            self.features=np.zeros((self.capacity,len(feature)))
+        if name in self.rows:
+            self.features[self.rows[name],:]=feature
+            return
+        n=len(self.names)
+        if n==self.features.shape[0]:
+            features=np.zeros((n*2,self.features.shape[1]))
+            features[:n,:]=self.features
+            self.features=features
+        self.features[n,:]=feature
+        self.rows[name]=n
+        self.names.append(name)
+        category=name.split("_")[0]
+        if category not in self.categories:
+            self.categories.append(category)
+        self.category_ids.append(self.categories.index(category))
+        self.category_ids_np=None
+
+    # 查询与feature最相似的top_k个类别，每个类别取其所有特征中的最高相似度，只保留大于threshold的结果，按得分降序
+    def query(self,feature,threshold,top_k):
+        n=len(self.names)
+        if n==0:
+            return []
+        if self.category_ids_np is None:
+            self.category_ids_np=np.array(self.category_ids,dtype=np.uint16)
+        feature=feature.reshape((-1,))
+        scores=np.dot(self.features[:n,:],feature/np.linalg.norm(feature))
+        results=[]
+        for c in range(len(self.categories)):
+            # 非当前类别的相似度置为最小值，argmax即为该类别得分最高的特征
+            category_scores=np.where(self.category_ids_np==c,scores,-2.0)
+            idx=int(np.argmax(category_scores))
+            score=category_scores[idx]
+            if score>threshold:
+                results.append({"category":self.categories[c],"score":score,"bin_file":self.names[idx]})
+        results=sorted(results, key=lambda x: -x["score"])
+        return results[:top_k]
+
 # 自定义自学习类
 class SelfLearningApp(AIBase):
     def __init__(self,kmodel_path,model_input_size,labels,top_k,threshold,database_path,rgb888p_size=[224,224],display_size=[1920,1080],debug_mode=0):
@@ -55,6 +122,8 @@ class SelfLearningApp(AIBase):
         self.ai2d=Ai2d(debug_mode)
         # 设置Ai2d的输入输出格式和类型
         self.ai2d.set_ai2d_dtype(nn.ai2d_format.NCHW_FMT,nn.ai2d_format.NCHW_FMT,np.uint8, np.uint8)
+        # 常驻内存的特征库，特征采集时增量更新，识别时不再每帧读取特征文件
+        self.library=FeatureLibrary()
         self.data_init()
 
     # 配置预处理操作，这里使用了crop和resize，Ai2d支持crop/shift/pad/resize/affine，具体代码请打开/sdcard/app/libs/AI2D.py查看
@@ -79,48 +148,16 @@ class SelfLearningApp(AIBase):
             if (self.category_index < len(self.labels)):
                 self.time_now += 1
                 pl.osd_img.draw_string_advanced(50, self.crop_y_osd-50, 30,"请将待添加类别放入框内进行特征采集："+self.labels[self.category_index] + "_" + str(int(self.time_now-1) // self.time_one) + ".bin", color=(255,255,0,0))
-                with open(self.database_path + self.labels[self.category_index] + "_" + str(int(self.time_now-1) // self.time_one) + ".bin", 'wb') as f:
+                feature_name = self.labels[self.category_index] + "_" + str(int(self.time_now-1) // self.time_one) + ".bin"
+                with open(self.database_path + feature_name, 'wb') as f:
                     f.write(feature.tobytes())
+                self.library.set(feature_name,feature)
                 if (self.time_now // self.time_one == self.features[self.category_index]):
                     self.category_index += 1
                     self.time_all -= self.time_now
                     self.time_now = 0
             else:
-                results_learn = []
-                list_features = os.listdir(self.database_path)
-                for feature_name in list_features:
-                    with open(self.database_path + feature_name, 'rb') as f:
-                        data = f.read()
-                    save_vec = np.frombuffer(data, dtype=np.float)
-                    score = self.getSimilarity(feature, save_vec)
-                    if (score > self.threshold):
-                        res = feature_name.split("_")
-                        is_same = False
-                        for r in results_learn:
-                            if (r["category"] ==  res[0]):
-                                if (r["score"] < score):
-                                    r["bin_file"] = feature_name
-                                    r["score"] = score
-                                is_same = True
-                        if (not is_same):
-                            if(len(results_learn) < self.top_k):
-                                evec = {}
-                                evec["category"] = res[0]
-                                evec["score"] = score
-                                evec["bin_file"] = feature_name
-                                results_learn.append( evec )
-                                results_learn = sorted(results_learn, key=lambda x: -x["score"])
-                            else:
-                                if( score <= results_learn[self.top_k-1]["score"] ):
-                                    continue
-                                else:
-                                    evec = {}
-                                    evec["category"] = res[0]
-                                    evec["score"] = score
-                                    evec["bin_file"] = feature_name
-                                    results_learn.append( evec )
-                                    results_learn = sorted(results_learn, key=lambda x: -x["score"])
-                                    results_learn.pop()
+                results_learn = self.library.query(feature,self.threshold,self.top_k)
                 draw_y = 200
                 for r in results_learn:
                     pl.osd_img.draw_string_advanced( 50 , draw_y,50,r["category"] + " : " + str(r["score"]), color=(255,255,0,0))
@@ -128,7 +165,11 @@ class SelfLearningApp(AIBase):
 
     #数据初始化
     def data_init(self):
-        os.mkdir(self.database_path)
+        # 特征目录已存在时(如上次运行异常退出未清理)加载其中已学习的特征
+        try:
+            os.mkdir(self.database_path)
+        except OSError:
+            self.library.load(self.database_path)
         self.crop_x_osd = int(self.crop_x / self.rgb888p_size[0] * self.display_size[0])
         self.crop_y_osd = int(self.crop_y / self.rgb888p_size[1] * self.display_size[1])
         self.crop_w_osd = int(self.crop_w / self.rgb888p_size[0] * self.display_size[0])
@@ -137,13 +178,6 @@ class SelfLearningApp(AIBase):
             for j in range(self.features[i]):
                 self.time_all += self.time_one
 
-    # 获取两个特征向量的相似度
-    def getSimilarity(self,output_vec,save_vec):
-        tmp = sum(output_vec * save_vec)
-        mold_out = np.sqrt(sum(output_vec * output_vec))
-        mold_save = np.sqrt(sum(save_vec * save_vec))
-        return tmp / (mold_out * mold_save)
-
 
 if __name__=="__main__":
     # 显示模式，默认"hdmi",可以选择"hdmi"和"lcd"
@@ -1,6 +1,7 @@
 from libs.PipeLine import ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.AudioService import AudioPlayer
 from media.pyaudio import *                     # 音频模块
 from media.media import *                       # 软件抽象模块，主要封装媒体数据链路以及媒体缓冲区
 import media.wave as wave                       # wav音频处理模块
@@ -8,7 +9,6 @@ import nncase_runtime as nn                     # nncase运行模块，封装了
 import ulab.numpy as np                         # 类似python numpy操作，但也会有一些接口不同
 import aidemo                                   # aidemo模块，封装ai demo相关前处理、后处理等操作
 import time                                     # 时间统计
-import struct                                   # 字节字符转换模块
 import gc                                       # 垃圾回收模块
 import os,sys                                   # 操作系统接口模块
 
@@ -43,24 +43,30 @@ class EncoderApp(AIBase):
             enc_output_1_np=results[1]
             # 给编码结果添加持续时间属性，每个音素编码向量按照持续时间重复
             duritions=enc_output_1_np[0][:int(self.data_len[0])]
-            self.durition_sum=int(np.sum(duritions))
-            # 解码器输入维度为（1,600,256）,不足部分需要padding
-            max_value=13
-            while self.durition_sum>600:
-                for i in range(len(duritions)):
-                    if duritions[i]>max_value:
-                        duritions[i]=max_value
-                max_value=max_value-1
-                self.durition_sum=np.sum(duritions)
-            dec_input=np.zeros((1,600,256),dtype=np.float)
-            m_pad=600-self.durition_sum
-            k=0
-            for i in range(len(duritions)):
-                for j in range(int(duritions[i])):
-                    dec_input[0][k]=enc_output_0_np[0][i]
-                    k+=1
+            dec_input,self.durition_sum=self.length_regulator(enc_output_0_np[0],duritions)
             return dec_input,self.durition_sum
 
+    # 长度调节，将每个音素编码向量按持续时间展开为解码器输入（1,max_len,256），不足部分padding为0
+    # 总时长超过max_len时，从max_value开始逐步降低上限，用np.minimum一次裁剪所有持续时间
+    def length_regulator(self,enc_output,duritions,max_len=600,max_value=13):
+        duritions=np.array([int(d) for d in duritions],dtype=np.int16)
+        durition_sum=int(np.sum(duritions))
+        if durition_sum>max_len:
+            # 找到满足总时长要求的最大上限，每次只做一次数组运算
+            while max_value>0 and int(np.sum(np.minimum(duritions,max_value)))>max_len:
+                max_value-=1
+            duritions=np.minimum(duritions,max_value)
+            durition_sum=int(np.sum(duritions))
+        dec_input=np.zeros((1,max_len,enc_output.shape[-1]),dtype=np.float)
+        # k为累计时长，每个音素只做一次切片拷贝，不再逐帧拷贝
+        k=0
+        for i in range(len(duritions)):
+            d=int(duritions[i])
+            if d>0:
+                dec_input[0,k:k+d,:]=enc_output[i]
+                k+=d
+        return dec_input,durition_sum
+
 # 自定义TTS中文解码器类，继承自AIBase基类
 class DecoderApp(AIBase):
     def __init__(self, kmodel_path, debug_mode=0):
@@ -81,45 +87,53 @@ class DecoderApp(AIBase):
 
 # 自定义HifiGan声码器类，继承自AIBase基类
 class HifiGanApp(AIBase):
-    def __init__(self, kmodel_path, debug_mode=0):
+    def __init__(self, kmodel_path, chunk_frames=100, hop_len=256, debug_mode=0):
         super().__init__(kmodel_path)  # 调用基类的构造函数
         self.kmodel_path = kmodel_path  # 模型文件路径
         self.debug_mode = debug_mode  # 是否开启调试模式
-        self.mel_data=[]
+        # 每次声码器推理的mel帧数，以及每帧mel对应的采样点数
+        self.chunk_frames=chunk_frames
+        self.hop_len=hop_len
         self.subvector_num=0
-        self.hifi_input=None
-
-    # 自定义声码器预处理，返回模型输入tensor列表
-    def preprocess(self,dec_output_np,durition_sum):
+        # 声码器输入只分配一次，每个子向量用切片拷贝到这里
+        # from_numpy不保证与array共享内存，每个子向量重新创建输入tensor，由inference设置为模型输入
+        self.hifi_input=np.zeros((1,80,chunk_frames),dtype=np.float)
+        # 整句的int16音频数据，按句子长度预分配，各子向量的输出直接写入对应位置
+        self.pcm=None
+
+    # 自定义声码器预处理，将第start到end帧mel切片拷贝到声码器输入，不足部分padding为0
+    def preprocess(self,dec_output_np,start,end):
         with ScopedTiming("hifigan preprocess", self.debug_mode > 0):
-            self.subvector_num=durition_sum//100;
-            remaining=durition_sum%100;
-            if remaining>0:
-                self.subvector_num+=1
-            self.hifi_input=np.zeros((1,80,self.subvector_num*100),dtype=np.float)
-            for i in range(durition_sum):
-                self.hifi_input[:,:,i]=dec_output_np[:,:,i]
-
-    def run(self,dec_output_np,durition_sum):
-        self.preprocess(dec_output_np,durition_sum)
+            n=end-start
+            self.hifi_input[:,:,:n]=dec_output_np[:,:,start:end]
+            if n<self.chunk_frames:
+                self.hifi_input[:,:,n:]=0
+            return [nn.from_numpy(self.hifi_input)]
+
+    # 流式声码器推理，on_chunk不为None时每个子向量的音频生成后立即回调，可以边生成边播放
+    # 返回整句的int16音频数据
+    def run(self,dec_output_np,durition_sum,on_chunk=None):
+        self.subvector_num=(durition_sum+self.chunk_frames-1)//self.chunk_frames
+        total=durition_sum*self.hop_len
+        if self.pcm is None or len(self.pcm)<total:
+            self.pcm=np.zeros(total,dtype=np.int16)
         # 依次对每一个子向量进行声码器推理
         for i in range(self.subvector_num):
-            hifi_input_tmp=np.zeros((1,80,100),dtype=np.float)
-            for j in range(80):
-                for k in range(i*100,(i+1)*100):
-                    hifi_input_tmp[0][j][k-i*100]=self.hifi_input[0][j][k]
-            # 设置模型输入
-            hifigan_input_tensor=nn.from_numpy(hifi_input_tmp)
-            # 推理
-            results=self.inference([hifigan_input_tensor])
-            self.postprocess(results)
-        return self.mel_data
+            start=i*self.chunk_frames
+            end=min(start+self.chunk_frames,durition_sum)
+            results=self.inference(self.preprocess(dec_output_np,start,end))
+            pcm_chunk=self.postprocess(results,start*self.hop_len,(end-start)*self.hop_len)
+            if on_chunk is not None:
+                on_chunk(pcm_chunk)
+        return self.pcm[:total]
 
     # 自定义当前任务的后处理，results是模型输出ndarray列表
-    def postprocess(self, results):
+    # 将float音频转换为int16写入预分配的整句buffer，返回本子向量对应的音频切片
+    def postprocess(self, results, offset, length):
         with ScopedTiming("hifigan postprocess", self.debug_mode > 0):
-            # 汇总输出数据
-            self.mel_data+=results[0][0][0].tolist()
+            audio=results[0][0][0][:length]
+            self.pcm[offset:offset+length]=np.clip(audio,-1.0,1.0)*32767
+            return self.pcm[offset:offset+length]
 
 #自定义中文TTS任务类
 class TTSZH:
@@ -128,46 +142,40 @@ class TTSZH:
         self.debug_mode=debug_mode
         self.encoder=EncoderApp(encoder_kmodel_path,dict_path,phase_path,mapfile,debug_mode)
         self.decoder=DecoderApp(decoder_kmodel_path,debug_mode)
-        self.hifigan=HifiGanApp(hifigan_kmodel_path,debug_mode)
+        self.hifigan=HifiGanApp(hifigan_kmodel_path,debug_mode=debug_mode)
+        # 常驻音频输出服务，多句播放之间保持输出流打开
+        self.player=AudioPlayer(rate=24000,channels=1)
+        self.player.create()
 
-    def run(self,text):
+    # wait为False时只把音频送入播放队列即返回，可以紧接着合成下一句
+    def run(self,text,wait=True):
         encoder_output_0,encoder_output_1=self.encoder.run(text)
         decoder_output_0=self.decoder.run(encoder_output_0)
-        hifigan_output=self.hifigan.run(decoder_output_0,encoder_output_1)
-        # 将生成的音频数据保存为wav文件
-        save_data=hifigan_output[:encoder_output_1*256]
-        save_len=len(save_data)
-        aidemo.save_wav(save_data,save_len,self.save_wav_file,24000)
-        self.play_audio()
-
-    def play_audio(self):
-        with ScopedTiming("play audio", self.debug_mode > 0):
-            # 有关音频流的宏变量
-            SAMPLE_RATE = 24000         # 采样率24000Hz,即每秒采样24000次
-            CHANNELS = 1                # 通道数 1为单声道，2为立体声
-            FORMAT = paInt16            # 音频输入输出格式 paInt16
-            CHUNK = int(0.3 * 24000)    # 每次读取音频数据的帧数，设置为0.3s的帧数24000*0.3=7200
-            # 初始化音频流
-            p = PyAudio()
-            p.initialize(CHUNK)
-            ret = MediaManager.init()
-            if ret:
-                print("record_audio, buffer_init failed")
-            # 用于播放音频
-            output_stream = p.open(format=FORMAT,channels=CHANNELS,rate=SAMPLE_RATE,output=True,frames_per_buffer=CHUNK)
-            wf = wave.open(self.save_wav_file, "rb")
-            wav_data = wf.read_frames(CHUNK)
-            while wav_data:
-                output_stream.write(wav_data)
-                wav_data = wf.read_frames(CHUNK)
-            time.sleep(2) # 时间缓冲，用于播放声音
+        # 声码器每生成一段音频就立即送入播放队列，不再等整句合成并写入wav文件后才开始播放
+        pcm=self.hifigan.run(decoder_output_0,encoder_output_1,self.play_chunk)
+        # 保存整句音频为wav文件
+        if self.save_wav_file:
+            self.save_wav(pcm)
+        if wait:
+            # 按已写入音频的时长等待播放完成，取代固定的sleep
+            self.player.wait_done()
+
+    # 播放一段int16音频，数据入队时拷贝一份，整句buffer可被下一句复用
+    def play_chunk(self,pcm_chunk):
+        with ScopedTiming("play chunk", self.debug_mode > 0):
+            self.player.write(pcm_chunk.tobytes())
+
+    def save_wav(self,pcm):
+        with ScopedTiming("save wav", self.debug_mode > 0):
+            wf = wave.open(self.save_wav_file, "wb")
+            wf.set_channels(1)
+            wf.set_sampwidth(2)
+            wf.set_framerate(self.player.rate)
+            wf.write_frames(pcm.tobytes())
             wf.close()
-            output_stream.stop_stream()
-            output_stream.close()
-            p.terminate()
-            MediaManager.deinit()
 
     def deinit(self):
+        self.player.destroy()
         aidemo.tts_zh_destroy(self.encoder.ttszh)
         tts_zh.encoder.deinit()
         tts_zh.decoder.deinit()
@@ -0,0 +1,185 @@
+# 后处理基准测试，统计各AI任务后处理的p50/p95/p99耗时和单次调用的内存分配，用于发现后处理的性能回退
+# 测试项：YOLOv5/YOLOv8/YOLO11检测后处理、OCR识别CTC解码、手势关键点分类、人脸识别数据库查询、TTS编码器后处理
+# 输入为录制的kpu输出tensor，录制方法：在demo中每帧调用Sim.record_outputs(app,results,data_dir,frame_id)
+#   <data_dir>/<kmodel名>/model.json，<data_dir>/<kmodel名>/<帧序号>_<输出序号>.bin
+# 没有录制数据的测试项使用固定规则生成的合成数据，合成数据中包含相互重叠的检测框、重复字符等，覆盖后处理的主要分支
+# 板端运行：直接运行本文件
+# 主机运行：python examples/19-Benchmark/postprocess_bench.py [基线json]，通过libs/Sim.py在CPython+NumPy上运行
+#   指定的基线文件存在时与基线比较，有回退则以非0退出码结束；文件不存在时把本次结果保存为基线
+#   主机上没有aidemo/aicube的C实现，调用了其中函数的测试项会被跳过，并在汇总中列出
+import sys
+import gc
+import math
+try:
+    import nncase_runtime
+    root="/sdcard"
+except ImportError:
+    import os
+    root=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.path.insert(0,root)
+    from libs import Sim
+    Sim.install()
+from libs.Bench import Bench, load_frames
+from libs.YOLO import YOLOv5, YOLOv8, YOLO11
+from libs.FaceDatabase import FaceDatabase
+import ulab.numpy as np
+
+# 加载demo脚本中定义的类，demo所在目录名不是合法的模块名，用exec执行，__main__部分不会运行
+def load_example(path):
+    ns={"__name__":"bench"}
+    with open(root+"/examples/"+path,"r") as f:
+        exec(f.read(),ns)
+    return ns
+
+# 只创建对象、不调用__init__，后处理测试不需要加载kmodel和初始化ai2d，attrs为后处理用到的成员
+def bare(cls,**attrs):
+    app=cls.__new__(cls)
+    for k in attrs:
+        setattr(app,k,attrs[k])
+    return app
+
+# 合成YOLO检测输出，每8个anchor中有1个候选框，每4个候选框为一组相互重叠，NMS需要抑制
+# objectness:YOLOv5输出包含objectness列 transpose:YOLOv8/YOLO11输出为(4+class_num,N)
+def synth_yolo(n,class_num,objectness,transpose):
+    c=4+(1 if objectness else 0)+class_num
+    out=np.zeros((c,n) if transpose else (n,c))
+    for j in range(0,n,8):
+        g=j//32
+        jitter=(j//8)%4
+        cls=g%class_num
+        vals=[20+(g*37)%280+jitter*2,20+(g*53)%280+jitter*2,30+(g%5)*8,30+(g%7)*6]
+        if objectness:
+            vals.append(0.9)
+        for k in range(len(vals)):
+            if transpose:
+                out[k,j]=vals[k]
+            else:
+                out[j,k]=vals[k]
+        score=0.6+0.08*jitter
+        if transpose:
+            out[len(vals)+cls,j]=score
+        else:
+            out[j,len(vals)+cls]=score
+    return [out.reshape((1,)+out.shape)]
+
+# 合成OCR识别输出(1,T,C)，相邻两个时间步重复同一字符，每5个时间步有一个空白符(字典最后一个字符)
+def synth_ocr(t,c):
+    out=np.zeros((1,t,c))
+    for i in range(t):
+        out[0,i,c-1 if i%5==4 else ((i//2)*31)%(c-1)]=1.0
+    return [out]
+
+# 合成手掌关键点输出(1,42)，手腕加5根伸直的手指共21个关键点，坐标归一化到crop区域内
+def synth_handkp():
+    out=np.zeros((1,42))
+    out[0,0]=0.5
+    out[0,1]=0.9
+    for f in range(5):
+        a=math.pi*(0.9-0.2*f)
+        for s in range(4):
+            k=(1+f*4+s)*2
+            out[0,k]=0.5+(0.12+0.1*s)*math.cos(a)
+            out[0,k+1]=0.9-(0.12+0.1*s)*math.sin(a)
+    return [out]
+
+# 合成人脸特征，不同seed的特征相互区分
+def synth_feature(seed,feature_num=128):
+    return np.sin(np.arange(feature_num,dtype=np.float)*(0.05*(seed+1)))
+
+# 合成TTS编码器输出，(1,L,256)的编码结果和(1,L)的音素持续时间
+def synth_encoder(length):
+    enc=np.zeros((1,length,256))
+    for i in range(length):
+        enc[0,i,:]=i*0.01
+    dur=np.zeros((1,length))
+    for i in range(length):
+        dur[0,i]=1+(i*3)%7
+    return [enc,dur]
+
+# 读取kmodel的录制数据，没有录制数据时使用合成数据
+def outputs_or(data_dir,name,synth):
+    frames=load_frames(data_dir,name)
+    if frames:
+        return frames,"recorded"
+    return [synth()],"synthetic"
+
+# 手掌关键点输出换算为图像坐标，与HandKPClassApp.postprocess中hk_gesture的输入一致
+def handkp_pixels(results,crop_params):
+    res=results[0].reshape(results[0].shape[0]*results[0].shape[1])
+    pixels=np.zeros(res.shape,dtype=np.int16)
+    pixels[0::2]=res[0::2]*crop_params[3]+crop_params[0]
+    pixels[1::2]=res[1::2]*crop_params[2]+crop_params[1]
+    return pixels
+
+def run_all(bench,data_dir,db_size=100):
+    # YOLO检测后处理，320输入共2100个anchor，YOLOv5每个位置3个anchor
+    yolo_attrs={"task_type":"detect","conf_thresh":0.5,"nms_thresh":0.45,"max_boxes_num":50,"scale":1.0,
+                "agnostic_nms":True,"nms_top_k":0,"debug_mode":0}
+    for cls,name,synth in ((YOLOv5,"yolov5n",lambda: synth_yolo(6300,80,True,False)),
+                           (YOLOv8,"yolov8n",lambda: synth_yolo(2100,80,False,True)),
+                           (YOLO11,"yolo11n",lambda: synth_yolo(2100,80,False,True))):
+        app=bare(cls,**yolo_attrs)
+        frames,src=outputs_or(data_dir,name,synth)
+        print(name,src)
+        bench.run(cls.__name__+".postprocess",app.postprocess,[[f] for f in frames])
+        gc.collect()
+    # OCR识别CTC解码，字典大小与模型输出的类别数一致
+    ocr=load_example("05-AI-Demo/ocr_rec.py")
+    frames,src=outputs_or(data_dir,"ocr_rec_int16",lambda: synth_ocr(64,6549))
+    print("ocr_rec_int16",src)
+    class_num=frames[0][0].shape[-1]
+    app=bare(ocr["OCRRecognitionApp"],debug_mode=0,dict_word={i:chr(0x4e00+i) for i in range(class_num)})
+    bench.run("OCRRecognitionApp.postprocess",app.postprocess,[[f] for f in frames])
+    del ocr
+    gc.collect()
+    # 手势关键点分类
+    hk=load_example("05-AI-Demo/hand_keypoint_class.py")
+    frames,src=outputs_or(data_dir,"handkp_det",synth_handkp)
+    print("handkp_det",src)
+    app=bare(hk["HandKPClassApp"],debug_mode=0)
+    bench.run("HandKPClassApp.hk_gesture",app.hk_gesture,[[handkp_pixels(f,[0,0,256,256])] for f in frames])
+    del hk
+    gc.collect()
+    # 人脸识别数据库查询，数据库中有db_size个合成特征
+    fr=load_example("05-AI-Demo/face_recognition.py")
+    frames,src=outputs_or(data_dir,"face_recognition",lambda: [synth_feature(db_size//2).reshape((1,128))])
+    print("face_recognition",src)
+    db=FaceDatabase(128,db_size)
+    for i in range(db_size):
+        db.add("id_{}".format(i),synth_feature(i))
+    app=bare(fr["FaceRecognition"],db=db,face_recognition_threshold=0.75,debug_mode=0)
+    bench.run("FaceRecognition.database_search",app.database_search,[[f[0][0]] for f in frames])
+    del fr
+    gc.collect()
+    # TTS编码器后处理，录制数据的有效音素数取输出长度
+    tts=load_example("05-AI-Demo/tts_zh.py")
+    frames,src=outputs_or(data_dir,"zh_fastspeech_1_f32",lambda: synth_encoder(60))
+    print("zh_fastspeech_1_f32",src)
+    app=bare(tts["EncoderApp"],data_len=[frames[0][1].shape[1]],durition_sum=0,debug_mode=0)
+    bench.run("EncoderApp.postprocess",app.postprocess,[[f] for f in frames])
+    del tts
+    gc.collect()
+
+if __name__=="__main__":
+    # 录制数据目录
+    data_dir=root+"/examples/19-Benchmark/data"
+    # 每个测试项的计时运行次数
+    repeat=100
+    # 基线文件，空字符串表示不保存也不比较
+    baseline_path=sys.argv[1] if len(sys.argv)>1 else ""
+    # p95耗时或内存分配超过基线的比例
+    tolerance=0.2
+    bench=Bench(repeat=repeat)
+    run_all(bench,data_dir)
+    bench.report()
+    if baseline_path:
+        try:
+            regressions=bench.compare(baseline_path,tolerance)
+        except OSError:
+            bench.save(baseline_path)
+            print("baseline saved to",baseline_path)
+            regressions=[]
+        for r in regressions:
+            print("regression:",r)
+        if regressions:
+            sys.exit(1)
@@ -1,9 +1,14 @@
 from libs.PipeLine import ScopedTiming
+from libs.Utils import shares_memory
 import nncase_runtime as nn
 import ulab.numpy as np
 
+# 将预处理参数转换为可哈希的元组，用作build缓存的key
+def to_key(params):
+    return tuple(tuple(p) if isinstance(p,list) else p for p in params)
+
 class Ai2d:
-    def __init__(self,debug_mode=0):
+    def __init__(self,debug_mode=0,cache_size=8,input_cache_size=4):
         # 预处理ai2d
         self.ai2d=nn.ai2d()
         # ai2d计算过程中的输入输出数据类型，输入输出数据格式
@@ -14,11 +19,31 @@ class Ai2d:
         self.ai2d_input_tensor=None
         # ai2d输出tensor对象
         self.ai2d_output_tensor=None
+        # ai2d输出是否绑定到外部tensor(如kmodel的输入tensor)，绑定后build不再分配输出tensor
+        self.output_bound=False
+        # 当前已设置的预处理参数，key为预处理操作名，用于构造build缓存的key
+        self.params={}
+        # build缓存，key为(预处理参数,输入shape,输出shape)，value为ai2d_builder
+        # 仿射矩阵通常每帧都不同(如人脸对齐)，ai2d_builder在build时固定参数，设置了affine时不缓存
+        self.build_cache={}
+        # 输出tensor按输出shape共享，不同的构造器和缓存条目不再各自持有一块输出buffer
+        self.output_tensors={}
+        # ai2d输入tensor缓存，元素为(输入array,输入tensor)，同一个array(如PipeLine的帧缓冲)不再每帧调用from_numpy
+        self.input_tensors=[]
+        # 输入tensor缓存的最大条目数，默认与PipeLine默认的帧缓冲数一致，缓存中的array在被淘汰前不会释放
+        self.input_cache_size=input_cache_size
+        # from_numpy创建的tensor是否与array共享内存，第一次run时检查，None表示尚未检查，不共享时每次都重新创建输入tensor
+        self.input_alias=None
+        # build缓存key的使用顺序，最近使用的在末尾，超出cache_size时淘汰最久未使用的
+        self.build_cache_keys=[]
+        # build缓存的最大条目数，0表示不缓存
+        self.cache_size=cache_size
         self.debug_mode=debug_mode
 
     # 设置ai2d计算过程中的输入输出数据类型，输入输出数据格式
     def set_ai2d_dtype(self,input_format,output_format,input_type,output_type):
         self.ai2d.set_dtype(input_format,output_format,input_type,output_type)
+        self.params["dtype"]=to_key([input_format,output_format,input_type,output_type])
 
     # 预处理crop函数
     # start_x：宽度方向的起始像素,int类型
@@ -28,12 +53,14 @@ class Ai2d:
     def crop(self,start_x,start_y,width,height):
         with ScopedTiming("init ai2d crop",self.debug_mode > 0):
             self.ai2d.set_crop_param(True,start_x,start_y,width,height)
+            self.params["crop"]=to_key([start_x,start_y,width,height])
 
     # 预处理shift函数
     # shift_val:右移的比特数,int类型
     def shift(self,shift_val):
         with ScopedTiming("init ai2d shift",self.debug_mode > 0):
             self.ai2d.set_shift_param(True,shift_val)
+            self.params["shift"]=to_key([shift_val])
 
     # 预处理pad函数
     # paddings:各个维度的padding, size=8，分别表示dim0到dim4的前后padding的个数，其中dim0/dim1固定配置{0, 0},list类型
@@ -42,6 +69,7 @@ class Ai2d:
     def pad(self,paddings,pad_mode,pad_val):
         with ScopedTiming("init ai2d pad",self.debug_mode > 0):
             self.ai2d.set_pad_param(True,paddings,pad_mode,pad_val)
+            self.params["pad"]=to_key([paddings,pad_mode,pad_val])
 
     # 预处理resize函数
     # interp_method:resize插值方法，ai2d_interp_method类型
@@ -49,6 +77,7 @@ class Ai2d:
     def resize(self,interp_method,interp_mode):
         with ScopedTiming("init ai2d resize",self.debug_mode > 0):
             self.ai2d.set_resize_param(True,interp_method,interp_mode)
+            self.params["resize"]=to_key([interp_method,interp_mode])
 
     # 预处理affine函数
     # interp_method:Affine采用的插值方法,ai2d_interp_method类型
@@ -60,19 +89,71 @@ class Ai2d:
     def affine(self,interp_method,crop_round,bound_ind,bound_val,bound_smooth,M):
         with ScopedTiming("init ai2d affine",self.debug_mode > 0):
             self.ai2d.set_affine_param(True,interp_method,crop_round,bound_ind,bound_val,bound_smooth,M)
+            self.params["affine"]=to_key([interp_method,crop_round,bound_ind,bound_val,bound_smooth,M])
+
+    # 将ai2d的输出绑定到外部tensor，通常为kpu.get_input_tensor(i)，预处理结果直接写入kmodel输入，不再额外分配和拷贝
+    # output_tensor:绑定的输出tensor，shape需和build时的ai2d_output_shape一致，传入None解除绑定
+    def set_output_tensor(self,output_tensor):
+        self.ai2d_output_tensor=output_tensor
+        self.output_bound=output_tensor is not None
 
-    # 构造ai2d预处理器
+    # 构造ai2d预处理器，预处理参数和输入输出shape都相同时直接复用缓存中的构造器，跳过ai2d.build
     def build(self,ai2d_input_shape,ai2d_output_shape,input_np=None):
         with ScopedTiming("ai2d build",self.debug_mode > 0):
-            # ai2d构造函数
-            self.ai2d_builder = self.ai2d.build(ai2d_input_shape, ai2d_output_shape)
+            key=(tuple(sorted(self.params.items())),tuple(ai2d_input_shape),tuple(ai2d_output_shape))
+            if key in self.build_cache:
+                self.ai2d_builder=self.build_cache[key]
+                self.build_cache_keys.remove(key)
+                self.build_cache_keys.append(key)
+            else:
+                # ai2d构造函数
+                self.ai2d_builder = self.ai2d.build(ai2d_input_shape, ai2d_output_shape)
+                if self.cache_size>0 and "affine" not in self.params:
+                    self.build_cache[key]=self.ai2d_builder
+                    self.build_cache_keys.append(key)
+                    if len(self.build_cache_keys)>self.cache_size:
+                        del self.build_cache[self.build_cache_keys.pop(0)]
+            # 输出已绑定到kmodel输入tensor时，直接写入该tensor，不再分配输出tensor
+            if not self.output_bound:
+                self.ai2d_output_tensor=self.get_output_tensor(ai2d_output_shape)
+
+    # 获取输出shape对应的共享输出tensor，第一次使用该shape时分配
+    def get_output_tensor(self,ai2d_output_shape):
+        shape=tuple(ai2d_output_shape)
+        output_tensor=self.output_tensors.get(shape)
+        if output_tensor is None:
             # 定义ai2d输出数据(即kmodel的输入数据，所以数据分辨率和模型的input_size一致)，并转换成tensor
-            output_data = np.ones((ai2d_output_shape[0],ai2d_output_shape[1],ai2d_output_shape[2],ai2d_output_shape[3]),dtype=np.uint8)
-            self.ai2d_output_tensor = nn.from_numpy(output_data)
+            output_data = np.ones(shape,dtype=np.uint8)
+            output_tensor = nn.from_numpy(output_data)
+            self.output_tensors[shape]=output_tensor
+        return output_tensor
+
+    # 清空build缓存
+    def clear_cache(self):
+        self.build_cache={}
+        self.build_cache_keys=[]
+
+    # 获取输入array对应的tensor，与array共享内存时复用缓存中的tensor，array原地更新后tensor中即为新数据
+    def get_input_tensor(self,input_np):
+        for item in self.input_tensors:
+            if item[0] is input_np:
+                return item[1]
+        input_tensor=nn.from_numpy(input_np)
+        if self.input_alias is None:
+            self.input_alias=shares_memory(input_np,input_tensor)
+        if self.input_alias and self.input_cache_size>0:
+            self.input_tensors.append((input_np,input_tensor))
+            if len(self.input_tensors)>self.input_cache_size:
+                self.input_tensors.pop(0)
+        return input_tensor
 
     # 使用ai2d完成预处理
-    def run(self,input_np):
-        self.ai2d_input_tensor = nn.from_numpy(input_np)
+    # output_tensor:本次预处理结果写入的tensor，如batch输入中某个位置的tensor，不改变输出绑定和build缓存，None时写入当前输出tensor
+    def run(self,input_np,output_tensor=None):
+        # from_numpy不保证与array共享内存，共享时同一个array复用输入tensor，否则每次都重新创建
+        self.ai2d_input_tensor = self.get_input_tensor(input_np)
+        if output_tensor is None:
+            output_tensor=self.ai2d_output_tensor
         # 运行ai2d做初始化
-        self.ai2d_builder.run(self.ai2d_input_tensor, self.ai2d_output_tensor)
-        return self.ai2d_output_tensor
+        self.ai2d_builder.run(self.ai2d_input_tensor, output_tensor)
+        return output_tensor
@@ -1,4 +1,7 @@
-from libs.PipeLine import ScopedTiming
+from libs.PipeLine import ScopedTiming, timing
+from libs import MemStats
+from libs import ModelRegistry
+from libs.Utils import shares_memory
 import os
 import ujson
 from media.sensor import *
@@ -16,7 +19,7 @@ import sys
 
 # AIBase类别主要抽象的是AI任务推理流程
 class AIBase:
-    def __init__(self,kmodel_path,model_input_size=None,rgb888p_size=None,debug_mode=0):
+    def __init__(self,kmodel_path,model_input_size=None,rgb888p_size=None,debug_mode=0,output_mode="copy",share_kmodel=True):
         # kmodel路径
         self.kmodel_path=kmodel_path
         # 模型输入分辨率
@@ -25,13 +28,41 @@ class AIBase:
         self.rgb888p_size=rgb888p_size
         # 调试模式
         self.debug_mode=debug_mode
-        # kpu对象
-        self.kpu=nn.kpu()
-        self.kpu.load_kmodel(self.kmodel_path)
+        # kpu对象，默认从进程内共享缓存获取，同一个kmodel只加载一次；需要在多个线程中并行推理同一个模型时设share_kmodel=False独占一个kpu
+        # 共享kpu的实例需要在同一个线程中依次推理，具体实现请打开/sdcard/app/libs/ModelRegistry.py查看
+        self.model=ModelRegistry.acquire(self.kmodel_path,share_kmodel)
+        self.kpu=self.model.kpu
+        # 内存统计的阶段名，按任务类名区分，预先拼接好，每帧不再分配字符串
+        name=self.__class__.__name__
+        self.mem_stages=(name+".preprocess",name+".inference",name+".postprocess")
         self.cur_img=None
         self.tensors=[]
+        # 已绑定为ai2d输出的kmodel输入tensor，key为输入索引
+        self.bound_input_tensors={}
         # 推理结果列表
         self.results=[]
+        # 输出模式，支持"copy"和"reuse"
+        # "copy":每帧调用to_numpy()拷贝出新的输出array，结果可以跨帧保存
+        # "reuse":首帧拷贝出的输出array作为持久buffer，用from_numpy包装后绑定为kmodel输出tensor，之后kpu每帧直接写入，不再分配新的array
+        # from_numpy不保证与array共享内存，绑定前用shares_memory做一次不改动数据的检查，
+        # 不共享时打印提示并回退为"copy"模式，结果仍然正确，只是没有省去拷贝
+        # "reuse"模式下inference返回的array(以及postprocess中对它们的切片)在下一次inference时会被覆盖，需要跨帧保存的数据请自行copy()
+        # 共享kmodel时，推理前按实例切换输出绑定：reuse模式实例绑定自己的持久buffer，copy模式实例恢复kmodel自身的输出tensor
+        if output_mode not in ["copy","reuse"]:
+            print("Please select the correct output_mode parameter, including 'copy', 'reuse'.")
+            output_mode="copy"
+        self.output_mode=output_mode
+        # reuse模式下的持久输出buffer和绑定到kmodel输出的tensor
+        self.output_buffers=[]
+        self.output_tensors=[]
+        # 模型batch维度，首次调用run_batch时从kmodel输入tensor获取
+        self.batch_size=None
+        # batch维度大于1时，多个ROI预处理结果拼接成的batch输入array和tensor
+        self.batch_input=None
+        self.batch_input_tensor=None
+        # batch输入每个位置的tensor，ai2d直接写入，batch_direct为False时不使用
+        self.batch_slots=[]
+        self.batch_direct=False
 
     def get_kmodel_inputs_num(self):
         return self.kpu.inputs_size()
@@ -39,28 +70,87 @@ class AIBase:
     def get_kmodel_outputs_num(self):
         return self.kpu.outputs_size()
     
+    # 将ai2d的输出直接绑定到kmodel的第index个输入tensor，需在创建self.ai2d之后调用
+    # 绑定后ai2d预处理结果直接写入kpu输入，不再分配ai2d输出tensor，也不再每帧调用set_input_tensor
+    def bind_ai2d_output(self,index=0):
+        input_tensor=self.kpu.get_input_tensor(index)
+        self.ai2d.set_output_tensor(input_tensor)
+        self.bound_input_tensors[index]=input_tensor
+
+    # 切换输出模式，"copy"或"reuse"
+    def set_output_mode(self,output_mode):
+        if output_mode not in ["copy","reuse"]:
+            print("Please select the correct output_mode parameter, including 'copy', 'reuse'.")
+            return
+        self.restore_output_tensors()
+        self.output_mode=output_mode
+
+    # 恢复kmodel自身的输出tensor，清除reuse模式的持久buffer
+    def restore_output_tensors(self):
+        if self.model is not None:
+            for i in range(len(self.model.kpu_outputs)):
+                self.kpu.set_output_tensor(i, self.model.kpu_outputs[i])
+            # 共享kpu的其它实例下次推理时重新设置自己的绑定
+            self.model.owner=None
+        self.output_buffers=[]
+        self.output_tensors=[]
+
     def preprocess(self,input_np):
-        with ScopedTiming("preprocess",self.debug_mode > 0):
+        with timing("preprocess",self.debug_mode > 0):
             return [self.ai2d.run(input_np)]
 
     def inference(self,tensors):
-        with ScopedTiming("set input",self.debug_mode > 0):
-            self.results.clear()
+        with timing("set input",self.debug_mode > 0):
+            # 共享的kpu上一次被其它实例使用过，输入输出tensor的绑定可能已被修改，全部重新设置
+            rebind=self.model.owner is not self
+            if rebind:
+                self.model.owner=self
+                # reuse模式绑定自己的持久buffer，否则恢复kmodel自身的输出tensor，避免写入其它实例的持久buffer
+                outputs=self.output_tensors if self.output_tensors else self.model.kpu_outputs
+                for i in range(len(outputs)):
+                    self.kpu.set_output_tensor(i, outputs[i])
             for i in range(self.kpu.inputs_size()):
+                # 输入tensor已是kmodel自身的输入tensor时无需重新设置
+                if not rebind and self.bound_input_tensors.get(i) is tensors[i]:
+                    continue
                 # 将ai2d的输出tensor绑定为kmodel的输入数据
                 self.kpu.set_input_tensor(i, tensors[i])
-        with ScopedTiming("kpu run",self.debug_mode > 0):
+        with timing("kpu run",self.debug_mode > 0):
             # 运行kmodel做推理
             self.kpu.run()
-        with ScopedTiming("get output",self.debug_mode > 0):
+        with timing("get output",self.debug_mode > 0):
+            # reuse模式下kpu已将输出直接写入持久buffer
+            if self.output_mode=="reuse" and self.output_buffers:
+                self.results=self.output_buffers
+                return self.results
             # 获取kmodel的推理输出tensor,输出可能为多个，因此返回的是一个列表
+            self.results=[]
             for i in range(self.kpu.outputs_size()):
                 output_data = self.kpu.get_output_tensor(i)
                 result = output_data.to_numpy()
                 self.results.append(result)
                 del output_data
+            if self.output_mode=="reuse":
+                self.bind_output_buffers(self.results)
             return self.results
 
+    # reuse模式：将本帧拷贝出的输出array绑定为kmodel的输出tensor，之后的推理结果直接写入这些array
+    # 任一输出的tensor与array不共享内存时不绑定，回退为"copy"模式
+    def bind_output_buffers(self,results):
+        tensors=[nn.from_numpy(result) for result in results]
+        for i in range(len(results)):
+            if not shares_memory(results[i],tensors[i]):
+                print("{}: output tensor created by from_numpy does not share memory, fall back to 'copy' output_mode".format(self.__class__.__name__))
+                self.output_mode="copy"
+                return
+        if not self.model.kpu_outputs:
+            # 第一次绑定持久buffer之前记录kmodel自身的输出tensor
+            self.model.kpu_outputs=[self.kpu.get_output_tensor(i) for i in range(len(results))]
+        for i in range(len(tensors)):
+            self.kpu.set_output_tensor(i, tensors[i])
+        self.output_tensors=tensors
+        self.output_buffers=results
+
     # 基类后处理接口
     def postprocess(self,results):
         return
@@ -69,18 +159,108 @@ class AIBase:
     def run(self,input_np):
         self.cur_img=input_np
         self.tensors.clear()
-        self.tensors=self.preprocess(input_np)
-        self.results=self.inference(self.tensors)
-        return self.postprocess(self.results)
+        with MemStats.stage(self.mem_stages[0]):
+            self.tensors=self.preprocess(input_np)
+        with MemStats.stage(self.mem_stages[1]):
+            self.results=self.inference(self.tensors)
+        with MemStats.stage(self.mem_stages[2]):
+            return self.postprocess(self.results)
+
+    # 按单个ROI配置预处理
+    def config_roi(self,roi):
+        if isinstance(roi,dict):
+            self.config_preprocess(**roi)
+        else:
+            self.config_preprocess(roi)
+
+    # 多ROI批量推理，一次调用返回所有ROI的后处理结果列表
+    # input_np:输入数据，所有ROI共用同一帧时传入一个array，每个ROI输入不同时(如抠图后的车牌)传入与rois等长的array列表
+    # rois:每个ROI的预处理配置，依次传给config_preprocess，可以是检测框、五官点、仿射矩阵等，dict类型时作为关键字参数传入
+    # 每个ROI的预处理背靠背执行，ai2d构造器有缓存，输入输出tensor复用；模型batch维度大于1时(仅支持单输入模型)，多个ROI拼成一个batch一次推理
+    # 注意：output_mode为"reuse"时，postprocess需返回拷贝而不是输出buffer的切片，否则会被后面ROI的推理覆盖
+    def run_batch(self,input_np,rois):
+        res=[]
+        if len(rois)==0:
+            return res
+        inputs=input_np if isinstance(input_np,list) else [input_np]*len(rois)
+        if self.batch_size is None:
+            self.batch_size=self.kpu.get_input_tensor(0).shape[0]
+        if self.batch_size<=1:
+            for roi,img in zip(rois,inputs):
+                self.config_roi(roi)
+                res.append(self.run(img))
+            return res
+        with timing("run batch",self.debug_mode > 0):
+            for start in range(0,len(rois),self.batch_size):
+                num=min(self.batch_size,len(rois)-start)
+                for b in range(num):
+                    self.config_roi(rois[start+b])
+                    self.cur_img=inputs[start+b]
+                    if self.batch_direct:
+                        # ai2d直接写入batch输入的第b个位置
+                        with timing("preprocess",self.debug_mode > 0):
+                            self.ai2d.run(self.cur_img,self.batch_slots[b])
+                        continue
+                    output_np=self.preprocess(self.cur_img)[0].to_numpy()
+                    if self.batch_input is None:
+                        self.init_batch_input(output_np)
+                    # 将单个ROI的预处理结果写入batch输入的第b个位置
+                    self.batch_input[b]=output_np[0]
+                if num<self.batch_size:
+                    # 最后一个batch不满时清零未使用的位置，不再带着上一个batch的数据推理
+                    self.batch_input[num:]=0
+                if not self.batch_direct:
+                    self.batch_input_tensor=nn.from_numpy(self.batch_input)
+                self.results=self.inference([self.batch_input_tensor])
+                # 按batch维度拆分输出，每个ROI的后处理输入保持batch维度为1
+                for b in range(num):
+                    self.cur_img=inputs[start+b]
+                    res.append(self.postprocess([result[b:b+1] for result in self.results]))
+        return res
+
+    # 按首个ROI的预处理结果分配batch输入，output_np为(1,...)的预处理结果
+    # 使用基类的ai2d预处理、且from_numpy创建的tensor与batch输入及其每个位置共享内存时，ai2d直接写入batch输入的对应位置，
+    # batch输入tensor只绑定一次；否则每个ROI的预处理结果拷贝到batch输入，每个batch重新创建输入tensor
+    def init_batch_input(self,output_np):
+        self.batch_input=np.zeros((self.batch_size,)+tuple(output_np.shape[1:]),dtype=output_np.dtype)
+        if type(self).preprocess is not AIBase.preprocess:
+            return
+        tensor=nn.from_numpy(self.batch_input)
+        slots=[nn.from_numpy(self.batch_input[b:b+1]) for b in range(self.batch_size)]
+        if not shares_memory(self.batch_input,tensor):
+            return
+        for b in range(self.batch_size):
+            if not shares_memory(self.batch_input[b:b+1],slots[b]):
+                return
+        self.batch_input_tensor=tensor
+        self.batch_slots=slots
+        self.batch_direct=True
+        self.kpu.set_input_tensor(0,tensor)
+        self.bound_input_tensors[0]=tensor
+
+    # 释放kmodel引用，共享的kmodel在最后一个实例释放后才被删除
+    def release_kmodel(self):
+        if self.model is not None:
+            ModelRegistry.release(self.model)
+            self.model=None
+        self.kpu=None
 
     # AIBase销毁函数
     def deinit(self):
         with ScopedTiming("deinit",self.debug_mode > 0):
-            del self.kpu
+            self.restore_output_tensors()
+            self.release_kmodel()
             if hasattr(self,"ai2d"):
                 del self.ai2d
+            self.bound_input_tensors.clear()
+            self.output_tensors=[]
+            self.output_buffers=[]
+            self.batch_input=None
+            self.batch_input_tensor=None
+            self.batch_slots=[]
+            self.batch_direct=False
             self.tensors.clear()
             del self.tensors
-            gc.collect()
-            nn.shrink_memory_pool()
+            MemStats.collect(True)
+            MemStats.shrink_pool()
             time.sleep_ms(100)
@@ -0,0 +1,270 @@
+from media.pyaudio import *                     # 音频模块
+from media.media import *                       # 软件抽象模块，主要封装媒体数据链路以及媒体缓冲区
+import media.wave as wave                       # wav音频处理模块
+import _thread
+import struct
+import time
+
+# 常驻音频输出服务，PyAudio、MediaManager和输出流只初始化一次，多次播放之间保持打开
+# 后台线程从队列中取出pcm数据写入输出流，调用方只负责入队，不会被播放阻塞
+# 播放完成按已写入数据的时长判断，不再在每次播放后固定sleep
+# rate:采样率 channels:声道数 sample_width:每个采样点的字节数，2对应paInt16
+# chunk:输出流buffer帧数，默认0.3s
+# queue_size:队列中最多缓存的pcm数据块数，队列满时write阻塞等待
+# init_media:是否由服务负责MediaManager的初始化和释放，应用已初始化时设为False
+class AudioPlayer:
+    def __init__(self,rate=24000,channels=1,sample_width=2,chunk=None,queue_size=8,init_media=True):
+        self.rate=rate
+        self.channels=channels
+        self.sample_width=sample_width
+        self.chunk=chunk if chunk else int(0.3*rate)
+        self.queue_size=queue_size
+        self.init_media=init_media
+        # 每秒的字节数，用于把写入的数据换算为播放时长
+        self.bytes_per_second=rate*channels*sample_width
+        self.queue=[]
+        self.lock=_thread.allocate_lock()
+        # 队列中有新数据的通知，后台线程在队列为空时阻塞在该锁上，write和destroy释放该锁唤醒后台线程
+        self.data_ready=_thread.allocate_lock()
+        self.data_ready.acquire()
+        self.p=None
+        self.stream=None
+        self.running=False
+        self.worker_done=True
+        # 正在写入输出流的数据块数
+        self.busy=0
+        # 已写入输出流的数据全部播放完的时间点，单位ms
+        self.play_end_ms=0
+
+    # 初始化音频输出流并启动后台播放线程
+    def create(self):
+        if self.stream is not None:
+            return
+        self.p=PyAudio()
+        self.p.initialize(self.chunk)
+        if self.init_media:
+            ret=MediaManager.init()
+            if ret:
+                print("AudioPlayer, buffer_init failed")
+        self.stream=self.p.open(format=self.p.get_format_from_width(self.sample_width),channels=self.channels,rate=self.rate,output=True,frames_per_buffer=self.chunk)
+        self.running=True
+        self.worker_done=False
+        _thread.start_new_thread(self.worker,())
+
+    # 设置输出音量
+    def volume(self,vol):
+        self.stream.volume(vol=vol)
+
+    # 后台播放线程
+    def worker(self):
+        while self.running:
+            data=None
+            self.lock.acquire()
+            if self.queue:
+                data=self.queue.pop(0)
+                self.busy+=1
+            self.lock.release()
+            if data is None:
+                # 队列为空，阻塞等待新数据或停止通知
+                self.data_ready.acquire()
+                continue
+            self.stream.write(data)
+            now=time.ticks_ms()
+            # write返回时数据已进入输出buffer，按数据时长顺延播放结束时间
+            start=self.play_end_ms if time.ticks_diff(self.play_end_ms,now)>0 else now
+            self.play_end_ms=time.ticks_add(start,len(data)*1000//self.bytes_per_second)
+            self.lock.acquire()
+            self.busy-=1
+            self.lock.release()
+        self.worker_done=True
+
+    # pcm数据入队，data为bytes或者ulab array，队列满时等待
+    def write(self,data):
+        if not isinstance(data,(bytes,bytearray)):
+            data=data.tobytes()
+        while True:
+            self.lock.acquire()
+            if len(self.queue)<self.queue_size:
+                self.queue.append(data)
+                self.notify()
+                self.lock.release()
+                return
+            self.lock.release()
+            time.sleep_ms(2)
+
+    # 唤醒等待数据的后台线程，已有未处理的通知时不重复释放
+    def notify(self):
+        if self.data_ready.locked():
+            self.data_ready.release()
+
+    # 按chunk读取wav文件并入队，wav参数需要与输出流一致
+    def play_file(self,filename):
+        wf=wave.open(filename,"rb")
+        try:
+            data=wf.read_frames(self.chunk)
+            while data:
+                self.write(data)
+                data=wf.read_frames(self.chunk)
+        finally:
+            wf.close()
+
+    # 队列和输出流中的数据是否已全部播放完
+    def idle(self):
+        self.lock.acquire()
+        pending=len(self.queue)+self.busy
+        self.lock.release()
+        return pending==0 and time.ticks_diff(self.play_end_ms,time.ticks_ms())<=0
+
+    # 等待已入队的数据全部播放完，timeout_ms为0表示一直等待，返回是否播放完
+    def wait_done(self,timeout_ms=0):
+        start=time.ticks_ms()
+        while not self.idle():
+            if timeout_ms>0 and time.ticks_diff(time.ticks_ms(),start)>=timeout_ms:
+                return False
+            time.sleep_ms(5)
+        return True
+
+    # 丢弃尚未播放的数据
+    def flush(self):
+        self.lock.acquire()
+        self.queue.clear()
+        self.lock.release()
+
+    # 停止后台线程并释放音频资源
+    def destroy(self):
+        if self.stream is None:
+            return
+        self.lock.acquire()
+        self.running=False
+        self.notify()
+        self.lock.release()
+        while not self.worker_done:
+            time.sleep_ms(2)
+        self.stream.stop_stream()
+        self.stream.close()
+        self.p.terminate()
+        if self.init_media:
+            MediaManager.deinit()
+        self.stream=None
+        self.p=None
+        self.queue.clear()
+
+# 流式wav写入，文件头在打开时写入，数据块直接写入文件，关闭时回填文件头中的长度字段
+# 长时间录音不再把所有数据块保存在内存中最后再拼接
+# buffer_size:双缓冲大小(字节)，0表示每个数据块直接写文件
+#             大于0时数据先拷贝到固定大小的buffer，写满后交给后台线程写入SD卡，另一块buffer继续接收数据，
+#             SD卡写入出现卡顿时不会阻塞采集；后台线程未写完时只能同步等待，次数记录在overruns中
+class WavWriter:
+    def __init__(self,filename,channels,sample_width,rate,buffer_size=0):
+        self.channels=channels
+        self.sample_width=sample_width
+        self.rate=rate
+        # 已写入的音频数据字节数
+        self.data_size=0
+        self.overruns=0
+        self.f=open(filename,"wb")
+        self.write_header()
+        self.buffer_size=buffer_size
+        if buffer_size>0:
+            self.buffers=[bytearray(buffer_size),bytearray(buffer_size)]
+            self.mvs=[memoryview(b) for b in self.buffers]
+            # 当前接收数据的buffer序号及已填充的字节数
+            self.active=0
+            self.fill=0
+            # 等待后台线程写入的(buffer序号,长度)
+            self.pending=None
+            self.lock=_thread.allocate_lock()
+            self.running=True
+            self.worker_done=False
+            # 后台线程写文件时的异常，由submit和close在调用方线程中重新抛出
+            self.error=None
+            _thread.start_new_thread(self.worker,())
+
+    def write_header(self):
+        byte_rate=self.rate*self.channels*self.sample_width
+        block_align=self.channels*self.sample_width
+        self.f.seek(0)
+        self.f.write(struct.pack("<4sI4s4sIHHIIHH4sI",b"RIFF",36+self.data_size,b"WAVE",b"fmt ",16,1,self.channels,
+                                 self.rate,byte_rate,block_align,self.sample_width*8,b"data",self.data_size))
+
+    # 后台写文件线程，写入出错时保存异常并退出
+    def worker(self):
+        try:
+            while True:
+                self.lock.acquire()
+                job=self.pending
+                running=self.running
+                self.lock.release()
+                if job is None:
+                    if not running:
+                        break
+                    time.sleep_ms(2)
+                    continue
+                self.f.write(self.mvs[job[0]][:job[1]])
+                self.lock.acquire()
+                self.pending=None
+                self.lock.release()
+        except Exception as e:
+            self.error=e
+        finally:
+            self.worker_done=True
+
+    # 把当前buffer交给后台线程写入，后台线程仍在写上一块时等待
+    def submit(self):
+        waited=False
+        while True:
+            self.lock.acquire()
+            if self.pending is None:
+                self.pending=(self.active,self.fill)
+                self.lock.release()
+                break
+            self.lock.release()
+            # 后台线程已出错退出，不会再取走数据
+            if self.worker_done:
+                raise self.error if self.error else OSError("wav writer thread exited")
+            waited=True
+            time.sleep_ms(1)
+        if waited:
+            self.overruns+=1
+        self.active=1-self.active
+        self.fill=0
+
+    # 写入一段pcm数据
+    def write(self,data):
+        n=len(data)
+        self.data_size+=n
+        if self.buffer_size<=0:
+            self.f.write(data)
+            return
+        data=memoryview(data)
+        pos=0
+        while pos<n:
+            m=min(n-pos,self.buffer_size-self.fill)
+            self.mvs[self.active][self.fill:self.fill+m]=data[pos:pos+m]
+            self.fill+=m
+            pos+=m
+            if self.fill==self.buffer_size:
+                self.submit()
+
+    # 写入剩余数据，回填文件头并关闭文件
+    def close(self):
+        if self.f is None:
+            return
+        try:
+            if self.buffer_size>0:
+                try:
+                    if self.fill>0 and self.error is None:
+                        self.submit()
+                finally:
+                    self.lock.acquire()
+                    self.running=False
+                    self.lock.release()
+                    while not self.worker_done:
+                        time.sleep_ms(2)
+            self.write_header()
+        finally:
+            self.f.close()
+            self.f=None
+        # 后台线程写入出错时，在调用方线程中重新抛出
+        if self.buffer_size>0 and self.error is not None:
+            raise self.error
@@ -0,0 +1,160 @@
+import sys
+import time
+import gc
+import ulab.numpy as np
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+# 后处理基准测试工具，对同一个函数重复运行N次，统计p50/p95/p99耗时和单次调用的内存分配
+# 输入数据为录制的kpu输出tensor，目录结构与Sim.record_outputs一致:
+#   <data_dir>/<kmodel名>/model.json       输出tensor的shape和dtype
+#   <data_dir>/<kmodel名>/<帧序号>_<输出序号>.bin   输出tensor的原始数据
+# 板端和主机(Sim仿真后端)均可运行，结果可保存为json基线，之后的运行与基线比较发现性能回退
+
+# numpy的dtype名到ulab dtype的映射
+DTYPES={"uint8":np.uint8,"int8":np.int8,"uint16":np.uint16,"int16":np.int16,"float32":np.float}
+
+# 当前时间，单位us
+def now_us():
+    if hasattr(time,"ticks_us"):
+        return time.ticks_us()
+    return time.perf_counter_ns()//1000
+
+def diff_us(end,start):
+    if hasattr(time,"ticks_diff"):
+        return time.ticks_diff(end,start)
+    return end-start
+
+# 读取一个.bin文件，返回指定shape和dtype的array
+def load_tensor(path,shape,dtype="float32"):
+    with open(path,"rb") as f:
+        data=f.read()
+    return np.frombuffer(data,dtype=DTYPES[dtype]).reshape(tuple(shape))
+
+# 读取一个kmodel录制的所有帧，返回[[输出0,输出1,...],...]，没有录制数据时返回空列表
+def load_frames(data_dir,name,max_frames=0):
+    model_dir=data_dir+"/"+name
+    try:
+        with open(model_dir+"/model.json","r") as f:
+            info=json.load(f)
+    except OSError:
+        return []
+    frames=[]
+    while max_frames<=0 or len(frames)<max_frames:
+        try:
+            frames.append([load_tensor("{}/{}_{}.bin".format(model_dir,len(frames),i),o["shape"],o["dtype"])
+                           for i,o in enumerate(info["outputs"])])
+        except OSError:
+            break
+    return frames
+
+# 第p百分位数(最近秩法)，values为已排序的列表
+def percentile(values,p):
+    n=len(values)
+    if n==0:
+        return 0
+    k=(p*n+99)//100-1
+    return values[min(max(k,0),n-1)]
+
+# 内存分配统计，板端为gc堆上新分配的字节数，主机为tracemalloc统计的峰值增量
+class AllocMeter:
+    def __init__(self):
+        self.tracemalloc=None
+        # 主机上Sim会补齐gc.mem_alloc，按解释器区分板端和主机
+        if sys.implementation.name!="micropython":
+            import tracemalloc
+            self.tracemalloc=tracemalloc
+
+    # 测量单次调用fn(*args)的内存分配，单位字节
+    def measure(self,fn,args):
+        gc.collect()
+        if self.tracemalloc is None:
+            # 关闭gc，调用期间分配的内存不会被回收，mem_alloc的增量即分配总量
+            gc.disable()
+            start=gc.mem_alloc()
+            try:
+                fn(*args)
+            finally:
+                used=gc.mem_alloc()-start
+                gc.enable()
+            return used
+        tm=self.tracemalloc
+        tm.start()
+        try:
+            start=tm.get_traced_memory()[0]
+            fn(*args)
+            peak=tm.get_traced_memory()[1]
+        finally:
+            tm.stop()
+        return peak-start
+
+# repeat:计时运行次数 warmup:预热次数，不计入统计 alloc_runs:内存分配统计的运行次数，取最大值
+class Bench:
+    def __init__(self,repeat=100,warmup=5,alloc_runs=3):
+        self.repeat=repeat
+        self.warmup=warmup
+        self.alloc_runs=alloc_runs
+        self.alloc=AllocMeter()
+        # 每个测试项的统计结果，按运行顺序排列
+        self.results=[]
+        # 因依赖的模块或函数不可用(如主机上的aidemo/aicube)而跳过的测试项，[(名称,原因),...]
+        self.skipped=[]
+
+    # 运行一个测试项，frames为参数列表的列表，第i次运行使用frames[i%len(frames)]
+    # 计时与内存统计分开运行，tracemalloc的开销不会计入耗时
+    # 第一次调用抛出ImportError时跳过该测试项，返回None
+    def run(self,name,fn,frames):
+        n=len(frames)
+        try:
+            fn(*frames[0])
+        except ImportError as e:
+            print("skip {}: {}".format(name,e))
+            self.skipped.append((name,str(e)))
+            return None
+        for i in range(1,self.warmup):
+            fn(*frames[i%n])
+        times=[]
+        for i in range(self.repeat):
+            args=frames[i%n]
+            start=now_us()
+            fn(*args)
+            times.append(diff_us(now_us(),start))
+        times.sort()
+        alloc=0
+        for i in range(self.alloc_runs):
+            alloc=max(alloc,self.alloc.measure(fn,frames[i%n]))
+        res={"name":name,"runs":self.repeat,"frames":n,
+             "p50_ms":percentile(times,50)/1000,"p95_ms":percentile(times,95)/1000,
+             "p99_ms":percentile(times,99)/1000,"max_ms":times[-1]/1000,"alloc_bytes":alloc}
+        self.results.append(res)
+        return res
+
+    # 打印所有测试项的统计结果
+    def report(self):
+        print("{:<32}{:>8}{:>10}{:>10}{:>10}{:>12}".format("stage","frames","p50 ms","p95 ms","p99 ms","alloc B"))
+        for r in self.results:
+            print("{:<32}{:>8}{:>10.3f}{:>10.3f}{:>10.3f}{:>12}".format(r["name"],r["frames"],r["p50_ms"],r["p95_ms"],r["p99_ms"],r["alloc_bytes"]))
+        for name,reason in self.skipped:
+            print("{:<32}skipped: {}".format(name,reason))
+
+    # 保存统计结果为json基线
+    def save(self,path):
+        with open(path,"w") as f:
+            json.dump(self.results,f)
+
+    # 与json基线比较，p95耗时或内存分配超过基线(1+tolerance)倍的测试项视为回退
+    # 返回回退描述字符串的列表，基线中没有的测试项不比较
+    def compare(self,path,tolerance=0.2):
+        with open(path,"r") as f:
+            baseline={r["name"]:r for r in json.load(f)}
+        regressions=[]
+        for r in self.results:
+            b=baseline.get(r["name"])
+            if b is None:
+                continue
+            for key in ("p95_ms","alloc_bytes"):
+                if b[key]>0 and r[key]>b[key]*(1+tolerance):
+                    regressions.append("{} {}: {:.3f} -> {:.3f}".format(r["name"],key,b[key],r[key]))
+        return regressions
@@ -0,0 +1,303 @@
+from libs.PipeLine import ScopedTiming
+import os
+import struct
+import ulab.numpy as np
+
+# 特征矩阵元素(np.float)的字节数
+FLOAT_SIZE=np.zeros(1,dtype=np.float).itemsize
+
+# 文件是否存在
+def file_exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+# 打包的人脸特征存储，取代每人一个.bin文件
+# 特征文件布局：文件头 | count行feature_num列的np.float特征矩阵(已L2归一化)，文件头为"<4sHHI"：magic,版本号,特征维度,特征条数
+# 人名表单独存放在<path>.names中，为utf-8编码、以换行分隔的人名，第i行对应特征矩阵第i行，被删除的条目人名为空，compact时才真正移除
+# 注册时只在特征矩阵末尾写入新的一行、重写人名表并最后更新文件头中的条数，已有特征不重写；
+# 人名表很小，通过临时文件+重命名替换；中断时文件头的条数未更新，多写的特征行和人名被忽略，已有存储保持完整
+# 加载时整个特征矩阵一次读入
+class FaceStore:
+    MAGIC=b"KFDB"
+    VERSION=2
+    HEADER="<4sHHI"
+    HEADER_SIZE=struct.calcsize(HEADER)
+
+    def __init__(self,path,feature_num=128):
+        # 特征文件和人名表路径
+        self.path=path
+        self.names_path=path+".names"
+        # 人脸识别特征维度
+        self.feature_num=feature_num
+        # 每行特征的字节数
+        self.row_bytes=feature_num*FLOAT_SIZE
+
+    # 存储是否存在，compact或人名表替换在删除原文件和重命名临时文件之间中断时，用已写完的临时文件恢复
+    def exists(self):
+        if not file_exists(self.path):
+            if not file_exists(self.path+".tmp"):
+                return False
+            # compact中断：特征文件和人名表的临时文件都已写完，一起替换
+            if file_exists(self.names_path+".tmp"):
+                if file_exists(self.names_path):
+                    os.remove(self.names_path)
+                os.rename(self.names_path+".tmp",self.names_path)
+            os.rename(self.path+".tmp",self.path)
+        elif not file_exists(self.names_path) and file_exists(self.names_path+".tmp"):
+            os.rename(self.names_path+".tmp",self.names_path)
+        return True
+
+    # 读取文件头，返回特征条数
+    def read_header(self,f):
+        f.seek(0)
+        magic,version,feature_num,count=struct.unpack(self.HEADER,f.read(self.HEADER_SIZE))
+        if magic!=self.MAGIC or version!=self.VERSION:
+            raise ValueError("invalid face store file: {}".format(self.path))
+        if feature_num!=self.feature_num:
+            raise ValueError("feature_num mismatch: file {}, expect {}".format(feature_num,self.feature_num))
+        return count
+
+    def write_header(self,f,count):
+        f.seek(0)
+        f.write(struct.pack(self.HEADER,self.MAGIC,self.VERSION,self.feature_num,count))
+
+    # 读取人名表，只取前count个，人名表缺失或不足时补空人名
+    def read_names(self,count):
+        try:
+            with open(self.names_path,"rb") as f:
+                names=f.read().decode().split("\n")[:count]
+        except OSError:
+            names=[]
+        while len(names)<count:
+            names.append("")
+        return names
+
+    # 写入人名表的临时文件，返回临时文件路径
+    def write_names_tmp(self,names):
+        tmp_path=self.names_path+".tmp"
+        with open(tmp_path,"wb") as f:
+            f.write("\n".join(names).encode())
+        return tmp_path
+
+    # 通过临时文件+重命名替换人名表
+    def write_names(self,names):
+        tmp_path=self.write_names_tmp(names)
+        if file_exists(self.names_path):
+            os.remove(self.names_path)
+        os.rename(tmp_path,self.names_path)
+
+    # 特征转换为np.float的一行数据
+    def row_data(self,feature):
+        return np.array(feature.reshape((self.feature_num,)),dtype=np.float).tobytes()
+
+    # 整体写入特征文件，features为(len(names),feature_num)的ulab array
+    def write_features(self,path,features,count):
+        with open(path,"wb") as f:
+            self.write_header(f,count)
+            for i in range(count):
+                f.write(self.row_data(features[i,:]))
+
+    # 整体写入人名列表和特征矩阵
+    def write(self,names,features):
+        self.write_features(self.path,features,len(names))
+        self.write_names(names)
+
+    # 加载存储，返回(人名列表,特征矩阵)，特征矩阵一次读入，已删除的条目人名为空
+    def load(self):
+        with open(self.path,"rb") as f:
+            count=self.read_header(f)
+            data=bytearray(count*self.row_bytes)
+            if count>0:
+                f.seek(self.HEADER_SIZE)
+                f.readinto(data)
+        names=self.read_names(count)
+        if count==0:
+            return names,None
+        features=np.frombuffer(data,dtype=np.float).reshape((count,self.feature_num))
+        return names,features
+
+    # 读取人名表
+    def load_names(self):
+        with open(self.path,"rb") as f:
+            count=self.read_header(f)
+        return self.read_names(count)
+
+    # 在特征矩阵末尾追加多条已归一化的特征：写入新的特征行，替换人名表，最后更新文件头的条数
+    def append_rows(self,names,rows):
+        if not self.exists():
+            self.write([],None)
+        with open(self.path,"r+b") as f:
+            count=self.read_header(f)
+            f.seek(self.HEADER_SIZE+count*self.row_bytes)
+            for row in rows:
+                f.write(self.row_data(row))
+            self.write_names(self.read_names(count)+names)
+            self.write_header(f,count+len(rows))
+
+    # 追加一条已归一化的特征，只写入新的一行、人名表和文件头
+    def append(self,name,feature):
+        self.append_rows([name],[feature])
+
+    # 删除指定人名的所有条目，只清空人名表中的人名，特征行在compact时移除，返回清空的条目数
+    def remove(self,name):
+        if not self.exists():
+            return 0
+        names=self.load_names()
+        removed=names.count(name)
+        if removed:
+            self.write_names(["" if n==name else n for n in names])
+        return removed
+
+    # 将目录中旧的每人一个.bin文件(文件名即人名)一次性导入存储，特征在这里做L2归一化
+    # 导入后原文件重命名为.bin.imported保留备份，之后不会重复导入，返回导入的条数
+    def import_dir(self,database_dir):
+        files=[f for f in os.listdir(database_dir) if f.endswith('.bin')]
+        if not files:
+            return 0
+        names=[]
+        rows=[]
+        for db_file in files:
+            with open(database_dir + db_file, 'rb') as f:
+                feature=np.frombuffer(f.read(), dtype=np.float)
+            names.append(db_file.split('.')[0])
+            rows.append(feature/np.linalg.norm(feature))
+        self.append_rows(names,rows)
+        for db_file in files:
+            os.rename(database_dir + db_file, database_dir + db_file + ".imported")
+        return len(files)
+
+    # 压缩存储，移除已删除的条目并回收文件空间，存储不存在或没有已删除的条目时不做处理，返回是否执行了压缩
+    # 特征文件和人名表都先写入临时文件，删除两个原文件后再依次重命名，中断时由exists恢复
+    def compact(self):
+        if not self.exists():
+            return False
+        names,features=self.load()
+        live=[i for i in range(len(names)) if names[i]]
+        if len(live)==len(names):
+            return False
+        compacted=np.zeros((len(live),self.feature_num),dtype=np.float)
+        for j in range(len(live)):
+            compacted[j,:]=features[live[j],:]
+        tmp_path=self.path+".tmp"
+        self.write_features(tmp_path,compacted,len(live))
+        names_tmp_path=self.write_names_tmp([names[i] for i in live])
+        os.remove(self.path)
+        if file_exists(self.names_path):
+            os.remove(self.names_path)
+        os.rename(tmp_path,self.path)
+        os.rename(names_tmp_path,self.names_path)
+        return True
+
+# 人脸特征数据库，所有特征在加入时做一次L2归一化，连续存放在一个(N,feature_num)的矩阵中
+# 查询时用一次矩阵乘法计算与所有已注册人脸的相似度，不再逐个遍历和重复归一化
+class FaceDatabase:
+    def __init__(self,feature_num=128,capacity=64,debug_mode=0):
+        # 人脸识别特征维度
+        self.feature_num=feature_num
+        # 人名列表，与特征矩阵的行一一对应
+        self.names=[]
+        # 特征矩阵，容量不足时按2倍扩容，有效行数为len(self.names)
+        self.features=np.zeros((capacity,feature_num))
+        self.debug_mode=debug_mode
+
+    # 已注册人脸数
+    def size(self):
+        return len(self.names)
+
+    # 清空数据库
+    def reset(self):
+        self.names=[]
+        self.features=np.zeros((self.features.shape[0],self.feature_num))
+
+    # 扩容特征矩阵，保证至少能容纳num个特征
+    def reserve(self,num):
+        capacity=self.features.shape[0]
+        if num<=capacity:
+            return
+        capacity=max(capacity,1)
+        while capacity<num:
+            capacity*=2
+        features=np.zeros((capacity,self.feature_num))
+        n=len(self.names)
+        if n>0:
+            features[:n,:]=self.features[:n,:]
+        self.features=features
+
+    # 加入一个人脸特征，特征在这里做一次L2归一化
+    def add(self,name,feature):
+        n=len(self.names)
+        self.reserve(n+1)
+        feature=feature.reshape((self.feature_num,))
+        self.features[n,:]=feature/np.linalg.norm(feature)
+        self.names.append(name)
+
+    # 从目录中加载每人一个.bin文件的特征数据库，文件名即人名
+    def load_dir(self,database_dir):
+        with ScopedTiming("database load_dir",self.debug_mode > 0):
+            for db_file in os.listdir(database_dir):
+                if not db_file.endswith('.bin'):
+                    continue
+                with open(database_dir + db_file, 'rb') as f:
+                    data = f.read()
+                self.add(db_file.split('.')[0],np.frombuffer(data, dtype=np.float))
+
+    # 从打包存储中加载，特征矩阵一次读入且已归一化，无需逐条处理
+    def load_store(self,store):
+        with ScopedTiming("database load_store",self.debug_mode > 0):
+            names,features=store.load()
+            if not names:
+                self.reset()
+                return
+            if "" in names:
+                # 存储中有已删除的条目，只加载有效条目
+                self.reset()
+                for i in range(len(names)):
+                    if names[i]:
+                        self.reserve(len(self.names)+1)
+                        self.features[len(self.names),:]=features[i,:]
+                        self.names.append(names[i])
+                return
+            self.names=names
+            self.features=features
+
+    # 注册一个人脸特征，同时追加写入打包存储
+    def enroll(self,store,name,feature):
+        self.add(name,feature)
+        store.append(name,self.features[len(self.names)-1,:])
+
+    # 查询单个人脸特征，返回相似度最高的top_k个结果[(人名,得分),...]，按得分降序
+    # 得分为余弦相似度映射到[0,1]：cos/2+0.5
+    def search(self,feature,top_k=1):
+        n=len(self.names)
+        if n==0:
+            return []
+        with ScopedTiming("database search",self.debug_mode > 0):
+            feature=feature.reshape((self.feature_num,))
+            feature=feature/np.linalg.norm(feature)
+            scores=np.dot(self.features[:n,:],feature)/2+0.5
+            if top_k==1:
+                idx=int(np.argmax(scores))
+                return [(self.names[idx],scores[idx])]
+            order=np.argsort(scores)[::-1][:top_k]
+            return [(self.names[int(i)],scores[int(i)]) for i in order]
+
+    # 批量查询一帧中所有人脸的特征，一次矩阵乘法得到所有人脸与数据库的相似度
+    # 返回每个人脸的最佳匹配[(人名,得分),...]，数据库为空时返回空列表
+    def search_batch(self,features):
+        n=len(self.names)
+        m=len(features)
+        if n==0 or m==0:
+            return []
+        with ScopedTiming("database search_batch",self.debug_mode > 0):
+            query=np.zeros((m,self.feature_num))
+            for i in range(m):
+                feature=features[i].reshape((self.feature_num,))
+                query[i,:]=feature/np.linalg.norm(feature)
+            # (n,m)的相似度矩阵，每列对应一个查询人脸
+            scores=np.dot(self.features[:n,:],query.transpose())/2+0.5
+            ids=np.argmax(scores,axis=0)
+            max_scores=np.max(scores,axis=0)
+            return [(self.names[int(ids[i])],max_scores[i]) for i in range(m)]
@@ -0,0 +1,186 @@
+import _thread
+import time
+
+# PCM环形缓冲区，采集线程写入，推理循环按窗口读取
+# 读写位置均为累计字节数，写入超过容量时覆盖最旧的数据，由读取方统计丢失的数据
+class PCMRingBuffer:
+    def __init__(self,capacity):
+        # 缓冲区容量，单位字节
+        self.capacity=capacity
+        self.buf=bytearray(capacity)
+        self.mv=memoryview(self.buf)
+        # 累计写入的字节数
+        self.write_total=0
+        self.lock=_thread.allocate_lock()
+
+    # 写入一段pcm数据，超出末尾时回绕到开头
+    def write(self,data):
+        n=len(data)
+        if n>self.capacity:
+            # 单次写入超过容量时只保留最新的数据
+            self.lock.acquire()
+            self.write_total+=n-self.capacity
+            self.lock.release()
+            data=data[n-self.capacity:]
+            n=self.capacity
+        self.lock.acquire()
+        start=self.write_total%self.capacity
+        first=min(n,self.capacity-start)
+        self.mv[start:start+first]=data[:first]
+        if first<n:
+            self.mv[0:n-first]=data[first:]
+        self.write_total+=n
+        self.lock.release()
+
+    # 将累计位置pos开始的len(out)字节拷贝到out，数据已被覆盖时返回False
+    def read(self,pos,out):
+        n=len(out)
+        self.lock.acquire()
+        if self.write_total-pos>self.capacity or pos+n>self.write_total:
+            self.lock.release()
+            return False
+        start=pos%self.capacity
+        first=min(n,self.capacity-start)
+        out[0:first]=self.mv[start:start+first]
+        if first<n:
+            out[first:n]=self.mv[0:n-first]
+        self.lock.release()
+        return True
+
+# 滑动窗口流式关键词唤醒，采集与推理解耦
+# kws:关键词唤醒任务实例(如KWSApp)，run(pcm_bytes)返回识别结果，pcm_bytes为复用的窗口bytearray，下一个窗口会覆盖，不要保存引用
+# window:每次推理的采样点数，需与模型输入一致，默认0.3s@16kHz
+# hop:相邻两次推理窗口的间隔采样点数，小于window时窗口重叠，跨窗口边界的唤醒词不会被漏检
+#     注意：模型带有cache状态时，按时间连续的不重叠窗口(hop==window)才与原始推理方式一致
+# sample_width:每个采样点的字节数，paInt16为2
+# buffer_windows:环形缓冲区可容纳的窗口数，推理跟不上采集时最旧的数据被覆盖并计入丢帧
+# is_detection:根据kws.run的返回值判断是否唤醒，默认返回值大于0为唤醒
+class StreamingKWS:
+    def __init__(self,kws,window=4800,hop=4800,sample_width=2,buffer_windows=4,is_detection=None):
+        self.kws=kws
+        self.window_bytes=window*sample_width
+        self.hop_bytes=hop*sample_width
+        self.sample_width=sample_width
+        self.ring=PCMRingBuffer(self.window_bytes*buffer_windows)
+        # 预分配的窗口数据，每次推理复用
+        self.window_buf=bytearray(self.window_bytes)
+        self.is_detection=is_detection if is_detection else (lambda res: res>0)
+        # 下一个推理窗口的起始位置，单位字节
+        self.next_pos=0
+        # 最近若干次写入的(累计结束位置,采集时间ns)，用于计算端到端延迟，采集线程写入、推理循环读取，用capture_lock保护
+        self.capture_times=[]
+        self.capture_lock=_thread.allocate_lock()
+        self.max_capture_times=buffer_windows*max(1,self.window_bytes//max(1,self.hop_bytes))*4
+        self.running=False
+        self.capture_done=True
+        self.reset_stats()
+
+    # 清空统计数据
+    def reset_stats(self):
+        # 已推理的窗口数
+        self.windows=0
+        # 唤醒次数
+        self.detections=0
+        # 因推理跟不上采集而丢弃的窗口数
+        self.dropped=0
+        # 端到端延迟统计，从窗口最后一个采样被采集到得到识别结果，单位ms
+        self.last_latency_ms=0.0
+        self.max_latency_ms=0.0
+        self.total_latency_ms=0.0
+
+    # 写入一段采集到的pcm数据(采集线程或离线输入调用)
+    def feed(self,data):
+        self.ring.write(data)
+        t=time.time_ns()
+        self.capture_lock.acquire()
+        self.capture_times.append((self.ring.write_total,t))
+        if len(self.capture_times)>self.max_capture_times:
+            self.capture_times.pop(0)
+        self.capture_lock.release()
+
+    # 获取累计位置pos的数据被采集的时间
+    def capture_time(self,pos):
+        self.capture_lock.acquire()
+        try:
+            for end,t in self.capture_times:
+                if end>=pos:
+                    return t
+        finally:
+            self.capture_lock.release()
+        return time.time_ns()
+
+    # 处理一个窗口，数据不足时返回None，否则返回kws.run的结果
+    def step(self):
+        available=self.ring.write_total-self.next_pos
+        if available<self.window_bytes:
+            return None
+        if available>self.ring.capacity:
+            # 推理跟不上采集，跳过已被覆盖的窗口，只保留缓冲区中最新的完整窗口
+            skip=(available-self.window_bytes)//self.hop_bytes
+            self.dropped+=skip
+            self.next_pos+=skip*self.hop_bytes
+        if not self.ring.read(self.next_pos,self.window_buf):
+            self.dropped+=1
+            self.next_pos+=self.hop_bytes
+            return None
+        end=self.next_pos+self.window_bytes
+        self.next_pos+=self.hop_bytes
+        # 直接传入预分配的窗口数据，不再每个窗口拷贝一份bytes
+        res=self.kws.run(self.window_buf)
+        latency=(time.time_ns()-self.capture_time(end))/1000000
+        self.windows+=1
+        self.last_latency_ms=latency
+        self.max_latency_ms=max(self.max_latency_ms,latency)
+        self.total_latency_ms+=latency
+        if self.is_detection(res):
+            self.detections+=1
+        return res
+
+    # 采集线程，read_fn每次返回一段pcm数据，返回空数据时结束
+    # read_fn抛出异常时同样标记线程结束，stop不会一直等待
+    def capture_loop(self,read_fn):
+        try:
+            while self.running:
+                data=read_fn()
+                if not data:
+                    break
+                self.feed(data)
+        finally:
+            self.capture_done=True
+
+    # 启动后台采集线程，例如read_fn=input_stream.read
+    def start(self,read_fn):
+        self.running=True
+        self.capture_done=False
+        _thread.start_new_thread(self.capture_loop,(read_fn,))
+
+    # 停止后台采集线程，等待线程退出
+    def stop(self):
+        self.running=False
+        while not self.capture_done:
+            time.sleep_ms(1) if hasattr(time,"sleep_ms") else time.sleep(0.001)
+
+    # 离线运行，同步读取全部数据并处理所有完整窗口，用于WAV文件回放测试
+    # read_fn:如lambda: wf.read_frames(chunk)，也可以是纯Python的数据源
+    # 返回[(窗口结束位置对应的采样点序号,识别结果),...]，只包含唤醒的窗口
+    def run_offline(self,read_fn):
+        hits=[]
+        while True:
+            data=read_fn()
+            if not data:
+                break
+            self.feed(data)
+            while True:
+                end=self.next_pos+self.window_bytes
+                res=self.step()
+                if res is None:
+                    break
+                if self.is_detection(res):
+                    hits.append((end//self.sample_width,res))
+        return hits
+
+    # 统计信息
+    def stats(self):
+        avg=self.total_latency_ms/self.windows if self.windows else 0.0
+        return {"windows":self.windows,"detections":self.detections,"dropped":self.dropped,
+                "last_latency_ms":self.last_latency_ms,"avg_latency_ms":avg,"max_latency_ms":self.max_latency_ms}
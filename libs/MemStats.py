@@ -0,0 +1,266 @@
+import gc
+import time
+import array
+import _thread
+import nncase_runtime as nn
+
+# 按阶段统计堆内存分配和空闲堆水位，统计gc.collect的暂停时间和nncase内存池收缩，并提供按空闲堆阈值回收的GC策略
+# 每个阶段的调用次数、单次分配量(进入和退出时gc.mem_alloc的差值)、最大分配量、最低空闲堆保存在预分配的数组中
+# 阶段内发生了GC时这次调用不计入分配统计，只计入gc_in_stage：通过collect执行的回收按gc_count的变化判断，
+# 堆空间不足时MicroPython自动触发的回收没有通知接口，只能按分配量为负判断，回收量小于阶段内分配量时无法识别
+# GC策略：gc_free_threshold为0时每次collect都回收(与原来每帧gc.collect一致)；
+#         大于0时只有空闲堆低于阈值才回收，gc_max_skip大于0时连续跳过该次数后强制回收一次
+# 堆是所有线程共享的，PipeLine.run_async等多线程场景下阶段内的分配量会包含其它线程的分配；统计数据的更新加锁，不同阶段可以在不同线程中使用
+# nncase_runtime没有提供内存池用量的查询接口，shrink_pool只统计调用次数、耗时和前后的空闲堆变化
+# 使用方法：
+#   from libs import MemStats
+#   MemStats.enable(gc_free_threshold=2*1024*1024)
+#   with MemStats.stage("postprocess"):
+#       ...
+#   MemStats.collect()      # 替代每帧的gc.collect()
+# 未启用时stage返回共享的空上下文，collect直接调用gc.collect()，shrink_pool直接调用nn.shrink_memory_pool()
+
+# 空上下文，未启用时由stage返回
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_STAGE=NullStage()
+
+# 单个阶段的统计上下文，每个阶段一个，重复使用，同一阶段不能嵌套或在多个线程中同时使用
+class Stage:
+    def __init__(self,stats,index):
+        self.stats=stats
+        self.index=index
+        self.start=0
+        # 进入阶段时的回收次数
+        self.gc_start=0
+
+    def __enter__(self):
+        self.gc_start=self.stats.gc_count
+        self.start=gc.mem_alloc()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        alloc=gc.mem_alloc()-self.start
+        self.stats.record_index(self.index,alloc,gc.mem_free(),self.stats.gc_count!=self.gc_start or alloc<0)
+        return False
+
+# max_stages:最多统计的阶段数，超出后新阶段的记录被丢弃
+# gc_free_threshold:空闲堆低于该值(字节)时才回收，0表示每次都回收
+# gc_max_skip:连续跳过回收的最大次数，0表示不限制
+# interval_ms:打印汇总的间隔，0表示不自动打印
+class MemStats:
+    def __init__(self,max_stages=32,gc_free_threshold=0,gc_max_skip=0,interval_ms=5000):
+        self.max_stages=max_stages
+        self.gc_free_threshold=gc_free_threshold
+        self.gc_max_skip=gc_max_skip
+        self.interval_ms=interval_ms
+        self.labels=[]
+        self.index={}
+        self.stages={}
+        self.counts=array.array("I",[0]*max_stages)
+        # 累加值用python int，interval_ms=0时不再定期清零，32位数组会溢出
+        self.alloc_sums=[0]*max_stages
+        self.alloc_maxs=array.array("I",[0]*max_stages)
+        self.free_mins=array.array("I",[0]*max_stages)
+        self.gc_in_stage=array.array("I",[0]*max_stages)
+        self.enabled=True
+        # 多个线程中的阶段可能同时记录，更新统计数据时加锁
+        self.lock=_thread.allocate_lock()
+        # 连续跳过回收的次数
+        self.skip_run=0
+        self.last_report=time.ticks_ms()
+        self.reset()
+
+    # 清零统计数据，阶段标签保留
+    def reset(self):
+        for i in range(self.max_stages):
+            self.counts[i]=0
+            self.alloc_sums[i]=0
+            self.alloc_maxs[i]=0
+            self.free_mins[i]=0xffffffff
+            self.gc_in_stage[i]=0
+        self.dropped=0
+        # GC统计：回收次数、跳过次数、总暂停时间、最长暂停时间(us)、回收的字节数
+        self.gc_count=0
+        self.gc_skipped=0
+        self.gc_sum_us=0
+        self.gc_max_us=0
+        self.gc_freed=0
+        # nncase内存池收缩统计：次数、总耗时(us)、收缩后空闲堆的增量
+        self.shrink_count=0
+        self.shrink_sum_us=0
+        self.shrink_freed=0
+        # 统计期间的最低空闲堆
+        self.free_min=0xffffffff
+
+    # 阶段对应的数组下标，已满时返回-1
+    def label_index(self,label):
+        i=self.index.get(label)
+        if i is None:
+            self.lock.acquire()
+            i=self.index.get(label)
+            if i is None:
+                if len(self.labels)>=self.max_stages:
+                    self.lock.release()
+                    return -1
+                i=len(self.labels)
+                self.labels.append(label)
+                self.index[label]=i
+            self.lock.release()
+        return i
+
+    # 阶段的统计上下文，首次使用时创建，之后复用
+    def stage(self,label):
+        s=self.stages.get(label)
+        if s is None:
+            i=self.label_index(label)
+            if i<0:
+                self.dropped+=1
+                return NULL_STAGE
+            s=Stage(self,i)
+            self.stages[label]=s
+        return s
+
+    # gc_in:阶段内是否发生了回收
+    def record_index(self,i,alloc,free,gc_in=False):
+        if not self.enabled:
+            return
+        self.lock.acquire()
+        self.counts[i]+=1
+        if gc_in or alloc<0:
+            self.gc_in_stage[i]+=1
+        else:
+            self.alloc_sums[i]+=alloc
+            if alloc>self.alloc_maxs[i]:
+                self.alloc_maxs[i]=alloc
+        if free<self.free_mins[i]:
+            self.free_mins[i]=free
+        if free<self.free_min:
+            self.free_min=free
+        self.lock.release()
+
+    # 按GC策略回收，force为True时总是回收，返回是否执行了回收
+    def collect(self,force=False):
+        self.tick()
+        free=gc.mem_free()
+        if free<self.free_min:
+            self.free_min=free
+        if not force and self.gc_free_threshold>0 and free>=self.gc_free_threshold:
+            if self.gc_max_skip<=0 or self.skip_run<self.gc_max_skip:
+                self.skip_run+=1
+                self.gc_skipped+=1
+                return False
+        start=time.ticks_us()
+        gc.collect()
+        pause=time.ticks_diff(time.ticks_us(),start)
+        self.skip_run=0
+        self.gc_count+=1
+        self.gc_sum_us+=pause
+        if pause>self.gc_max_us:
+            self.gc_max_us=pause
+        freed=gc.mem_free()-free
+        if freed>0:
+            self.gc_freed+=freed
+        return True
+
+    # 收缩nncase内存池并统计
+    def shrink_pool(self):
+        free=gc.mem_free()
+        start=time.ticks_us()
+        nn.shrink_memory_pool()
+        self.shrink_sum_us+=time.ticks_diff(time.ticks_us(),start)
+        self.shrink_count+=1
+        freed=gc.mem_free()-free
+        if freed>0:
+            self.shrink_freed+=freed
+
+    # 汇总结果，stages为[(阶段,次数,平均分配字节,最大分配字节,最低空闲堆字节,阶段内GC次数),...]
+    def summary(self):
+        stages=[]
+        for i in range(len(self.labels)):
+            n=self.counts[i]
+            if n==0:
+                continue
+            measured=n-self.gc_in_stage[i]
+            avg=self.alloc_sums[i]//measured if measured>0 else 0
+            stages.append((self.labels[i],n,avg,self.alloc_maxs[i],self.free_mins[i],self.gc_in_stage[i]))
+        return {"stages":stages,
+                "gc_count":self.gc_count,"gc_skipped":self.gc_skipped,
+                "gc_avg_ms":self.gc_sum_us/self.gc_count/1000 if self.gc_count else 0.0,
+                "gc_max_ms":self.gc_max_us/1000,"gc_freed":self.gc_freed,
+                "shrink_count":self.shrink_count,"shrink_ms":self.shrink_sum_us/1000,"shrink_freed":self.shrink_freed,
+                "free_min":self.free_min if self.free_min!=0xffffffff else gc.mem_free(),
+                "mem_alloc":gc.mem_alloc(),"mem_free":gc.mem_free()}
+
+    # 打印汇总
+    def report(self):
+        s=self.summary()
+        print("mem: {:<24}{:>8}{:>12}{:>12}{:>12}{:>8}".format("stage","count","avg alloc","max alloc","min free","gc in"))
+        for label,n,avg,mx,free,gc_in in s["stages"]:
+            print("mem: {:<24}{:>8}{:>12}{:>12}{:>12}{:>8}".format(label,n,avg,mx,free,gc_in))
+        print("mem: gc {} collected, {} skipped, avg {:.2f} ms, max {:.2f} ms, freed {} B".format(
+            s["gc_count"],s["gc_skipped"],s["gc_avg_ms"],s["gc_max_ms"],s["gc_freed"]))
+        print("mem: shrink_memory_pool {} calls, {:.2f} ms, freed {} B".format(s["shrink_count"],s["shrink_ms"],s["shrink_freed"]))
+        print("mem: heap alloc {} B, free {} B, min free {} B".format(s["mem_alloc"],s["mem_free"],s["free_min"]))
+        if self.dropped:
+            print("mem: {} records dropped, max_stages={}".format(self.dropped,self.max_stages))
+
+    # 到达汇总间隔时打印汇总并清零，每次collect时检查
+    def tick(self):
+        if self.interval_ms<=0:
+            return
+        now=time.ticks_ms()
+        if time.ticks_diff(now,self.last_report)>=self.interval_ms:
+            self.lock.acquire()
+            self.last_report=now
+            self.report()
+            self.reset()
+            self.lock.release()
+
+# 全局MemStats，未启用时为None
+stats=None
+
+# 启用全局MemStats，参数同MemStats，再次调用时更新GC策略和汇总间隔
+def enable(max_stages=32,gc_free_threshold=0,gc_max_skip=0,interval_ms=5000):
+    global stats
+    if stats is None:
+        stats=MemStats(max_stages,gc_free_threshold,gc_max_skip,interval_ms)
+    stats.gc_free_threshold=gc_free_threshold
+    stats.gc_max_skip=gc_max_skip
+    stats.interval_ms=interval_ms
+    stats.enabled=True
+    return stats
+
+# 停用全局MemStats，之后collect恢复为每次都回收
+def disable():
+    if stats is not None:
+        stats.enabled=False
+
+# 全局MemStats是否已启用
+def active():
+    return stats is not None and stats.enabled
+
+# 获取阶段的统计上下文，未启用时返回空上下文
+def stage(label):
+    if stats is None or not stats.enabled:
+        return NULL_STAGE
+    return stats.stage(label)
+
+# 垃圾回收，启用时按GC策略回收并统计暂停时间，未启用时直接回收
+def collect(force=False):
+    if stats is None or not stats.enabled:
+        gc.collect()
+        return True
+    return stats.collect(force)
+
+# 收缩nncase内存池，启用时统计调用次数和耗时
+def shrink_pool():
+    if stats is None or not stats.enabled:
+        nn.shrink_memory_pool()
+        return
+    stats.shrink_pool()
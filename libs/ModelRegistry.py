@@ -0,0 +1,65 @@
+import nncase_runtime as nn
+import time
+
+# 进程内的kmodel共享缓存，同一个kmodel文件只加载一次，多个AIBase实例共用一个kpu对象
+# 例如人脸识别、人脸关键点、人脸姿态等任务组合在同一个程序中时，face_detection_320.kmodel只占用一份DDR，也只加载一次
+# 按引用计数管理，最后一个使用者释放后才删除kpu对象，调用方随后做gc.collect和nn.shrink_memory_pool回收内存
+# 共用kpu的多个实例需要在同一个线程中依次推理：输入输出tensor的绑定属于kpu，
+# AIBase在推理前检查owner，上一次推理的不是自己时重新设置输入tensor，以及reuse模式的持久输出tensor或kpu自身的输出tensor
+# AIBase默认共享(share_kmodel=True)，实例切换时恢复输出tensor的绑定，copy模式的实例不会写入reuse模式实例的持久buffer
+
+# 一个已加载的kmodel
+class ModelEntry:
+    def __init__(self,kmodel_path):
+        self.kmodel_path=kmodel_path
+        start=time.ticks_ms()
+        self.kpu=nn.kpu()
+        self.kpu.load_kmodel(kmodel_path)
+        # 加载耗时，单位ms
+        self.load_ms=time.ticks_diff(time.ticks_ms(),start)
+        # 引用计数
+        self.refs=0
+        # 最近一次使用该kpu推理的实例，None表示还没有实例推理过或绑定已被重置
+        self.owner=None
+        # kpu自身的输出tensor，reuse模式的实例第一次绑定持久buffer前记录，copy模式的实例推理前恢复
+        self.kpu_outputs=[]
+
+# 已加载的共享kmodel，key为kmodel路径
+entries={}
+# 命中缓存、省去加载的次数
+hits=0
+
+# 获取kmodel，已加载时直接返回并增加引用计数，否则加载
+# shared为False时总是加载新的kpu对象且不加入缓存，用于需要独占kpu的场景(如多线程并行推理同一个模型)
+def acquire(kmodel_path,shared=True):
+    global hits
+    if not shared:
+        entry=ModelEntry(kmodel_path)
+        entry.refs=1
+        return entry
+    entry=entries.get(kmodel_path)
+    if entry is None:
+        entry=ModelEntry(kmodel_path)
+        entries[kmodel_path]=entry
+    else:
+        hits+=1
+    entry.refs+=1
+    return entry
+
+# 释放一次引用，最后一个引用释放后删除kpu对象并返回True
+def release(entry):
+    if entry.refs<=0:
+        return False
+    entry.refs-=1
+    if entry.refs>0:
+        return False
+    if entries.get(entry.kmodel_path) is entry:
+        del entries[entry.kmodel_path]
+    entry.owner=None
+    entry.kpu_outputs=[]
+    entry.kpu=None
+    return True
+
+# 当前缓存的kmodel信息，[(kmodel路径,引用计数,加载耗时ms),...]
+def loaded():
+    return [(e.kmodel_path,e.refs,e.load_ms) for e in entries.values()]
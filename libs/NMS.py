@@ -0,0 +1,55 @@
+import ulab.numpy as np
+
+# 多目标检测 非最大值抑制，YOLOv5/YOLOv8/YOLO11共用的向量化实现
+# boxes: 检测框，(N,4)的ulab array，每行为[x1,y1,x2,y2]
+# scores: 检测框分数，(N,)的ulab array
+# thresh: iou阈值，与当前框iou大于等于该值的框会被抑制
+# class_ids: 检测框类别id，(N,)的ulab array，agnostic=False时必须提供
+# agnostic: True为类别无关NMS，False为按类别分别做NMS，不同类别的框之间互不抑制
+# top_k: NMS之前按分数保留的最大候选框数，0表示不限制
+# max_det: 最多保留的框数，达到该数量后提前结束，0表示不限制
+# 返回值: 保留框在输入boxes中的索引，按分数降序排列，类型为ulab array(uint16)
+def nms(boxes,scores,thresh,class_ids=None,agnostic=True,top_k=0,max_det=0):
+    if len(scores)==0:
+        return np.zeros(0,dtype=np.uint16)
+    # 分数降序排列的索引，argsort返回uint16索引，可覆盖65535个候选框，不会像uint8一样在255以上溢出
+    order=np.argsort(scores)[::-1]
+    if top_k>0 and order.size>top_k:
+        order=order[:top_k]
+    # 按排序后的顺序一次性取出坐标，后续循环内只做切片和布尔索引，不再逐个元素重建列表
+    x1=np.take(boxes[:,0],order)
+    y1=np.take(boxes[:,1],order)
+    x2=np.take(boxes[:,2],order)
+    y2=np.take(boxes[:,3],order)
+    if not agnostic and class_ids is not None:
+        # 按类别给坐标加上偏移，使不同类别的框永不重叠，一次NMS即可完成分类别NMS
+        # 偏移步长取坐标的取值范围，坐标为负(框超出图像左上边界)时也能保证不同类别的框相互分离
+        offset=np.take(class_ids,order)*(np.max(boxes)-np.min(boxes)+1)
+        x1=x1+offset
+        y1=y1+offset
+        x2=x2+offset
+        y2=y2+offset
+    areas=(x2-x1+1)*(y2-y1+1)
+    keep=[]
+    while order.size>0:
+        keep.append(order[0])
+        if order.size==1 or (max_det>0 and len(keep)>=max_det):
+            break
+        # 当前分数最高的框与剩余所有框的iou
+        xx1=np.maximum(x1[0],x1[1:])
+        yy1=np.maximum(y1[0],y1[1:])
+        xx2=np.minimum(x2[0],x2[1:])
+        yy2=np.minimum(y2[0],y2[1:])
+        w=np.maximum(0.0,xx2-xx1+1)
+        h=np.maximum(0.0,yy2-yy1+1)
+        inter=w*h
+        ovr=inter/(areas[0]+areas[1:]-inter)
+        # 保留iou小于阈值的框
+        mask=ovr<thresh
+        order=order[1:][mask]
+        x1=x1[1:][mask]
+        y1=y1[1:][mask]
+        x2=x2[1:][mask]
+        y2=y2[1:][mask]
+        areas=areas[1:][mask]
+    return np.array(keep,dtype=np.uint16)
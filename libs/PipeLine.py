@@ -12,12 +12,18 @@ import image
 import random
 import gc
 import sys
+import _thread
+from libs import Profiler
+from libs import MemStats
 
-# 计时类，计算进入代码块和退出代码块的时间差
+# 计时类，计算进入代码块和退出代码块的时间差，耗时保存在elapsed_ms中
+# print_result为False时只计时不打印，供调度器等代码读取耗时
 class ScopedTiming:
-    def __init__(self, info="", enable_profile=True):
+    def __init__(self, info="", enable_profile=True, print_result=True):
         self.info = info
         self.enable_profile = enable_profile
+        self.print_result = print_result
+        self.elapsed_ms = 0
 
     def __enter__(self):
         if self.enable_profile:
@@ -27,11 +33,305 @@ class ScopedTiming:
     def __exit__(self, exc_type, exc_value, traceback):
         if self.enable_profile:
             elapsed_time = time.time_ns() - self.start_time
-            print(f"{self.info} took {elapsed_time / 1000000:.2f} ms")
+            self.elapsed_ms = elapsed_time / 1000000
+            if Profiler.active():
+                # 启用了聚合统计时只记录，不逐次打印
+                Profiler.profiler.record(self.info, elapsed_time // 1000)
+            elif self.print_result:
+                print(f"{self.info} took {self.elapsed_ms:.2f} ms")
+
+# 热点路径的计时上下文，全局Profiler启用时返回按标签复用的计时上下文，无论enable是否为True都汇总统计且不分配内存
+# 未启用时enable为True返回逐次打印的ScopedTiming，为False返回共享的空上下文
+def timing(info, enable=True):
+    if Profiler.active():
+        return Profiler.profiler.scope(info)
+    if enable:
+        return ScopedTiming(info, True)
+    return Profiler.NULL_SCOPE
+
+# 毫秒级等待，兼容没有sleep_ms的环境(如主机上的桩测试)
+def wait_ms(ms):
+    if hasattr(time,"sleep_ms"):
+        time.sleep_ms(ms)
+    else:
+        time.sleep(ms/1000)
+
+# 有界队列，队列满时丢弃最旧的数据，保证下游总是处理最新的帧
+class FrameQueue:
+    def __init__(self,max_size=2):
+        self.max_size=max_size
+        self.items=[]
+        self.lock=_thread.allocate_lock()
+        self.closed=False
+        # 因队列满被丢弃的数据数
+        self.dropped=0
+
+    # 放入数据，队列满时丢弃最旧的数据，返回被丢弃的数据，没有丢弃时返回None
+    def put(self,item):
+        self.lock.acquire()
+        dropped=None
+        if len(self.items)>=self.max_size:
+            dropped=self.items.pop(0)
+            self.dropped+=1
+        self.items.append(item)
+        self.lock.release()
+        return dropped
+
+    # 取出最旧的数据，队列为空时等待，关闭或超时返回None，timeout_ms为0表示一直等待
+    def get(self,timeout_ms=0):
+        waited=0
+        while True:
+            self.lock.acquire()
+            if self.items:
+                item=self.items.pop(0)
+                self.lock.release()
+                return item
+            self.lock.release()
+            if self.closed or (timeout_ms>0 and waited>=timeout_ms):
+                return None
+            wait_ms(1)
+            waited+=1
+
+    # 关闭队列，等待中的get返回None
+    def close(self):
+        self.closed=True
+
+    def clear(self):
+        self.lock.acquire()
+        self.items.clear()
+        self.lock.release()
+
+# OSD图像封装，记录每次绘制影响的矩形区域(脏矩形)，clear时只清除这些区域，不再清空整幅图像
+# 绘制接口与image.Image一致，下面逐个封装的绘制接口记录脏矩形或标记整幅图像被修改；
+# 没有封装的draw*接口在调用时(而不是获取属性时)按整幅图像都被修改处理，其它属性直接转发给image.Image
+# 脏矩形通过to_numpy_ref得到的像素数组直接写0清除，与image.clear的结果一致(ARGB全0，完全透明)；
+# 像素数组不可用或shape与图像不一致时退化为整幅清除
+class OSDImage:
+    def __init__(self,img,width,height):
+        # 实际的image.Image对象
+        self.img=img
+        self.width=width
+        self.height=height
+        # 上次clear之后绘制过的矩形区域[x,y,w,h]
+        self.dirty=[]
+        # 整幅图像都需要清除
+        self.full_dirty=False
+        # 与图像共享内存的(height,width,4)像素数组，用于按矩形清除
+        self.pixels=None
+        try:
+            pixels=img.to_numpy_ref()
+            if len(pixels.shape)==3 and pixels.shape[0]==height and pixels.shape[1]==width:
+                self.pixels=pixels
+        except (AttributeError,OSError,ValueError):
+            pass
+
+    def __getattr__(self,name):
+        attr=getattr(self.img,name)
+        if not name.startswith("draw"):
+            return attr
+        def draw(*args,**kwargs):
+            self.full_dirty=True
+            return attr(*args,**kwargs)
+        return draw
+
+    # 记录脏矩形，margin为线宽等超出矩形的部分
+    def mark(self,x,y,w,h,margin=0):
+        x1=max(0,int(x-margin))
+        y1=max(0,int(y-margin))
+        x2=min(self.width,int(x+w+margin)+1)
+        y2=min(self.height,int(y+h+margin)+1)
+        if x2>x1 and y2>y1:
+            self.dirty.append((x1,y1,x2-x1,y2-y1))
+
+    # 获取线宽，线宽可能以关键字参数或位置参数(在color之后)给出，index为位置参数的下标
+    def thickness(self,args,kwargs,index):
+        if "thickness" in kwargs:
+            return kwargs["thickness"]
+        return args[index] if len(args)>index and isinstance(args[index],int) else 1
+
+    # 只清除脏矩形区域，脏区域面积超过整幅图像一半时直接整幅清除
+    def clear(self):
+        area=0
+        for rect in self.dirty:
+            area+=rect[2]*rect[3]
+        if self.full_dirty or self.pixels is None or area*2>=self.width*self.height:
+            self.img.clear()
+        else:
+            for x,y,w,h in self.dirty:
+                self.pixels[y:y+h,x:x+w]=0
+        self.dirty=[]
+        self.full_dirty=False
+
+    def copy_from(self,*args,**kwargs):
+        self.full_dirty=True
+        return self.img.copy_from(*args,**kwargs)
+
+    def draw_rectangle(self,*args,**kwargs):
+        if isinstance(args[0],tuple):
+            x,y,w,h=args[0][:4]
+            t=self.thickness(args,kwargs,2)
+        else:
+            x,y,w,h=args[:4]
+            t=self.thickness(args,kwargs,5)
+        self.mark(x,y,w,h,t)
+        return self.img.draw_rectangle(*args,**kwargs)
+
+    def draw_line(self,*args,**kwargs):
+        if isinstance(args[0],tuple):
+            x0,y0,x1,y1=args[0][:4]
+            t=self.thickness(args,kwargs,2)
+        else:
+            x0,y0,x1,y1=args[:4]
+            t=self.thickness(args,kwargs,5)
+        self.mark(min(x0,x1),min(y0,y1),abs(x1-x0),abs(y1-y0),t)
+        return self.img.draw_line(*args,**kwargs)
+
+    def draw_arrow(self,*args,**kwargs):
+        x0,y0,x1,y1=args[0][:4] if isinstance(args[0],tuple) else args[:4]
+        self.mark(min(x0,x1),min(y0,y1),abs(x1-x0),abs(y1-y0),kwargs.get("thickness",1)+kwargs.get("size",10))
+        return self.img.draw_arrow(*args,**kwargs)
+
+    def draw_circle(self,*args,**kwargs):
+        if isinstance(args[0],tuple):
+            x,y,r=args[0][:3]
+            t=self.thickness(args,kwargs,2)
+        else:
+            x,y,r=args[:3]
+            t=self.thickness(args,kwargs,4)
+        self.mark(x-r,y-r,2*r,2*r,t)
+        return self.img.draw_circle(*args,**kwargs)
+
+    def draw_cross(self,*args,**kwargs):
+        x,y=args[0][:2] if isinstance(args[0],tuple) else args[:2]
+        size=kwargs.get("size",5)
+        self.mark(x-size,y-size,2*size,2*size,kwargs.get("thickness",1))
+        return self.img.draw_cross(*args,**kwargs)
+
+    def draw_ellipse(self,*args,**kwargs):
+        cx,cy,rx,ry=args[0][:4] if isinstance(args[0],tuple) else args[:4]
+        # 旋转后的椭圆不超过以长半轴为半径的圆
+        r=max(rx,ry)
+        self.mark(cx-r,cy-r,2*r,2*r,kwargs.get("thickness",1))
+        return self.img.draw_ellipse(*args,**kwargs)
+
+    # 以下绘制接口的影响范围不易估计，按整幅图像都被修改处理
+    def draw_string(self,*args,**kwargs):
+        self.full_dirty=True
+        return self.img.draw_string(*args,**kwargs)
+
+    def draw_image(self,*args,**kwargs):
+        self.full_dirty=True
+        return self.img.draw_image(*args,**kwargs)
+
+    def draw_keypoints(self,*args,**kwargs):
+        self.full_dirty=True
+        return self.img.draw_keypoints(*args,**kwargs)
+
+    def draw_edges(self,*args,**kwargs):
+        self.full_dirty=True
+        return self.img.draw_edges(*args,**kwargs)
+
+    def draw_string_advanced(self,*args,**kwargs):
+        x,y,char_size,text=args[:4]
+        # 按每个字符占char_size宽度估计，高度留出字形下沿的余量
+        self.mark(x,y,len(text)*char_size,char_size*3//2,2)
+        return self.img.draw_string_advanced(*args,**kwargs)
+
+# 推理调度器，按步长跳帧推理，两次推理之间沿用上一次的结果
+# stride:每隔stride帧推理一次，1为每帧推理
+# target_fps:目标显示帧率，大于0时根据实测的推理耗时和其余处理耗时自动调整步长，使整体帧率接近目标
+# max_stride:自动调整时步长的上限
+# diff_thresh:帧差阈值，大于0时对降采样后的图像计算平均绝对差，小于阈值视为静止画面，跳过推理
+# diff_step:计算帧差时的降采样步长
+# max_hold:静止画面最多连续跳过的帧数，超过后强制推理一次，避免结果长时间不更新
+class InferScheduler:
+    def __init__(self,stride=1,target_fps=0,max_stride=8,diff_thresh=0,diff_step=16,max_hold=30,debug_mode=0):
+        self.stride=stride
+        self.target_fps=target_fps
+        self.max_stride=max_stride
+        self.diff_thresh=diff_thresh
+        self.diff_step=diff_step
+        self.max_hold=max_hold
+        self.debug_mode=debug_mode
+        self.reset()
+
+    def reset(self):
+        # 沿用的推理结果
+        self.result=None
+        self.has_result=False
+        # 距离上次推理的帧数
+        self.since_run=0
+        # 上次推理时的降采样图像，用于帧差判断
+        self.last_sample=None
+        # 推理耗时和不含推理的帧耗时的滑动平均，单位ms
+        self.infer_ms=0.0
+        self.other_ms=0.0
+        self.last_tick=None
+        # 统计数据
+        self.frames=0
+        self.runs=0
+        self.static_skips=0
+
+    # 降采样取第一个通道，转换为int16便于计算差值
+    def sample(self,input_np):
+        if len(input_np.shape)==3:
+            return np.array(input_np[0,::self.diff_step,::self.diff_step],dtype=np.int16)
+        return np.array(input_np[::self.diff_step,::self.diff_step],dtype=np.int16)
+
+    # 当前帧是否需要推理
+    def should_run(self,input_np):
+        if not self.has_result:
+            return True
+        if self.since_run<self.stride:
+            return False
+        if self.diff_thresh>0 and self.since_run<self.max_hold and self.last_sample is not None:
+            diff=np.mean(abs(self.sample(input_np)-self.last_sample))
+            if diff<self.diff_thresh:
+                self.static_skips+=1
+                return False
+        return True
+
+    # 根据推理耗时和其余处理耗时调整步长，步长为s时平均帧耗时约为other_ms+infer_ms/s
+    def adapt(self):
+        if self.target_fps<=0 or self.infer_ms<=0:
+            return
+        budget=1000/self.target_fps-self.other_ms
+        if budget<=0:
+            stride=self.max_stride
+        else:
+            stride=int(self.infer_ms/budget)+1 if self.infer_ms>budget else 1
+        self.stride=max(1,min(self.max_stride,stride))
+
+    # 调度一帧，需要推理时调用infer_fn(input_np)并保存结果，否则返回上一次的结果
+    def run(self,input_np,infer_fn):
+        now=time.ticks_ms()
+        if self.last_tick is not None:
+            # 上一次调度结束到本次调度之间的耗时，即除推理之外的采集、绘制、显示等耗时
+            frame_ms=time.ticks_diff(now,self.last_tick)
+            self.other_ms=frame_ms if self.frames<=1 else self.other_ms*0.9+frame_ms*0.1
+        self.frames+=1
+        if self.should_run(input_np):
+            with ScopedTiming("scheduled infer",True,self.debug_mode > 0) as st:
+                self.result=infer_fn(input_np)
+            self.has_result=True
+            self.since_run=0
+            self.runs+=1
+            self.infer_ms=st.elapsed_ms if self.runs==1 else self.infer_ms*0.8+st.elapsed_ms*0.2
+            if self.diff_thresh>0:
+                self.last_sample=self.sample(input_np)
+            self.adapt()
+        self.since_run+=1
+        self.last_tick=time.ticks_ms()
+        return self.result
+
+    # 统计信息，duty为推理帧数占总帧数的比例
+    def stats(self):
+        return {"frames":self.frames,"runs":self.runs,"static_skips":self.static_skips,"stride":self.stride,
+                "duty":self.runs/self.frames if self.frames else 0.0,"infer_ms":self.infer_ms,"other_ms":self.other_ms}
 
 # PipeLine类
 class PipeLine:
-    def __init__(self,rgb888p_size=[224,224],display_size=[1920,1080],display_mode="lcd",debug_mode=0,osd_layer_num=1):
+    def __init__(self,rgb888p_size=[224,224],display_size=[1920,1080],display_mode="lcd",debug_mode=0,osd_layer_num=1,osd_buffers=1):
         # sensor给AI的图像分辨率
         self.rgb888p_size=[ALIGN_UP(rgb888p_size[0],16),rgb888p_size[1]]
         # 视频输出VO图像分辨率
@@ -40,15 +340,31 @@ class PipeLine:
         self.display_mode=display_mode
         # sensor对象
         self.sensor=None
-        # osd显示Image对象
+        # osd显示Image对象，为当前绘制用的后台buffer
         self.osd_img=None
+        # osd buffer数量，默认1为单缓冲；设为2时为双缓冲，绘制在后台buffer进行，显示的始终是绘制完成的buffer，需多占用一幅osd图像的内存
+        self.osd_buffers=osd_buffers
+        self.osd_imgs=[]
+        self.osd_index=0
         self.debug_mode=debug_mode
         self.osd_layer_num = osd_layer_num
+        # 显示模块，主机上测试时可替换为桩对象
+        self.display=Display
+        # 流水线模式的采集帧缓冲，run_async中按队列长度分配
+        self.frame_bufs=[]
+        # 流水线模式的运行状态和统计数据
+        self.running=False
+        self.capture_done=True
+        self.display_done=True
+        self.stats={}
+        # 采集线程和显示线程各自的帧计数，线程退出后由run_async合并到stats
+        self.captured=0
+        self.displayed=0
 
     # PipeLine初始化函数
     def create(self,sensor=None,hmirror=None,vflip=None,fps=60):
         with ScopedTiming("init PipeLine",self.debug_mode > 0):
-            nn.shrink_memory_pool()
+            MemStats.shrink_pool()
             # 初始化并配置sensor
             brd=os.uname()[-1]
             if brd=="k230d_canmv_bpi_zero":
@@ -73,7 +389,9 @@ class PipeLine:
             self.sensor.set_pixformat(PIXEL_FORMAT_RGB_888_PLANAR, chn=CAM_CHN_ID_2)
 
             # OSD图像初始化
-            self.osd_img = image.Image(self.display_size[0], self.display_size[1], image.ARGB8888)
+            self.osd_imgs = [OSDImage(image.Image(self.display_size[0], self.display_size[1], image.ARGB8888),self.display_size[0],self.display_size[1]) for i in range(self.osd_buffers)]
+            self.osd_index = 0
+            self.osd_img = self.osd_imgs[0]
 
             sensor_bind_info = self.sensor.bind_info(x = 0, y = 0, chn = CAM_CHN_ID_0)
             Display.bind_layer(**sensor_bind_info, layer = Display.LAYER_VIDEO1)
@@ -93,15 +411,129 @@ class PipeLine:
 
     # 获取一帧图像数据，返回格式为ulab的array数据
     def get_frame(self):
-        with ScopedTiming("get a frame",self.debug_mode > 0):
+        with ScopedTiming("get a frame",self.debug_mode > 0), MemStats.stage("PipeLine.get_frame"):
             frame = self.sensor.snapshot(chn=CAM_CHN_ID_2)
             input_np=frame.to_numpy_ref()
             return input_np
 
-    # 在屏幕上显示osd_img
+    # 在屏幕上显示绘制完成的osd_img，然后切换到另一个buffer继续绘制
     def show_image(self):
-        with ScopedTiming("show result",self.debug_mode > 0):
-            Display.show_image(self.osd_img, 0, 0, Display.LAYER_OSD3)
+        with ScopedTiming("show result",self.debug_mode > 0), MemStats.stage("PipeLine.show_image"):
+            img = self.osd_img.img if isinstance(self.osd_img, OSDImage) else self.osd_img
+            self.display.show_image(img, 0, 0, self.display.LAYER_OSD3)
+            if len(self.osd_imgs) > 1:
+                self.osd_index = (self.osd_index + 1) % len(self.osd_imgs)
+                self.osd_img = self.osd_imgs[self.osd_index]
+
+    # 采集线程，持续获取帧并放入帧队列，队列满时丢弃最旧的帧
+    # free_slots为空闲帧缓冲序号的队列，为None时不拷贝，直接把sensor buffer的引用放入队列
+    # 帧队列中的数据为(帧序号,帧缓冲序号,帧数据)
+    def capture_loop(self,frame_queue,free_slots):
+        frame_id=0
+        captured=0
+        try:
+            while self.running:
+                input_np=self.get_frame()
+                slot=-1
+                if free_slots is not None:
+                    # get_frame返回的是sensor buffer的引用，下一次采集会覆盖，放入队列前拷贝到空闲的帧缓冲
+                    # 限时等待空闲帧缓冲，超时后检查是否已停止，避免停止时一直阻塞
+                    slot=free_slots.get(timeout_ms=100)
+                    while slot is None and self.running and not free_slots.closed:
+                        slot=free_slots.get(timeout_ms=100)
+                    if slot is None:
+                        break
+                    if self.frame_bufs[slot] is None:
+                        self.frame_bufs[slot]=np.zeros(input_np.shape,dtype=input_np.dtype)
+                    self.frame_bufs[slot][:]=input_np
+                    input_np=self.frame_bufs[slot]
+                dropped=frame_queue.put((frame_id,slot,input_np))
+                # 被丢弃的帧的帧缓冲重新变为空闲
+                if dropped is not None and dropped[1]>=0:
+                    free_slots.put(dropped[1])
+                captured+=1
+                frame_id+=1
+        finally:
+            self.captured=captured
+            frame_queue.close()
+            self.capture_done=True
+
+    # 显示线程，取出推理结果绘制osd并显示，只显示最新的结果
+    def display_loop(self,result_queue,draw_fn):
+        displayed=0
+        try:
+            while self.running:
+                item=result_queue.get()
+                if item is None:
+                    break
+                with ScopedTiming("draw and show",self.debug_mode > 0):
+                    draw_fn(item[1])
+                    self.show_image()
+                displayed+=1
+        finally:
+            self.displayed=displayed
+            self.display_done=True
+
+    # 流水线模式运行：采集线程采集第N+1帧、显示线程绘制显示第N-1帧的同时，当前线程推理第N帧
+    # infer_fn(input_np)返回推理结果，draw_fn(res)在osd_img上绘制结果
+    # queue_size:帧队列和结果队列的长度，推理跟不上采集时丢弃最旧的帧，显示跟不上推理时丢弃最旧的结果
+    # copy_frame:采集的帧是否拷贝后再入队，sensor buffer不会被下一帧覆盖时可以设为False
+    #            拷贝到预分配的queue_size+2个帧缓冲中循环使用(队列中最多queue_size帧，推理和采集各占一帧)，不再每帧分配
+    #            infer_fn返回后该帧缓冲即被回收，infer_fn中需要跨帧保存的帧数据请自行copy()
+    # max_frames:推理帧数达到该值后返回，0表示一直运行直到退出
+    # 返回统计数据：采集帧数、推理帧数、显示帧数以及两个队列丢弃的数量
+    # 各线程只更新自己的计数，线程退出后合并；Profiler和MemStats的统计加锁，可在三个线程中使用
+    def run_async(self,infer_fn,draw_fn,queue_size=2,copy_frame=True,max_frames=0):
+        frame_queue=FrameQueue(queue_size)
+        result_queue=FrameQueue(queue_size)
+        self.stats={"captured":0,"inferred":0,"displayed":0,"frames_dropped":0,"results_dropped":0}
+        self.captured=0
+        self.displayed=0
+        inferred=0
+        free_slots=None
+        if copy_frame:
+            # 帧缓冲在采集到第一帧时按帧的shape分配，之后复用
+            if len(self.frame_bufs)!=queue_size+2:
+                self.frame_bufs=[None]*(queue_size+2)
+            free_slots=FrameQueue(queue_size+2)
+            for i in range(queue_size+2):
+                free_slots.put(i)
+        self.running=True
+        self.capture_done=False
+        self.display_done=False
+        _thread.start_new_thread(self.capture_loop,(frame_queue,free_slots))
+        _thread.start_new_thread(self.display_loop,(result_queue,draw_fn))
+        try:
+            while self.running:
+                if hasattr(os,"exitpoint"):
+                    os.exitpoint()
+                item=frame_queue.get()
+                if item is None:
+                    break
+                with ScopedTiming("infer",self.debug_mode > 0):
+                    res=infer_fn(item[2])
+                # 推理完成，帧缓冲交还给采集线程
+                if item[1]>=0:
+                    free_slots.put(item[1])
+                result_queue.put((item[0],res))
+                inferred+=1
+                MemStats.collect()
+                if max_frames>0 and inferred>=max_frames:
+                    break
+        finally:
+            # 停止采集和显示线程，等待线程退出
+            self.running=False
+            result_queue.close()
+            if free_slots is not None:
+                free_slots.close()
+            while not (self.capture_done and self.display_done):
+                wait_ms(1)
+            self.stats["captured"]=self.captured
+            self.stats["inferred"]=inferred
+            self.stats["displayed"]=self.displayed
+            self.stats["frames_dropped"]=frame_queue.dropped
+            self.stats["results_dropped"]=result_queue.dropped
+        return self.stats
 
     # PipeLine销毁函数
     def destroy(self):
@@ -0,0 +1,234 @@
+import time
+import array
+import _thread
+
+# 聚合式性能统计，替代每次调用打印一行的ScopedTiming，可以在正式运行的程序中常开
+# 每个标签的调用次数、总耗时、最小/最大耗时和耗时直方图保存在预分配的数组中，记录时只做整数运算，不分配内存
+# 每隔interval_ms打印一次汇总(次数、平均、最小、最大、p95)并清零，串口打印不再逐帧干扰计时
+# 直方图按耗时对数分桶，p95为所在桶的上界，相对误差不超过growth-1
+# 使用方法：
+#   from libs import Profiler
+#   Profiler.enable(interval_ms=5000)
+#   with Profiler.scope("postprocess"):
+#       ...
+# 未启用时scope返回共享的空上下文，不分配内存；启用后ScopedTiming的计时也汇总到这里，不再逐次打印
+
+# 空上下文，未启用时由scope返回
+class NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_SCOPE=NullScope()
+
+# 单个标签的计时上下文，每个标签一个，重复使用
+# 同一标签不能嵌套或在多个线程中同时使用，不同标签可以在不同线程中使用，嵌套深度按线程分别记录
+class Scope:
+    def __init__(self,profiler,index):
+        self.profiler=profiler
+        self.index=index
+        self.start=0
+
+    def __enter__(self):
+        self.profiler.enter()
+        self.start=time.ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        p=self.profiler
+        p.record_index(self.index,time.ticks_diff(time.ticks_us(),self.start))
+        # 只在当前线程最外层的计时结束时检查是否需要打印汇总，汇总的耗时不计入内层标签
+        if p.leave():
+            p.tick()
+        return False
+
+# max_labels:最多统计的标签数，超出后新标签的记录被丢弃并计入dropped
+# interval_ms:打印汇总的间隔，0表示不自动打印，由调用方调用report
+# min_us/growth/bins:直方图第一个桶的上界、相邻桶上界的比例、桶数，默认覆盖10us到约10s
+class Profiler:
+    def __init__(self,max_labels=32,interval_ms=5000,min_us=10,growth=1.25,bins=64):
+        self.max_labels=max_labels
+        self.interval_ms=interval_ms
+        self.bins=bins
+        # 各个桶的上界，单位us，最后一个桶没有上界
+        self.edges=array.array("I",[int(min_us*growth**i) for i in range(bins)])
+        self.labels=[]
+        self.index={}
+        self.scopes={}
+        self.counts=array.array("I",[0]*max_labels)
+        # 累加耗时用python int，32位us约71分钟溢出，interval_ms=0时不会定期清零
+        self.sums=[0]*max_labels
+        self.mins=array.array("I",[0]*max_labels)
+        self.maxs=array.array("I",[0]*max_labels)
+        self.hist=array.array("I",[0]*(max_labels*bins))
+        self.dropped=0
+        # 各线程的计时上下文嵌套深度，key为线程id
+        self.depths={}
+        # 采集、推理、显示线程可能同时记录，更新统计数据时加锁
+        self.lock=_thread.allocate_lock()
+        self.enabled=True
+        self.last_report=time.ticks_ms()
+
+    # 标签对应的数组下标，标签已满时返回-1
+    def label_index(self,label):
+        i=self.index.get(label)
+        if i is None:
+            self.lock.acquire()
+            i=self.index.get(label)
+            if i is None:
+                if len(self.labels)>=self.max_labels:
+                    self.lock.release()
+                    return -1
+                i=len(self.labels)
+                self.labels.append(label)
+                self.index[label]=i
+                self.mins[i]=0xffffffff
+            self.lock.release()
+        return i
+
+    # 当前线程进入计时上下文
+    def enter(self):
+        t=_thread.get_ident()
+        self.lock.acquire()
+        self.depths[t]=self.depths.get(t,0)+1
+        self.lock.release()
+
+    # 当前线程退出计时上下文，返回是否已退出该线程最外层的计时上下文
+    def leave(self):
+        t=_thread.get_ident()
+        self.lock.acquire()
+        depth=self.depths.get(t,1)-1
+        if depth<=0:
+            self.depths.pop(t,None)
+        else:
+            self.depths[t]=depth
+        self.lock.release()
+        return depth<=0
+
+    # 标签的计时上下文，首次使用时创建，之后复用
+    def scope(self,label):
+        s=self.scopes.get(label)
+        if s is None:
+            i=self.label_index(label)
+            if i<0:
+                self.dropped+=1
+                return NULL_SCOPE
+            s=Scope(self,i)
+            self.scopes[label]=s
+        return s
+
+    # 记录一次耗时，单位us
+    def record(self,label,us):
+        i=self.label_index(label)
+        if i<0:
+            self.dropped+=1
+            return
+        self.record_index(i,us)
+
+    def record_index(self,i,us):
+        if not self.enabled:
+            return
+        if us<0:
+            us=0
+        self.lock.acquire()
+        self.counts[i]+=1
+        self.sums[i]+=us
+        if us<self.mins[i]:
+            self.mins[i]=us
+        if us>self.maxs[i]:
+            self.maxs[i]=us
+        # 二分查找所在的桶
+        edges=self.edges
+        lo=0
+        hi=self.bins-1
+        while lo<hi:
+            mid=(lo+hi)>>1
+            if us<=edges[mid]:
+                hi=mid
+            else:
+                lo=mid+1
+        self.hist[i*self.bins+lo]+=1
+        self.lock.release()
+
+    # 第p百分位数所在桶的上界，单位us，不超过最大耗时
+    def percentile(self,i,p):
+        count=self.counts[i]
+        if count==0:
+            return 0
+        target=(count*p+99)//100
+        base=i*self.bins
+        acc=0
+        for b in range(self.bins):
+            acc+=self.hist[base+b]
+            if acc>=target:
+                return min(self.edges[b],self.maxs[i])
+        return self.maxs[i]
+
+    # 汇总结果，[(标签,次数,平均ms,最小ms,最大ms,p95 ms),...]，只包含有记录的标签
+    def summary(self):
+        res=[]
+        for i in range(len(self.labels)):
+            n=self.counts[i]
+            if n==0:
+                continue
+            res.append((self.labels[i],n,self.sums[i]/n/1000,self.mins[i]/1000,self.maxs[i]/1000,self.percentile(i,95)/1000))
+        return res
+
+    # 打印汇总
+    def report(self):
+        print("profile: {:<24}{:>8}{:>10}{:>10}{:>10}{:>10}".format("label","count","avg ms","min ms","max ms","p95 ms"))
+        for label,n,avg,mn,mx,p95 in self.summary():
+            print("profile: {:<24}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(label,n,avg,mn,mx,p95))
+        if self.dropped:
+            print("profile: {} records dropped, max_labels={}".format(self.dropped,self.max_labels))
+
+    # 清零统计数据，标签和计时上下文保留
+    def reset(self):
+        for i in range(self.max_labels):
+            self.counts[i]=0
+            self.sums[i]=0
+            self.mins[i]=0xffffffff
+            self.maxs[i]=0
+        for i in range(len(self.hist)):
+            self.hist[i]=0
+        self.dropped=0
+
+    # 到达汇总间隔时打印汇总并清零，可在主循环中每帧调用
+    def tick(self):
+        if self.interval_ms<=0:
+            return
+        now=time.ticks_ms()
+        if time.ticks_diff(now,self.last_report)>=self.interval_ms:
+            self.lock.acquire()
+            self.last_report=now
+            self.report()
+            self.reset()
+            self.lock.release()
+
+# 全局Profiler，未启用时为None
+profiler=None
+
+# 启用全局Profiler，参数同Profiler
+def enable(max_labels=32,interval_ms=5000,min_us=10,growth=1.25,bins=64):
+    global profiler
+    if profiler is None:
+        profiler=Profiler(max_labels,interval_ms,min_us,growth,bins)
+    profiler.enabled=True
+    return profiler
+
+# 停用全局Profiler，已分配的数组保留，再次启用时继续使用
+def disable():
+    if profiler is not None:
+        profiler.enabled=False
+
+# 全局Profiler是否已启用
+def active():
+    return profiler is not None and profiler.enabled
+
+# 获取标签的计时上下文，未启用时返回空上下文
+def scope(label):
+    if profiler is None or not profiler.enabled:
+        return NULL_SCOPE
+    return profiler.scope(label)
@@ -0,0 +1,122 @@
+# 主机仿真后端，在Linux主机的CPython+NumPy环境中运行libs/下的代码，用于离线性能分析和回归测试
+# libs/host/目录中是nncase_runtime、ulab.numpy、media.*、image等板端模块的替身:
+#   nn.kpu回放录制的kmodel输出tensor，nn.ai2d做最近邻缩放，Sensor回放录制的图像帧，Display和image.Image只记录调用
+# 使用方法(在导入libs中任何模块之前):
+#   from libs import Sim
+#   Sim.install(replay_dir="replay",frames=["frame0.bin"])
+# 回放目录结构，每个kmodel一个子目录，子目录名为kmodel文件名(不含扩展名):
+#   <replay_dir>/<kmodel名>/model.json   {"inputs":[{"shape":[1,3,320,320],"dtype":"uint8"}],"outputs":[{"shape":[1,84,8400],"dtype":"float32"}]}
+#   <replay_dir>/<kmodel名>/<帧序号>_<输出序号>.bin   输出tensor的原始数据，按帧序号循环回放
+# 板端可用record_outputs录制回放数据，本文件中只有install依赖CPython
+import sys
+import time
+import json
+
+# 仿真配置，由替身模块读取
+config={
+    # kmodel输出回放目录
+    "replay_dir":None,
+    # Sensor回放的图像帧，RGB888 planar格式的.bin文件路径列表
+    "frames":None,
+    # 通过register_model注册的模型信息，key为kmodel名
+    "models":{},
+    # gc.mem_free替身使用的堆大小，单位字节
+    "heap_size":64*1024*1024,
+    # nn.from_numpy创建的tensor是否与array共享内存，设为False可检查依赖共享内存的代码
+    "tensor_alias":True,
+}
+
+# 是否已安装仿真后端
+installed=False
+
+# 安装仿真后端：将替身模块目录加入sys.path，并补齐time和os中板端特有的接口
+def install(replay_dir=None,frames=None):
+    global installed
+    import os
+    config["replay_dir"]=replay_dir
+    config["frames"]=frames
+    if installed:
+        return
+    host_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"host")
+    sys.path.insert(0,host_dir)
+    # time模块的MicroPython扩展接口
+    if not hasattr(time,"sleep_ms"):
+        time.sleep_ms=lambda ms: time.sleep(ms/1000)
+        time.sleep_us=lambda us: time.sleep(us/1000000)
+        time.ticks_ms=lambda: time.monotonic_ns()//1000000
+        time.ticks_us=lambda: time.monotonic_ns()//1000
+        time.ticks_diff=lambda a,b: a-b
+        time.ticks_add=lambda a,b: a+b
+    # gc模块的堆统计接口，tracemalloc已启动时按其统计的内存计算，堆大小由config["heap_size"]指定
+    import gc
+    if not hasattr(gc,"mem_alloc"):
+        import tracemalloc
+        gc.mem_alloc=lambda: tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        gc.mem_free=lambda: max(0,config["heap_size"]-gc.mem_alloc())
+    # os模块的退出点接口
+    if not hasattr(os,"exitpoint"):
+        os.EXITPOINT_ENABLE=1
+        os.EXITPOINT_ENABLE_SLEEP=2
+        os.exitpoint=lambda *args: False
+    installed=True
+
+# 注册模型的输入输出信息，没有回放数据时kpu输出全0的tensor
+# inputs/outputs:[(shape,dtype),...]，dtype为numpy的dtype名，如"uint8"、"float32"
+def register_model(name,inputs,outputs):
+    config["models"][name]={"inputs":[{"shape":list(s),"dtype":d} for s,d in inputs],
+                            "outputs":[{"shape":list(s),"dtype":d} for s,d in outputs]}
+
+# 获取kmodel名，即文件名去掉扩展名
+def model_name(kmodel_path):
+    name=kmodel_path.replace("\\","/").split("/")[-1]
+    return name.rsplit(".",1)[0] if "." in name else name
+
+# 加载模型信息，优先使用register_model注册的信息，其次读取回放目录中的model.json
+def load_model_info(kmodel_path):
+    name=model_name(kmodel_path)
+    if name in config["models"]:
+        return config["models"][name]
+    if config["replay_dir"]:
+        try:
+            with open(config["replay_dir"]+"/"+name+"/model.json","r") as f:
+                return json.load(f)
+        except OSError:
+            pass
+    raise ValueError("no replay data for kmodel {}: record it with Sim.record_outputs or call Sim.register_model".format(name))
+
+# 录制一帧kmodel输出，可在板端运行，录制结果用于主机回放
+# app:AIBase实例，results为inference返回的输出array列表，frame_id为帧序号
+def record_outputs(app,results,dump_dir,frame_id):
+    import os
+    name=model_name(app.kmodel_path)
+    model_dir=dump_dir+"/"+name
+    for d in (dump_dir,model_dir):
+        try:
+            os.mkdir(d)
+        except OSError:
+            pass
+    if frame_id==0:
+        info={"inputs":[],"outputs":[]}
+        for i in range(app.kpu.inputs_size()):
+            t=app.kpu.get_input_tensor(i)
+            info["inputs"].append({"shape":list(t.shape),"dtype":dtype_name(t.dtype)})
+        for r in results:
+            info["outputs"].append({"shape":list(r.shape),"dtype":dtype_name(r.dtype)})
+        with open(model_dir+"/model.json","w") as f:
+            json.dump(info,f)
+    for i in range(len(results)):
+        with open("{}/{}_{}.bin".format(model_dir,frame_id,i),"wb") as f:
+            f.write(results[i].tobytes())
+
+# 将dtype转换为numpy的dtype名，ulab的dtype为字符编码的整数
+def dtype_name(dtype):
+    names={"B":"uint8","b":"int8","H":"uint16","h":"int16","I":"uint32","i":"int32","f":"float32","d":"float64"}
+    if isinstance(dtype,int):
+        dtype=chr(dtype)
+    if dtype in names:
+        return names[dtype]
+    s=str(dtype)
+    for v in names.values():
+        if v in s:
+            return v
+    return "float32"
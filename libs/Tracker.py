@@ -0,0 +1,115 @@
+# 轻量级IoU/中心点多目标跟踪，为检测框分配稳定的跟踪id并缓存二级识别结果
+# 两级任务(检测+识别)中，目标在画面中基本不动时无需每帧重复运行识别模型
+# 只有新出现的目标、识别结果超过max_age帧未更新的目标、识别得分低于min_score的目标才需要重新识别
+
+# 计算两个框[x1,y1,x2,y2]的iou
+def box_iou(a,b):
+    xx1=max(a[0],b[0])
+    yy1=max(a[1],b[1])
+    xx2=min(a[2],b[2])
+    yy2=min(a[3],b[3])
+    inter=max(0.0,xx2-xx1)*max(0.0,yy2-yy1)
+    union=(a[2]-a[0])*(a[3]-a[1])+(b[2]-b[0])*(b[3]-b[1])-inter
+    return inter/union if union>0 else 0.0
+
+# 将四边形顶点坐标[x0,y0,x1,y1,x2,y2,x3,y3]转换为外接框[x1,y1,x2,y2]
+def poly_to_box(points):
+    xs=[points[i] for i in range(0,8,2)]
+    ys=[points[i] for i in range(1,8,2)]
+    return [min(xs),min(ys),max(xs),max(ys)]
+
+# 单个跟踪目标
+class Track:
+    def __init__(self,track_id,box):
+        # 跟踪id
+        self.id=track_id
+        # 最近一次匹配到的检测框[x1,y1,x2,y2]
+        self.box=box
+        # 累计匹配到的帧数
+        self.hits=1
+        # 连续未匹配到的帧数
+        self.missed=0
+        # 距离上次识别的帧数
+        self.age=0
+        # 缓存的识别结果及识别得分，得分为None表示识别任务不提供得分
+        self.result=None
+        self.score=None
+
+class ROITracker:
+    # iou_thresh:检测框与跟踪目标匹配的最小iou
+    # center_thresh:iou不足时按中心点距离匹配，距离小于跟踪框长边的center_thresh倍视为同一目标
+    # max_age:识别结果缓存的最大帧数，超过后重新识别，0表示每帧都识别
+    # max_missed:目标连续未匹配到的帧数超过该值后删除
+    # min_score:识别得分低于该值时每帧重新识别，None表示不按得分判断
+    def __init__(self,iou_thresh=0.3,center_thresh=0.5,max_age=10,max_missed=3,min_score=None):
+        self.iou_thresh=iou_thresh
+        self.center_thresh=center_thresh
+        self.max_age=max_age
+        self.max_missed=max_missed
+        self.min_score=min_score
+        self.tracks=[]
+        self.next_id=0
+
+    # 清空所有跟踪目标
+    def reset(self):
+        self.tracks=[]
+
+    # 用当前帧的检测框更新跟踪目标，返回与boxes一一对应的Track列表
+    def update(self,boxes):
+        candidates=[]
+        for ti in range(len(self.tracks)):
+            tb=self.tracks[ti].box
+            tcx=(tb[0]+tb[2])/2
+            tcy=(tb[1]+tb[3])/2
+            tsize=max(tb[2]-tb[0],tb[3]-tb[1],1)
+            for bi in range(len(boxes)):
+                b=boxes[bi]
+                iou=box_iou(tb,b)
+                dist=(abs((b[0]+b[2])/2-tcx)+abs((b[1]+b[3])/2-tcy))/tsize
+                if iou>=self.iou_thresh or dist<=self.center_thresh:
+                    candidates.append((iou,-dist,ti,bi))
+        # 贪心匹配，iou大的优先，iou相同时中心点距离小的优先
+        candidates.sort(reverse=True)
+        matched=[None]*len(boxes)
+        track_used=[False]*len(self.tracks)
+        for iou,_,ti,bi in candidates:
+            if track_used[ti] or matched[bi] is not None:
+                continue
+            track_used[ti]=True
+            track=self.tracks[ti]
+            track.box=boxes[bi]
+            track.hits+=1
+            track.missed=0
+            track.age+=1
+            matched[bi]=track
+        tracks=[]
+        for ti in range(len(self.tracks)):
+            track=self.tracks[ti]
+            if not track_used[ti]:
+                track.missed+=1
+                if track.missed>self.max_missed:
+                    continue
+            tracks.append(track)
+        for bi in range(len(boxes)):
+            if matched[bi] is None:
+                matched[bi]=Track(self.next_id,boxes[bi])
+                self.next_id+=1
+                tracks.append(matched[bi])
+        self.tracks=tracks
+        return matched
+
+    # 跟踪目标是否需要重新识别
+    def stale(self,track):
+        if track.result is None or track.age>=self.max_age:
+            return True
+        return self.min_score is not None and track.score is not None and track.score<self.min_score
+
+    # 返回需要重新识别的目标在tracks中的下标
+    def stale_indices(self,tracks):
+        return [i for i in range(len(tracks)) if self.stale(tracks[i])]
+
+    # 缓存目标的识别结果
+    def set_result(self,track,result,score=None):
+        track.result=result
+        track.score=score
+        track.age=0
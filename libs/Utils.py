@@ -115,4 +115,13 @@ def letterbox_pad_param(input_size,output_size):
 # softmax函数
 def softmax(x):
     exp_x = np.exp(x - np.max(x))
-    return exp_x / np.sum(exp_x)
\ No newline at end of file
+    return exp_x / np.sum(exp_x)
+# 检查from_numpy创建的tensor是否与array共享内存
+# 只改写array的第一个元素(0和1互换)，比较tensor拷贝中的同一元素后立即恢复原值，array中的其它数据不受影响
+def shares_memory(array,tensor):
+    idx=(0,)*len(array.shape)
+    old=array[idx]
+    array[idx]=0 if old else 1
+    same=tensor.to_numpy()[idx]==array[idx]
+    array[idx]=old
+    return bool(same)
@@ -1,6 +1,7 @@
 from libs.PipeLine import ScopedTiming
 from libs.AIBase import AIBase
 from libs.AI2D import Ai2d
+from libs.NMS import nms
 from libs.Utils import *
 import os
 import ujson
@@ -16,8 +17,35 @@ import gc
 import sys
 import aidemo
 
+# YOLO检测结果解码，置信度过滤、xywh转xyxy、还原letterbox缩放和类别索引打包全部使用数组操作完成
+# boxes_ori: (x,y,w,h)四个长度为N的ulab array组成的元组，中心点坐标和宽高
+# scores: 每个候选框的分数，(N,)的ulab array
+# class_ids: 每个候选框的类别索引，(N,)的ulab array
+# conf_thresh: 置信度阈值
+# scale: letterbox缩放比例
+# 返回值: (M,6)的ulab array，每行为[x1,y1,x2,y2,score,class_id]
+def yolo_decode(boxes_ori,scores,class_ids,conf_thresh,scale):
+    mask=scores>conf_thresh
+    x,y,w,h=boxes_ori
+    x=x[mask]
+    n=len(x)
+    dets=np.zeros((n,6))
+    if n==0:
+        return dets
+    y=y[mask]
+    w=w[mask]*0.5
+    h=h[mask]*0.5
+    dets[:,0]=(x-w)/scale
+    dets[:,1]=(y-h)/scale
+    dets[:,2]=(x+w)/scale
+    dets[:,3]=(y+h)/scale
+    dets[:,4]=scores[mask]
+    dets[:,5]=class_ids[mask]
+    return dets
+
+
 class YOLOv5(AIBase):
-    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0):
+    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0,agnostic_nms=True,nms_top_k=0):
         if task_type not in ["classify","detect","segment"]:
             print("Please select the correct task_type parameter, including 'classify', 'detect', 'segment'.")
             return
@@ -38,6 +66,10 @@ class YOLOv5(AIBase):
         self.nms_thresh=nms_thresh
         self.mask_thresh=mask_thresh
         self.max_boxes_num=max_boxes_num
+        # True为类别无关NMS，False为按类别分别做NMS
+        self.agnostic_nms=agnostic_nms
+        # NMS之前按分数保留的最大候选框数，0表示不限制
+        self.nms_top_k=nms_top_k
         self.debug_mode=debug_mode
 
         self.scale=1.0
@@ -52,6 +84,8 @@ class YOLOv5(AIBase):
         self.ai2d=Ai2d(self.debug_mode)
         # 设置Ai2d的输入输出格式和类型
         self.ai2d.set_ai2d_dtype(nn.ai2d_format.NCHW_FMT,nn.ai2d_format.NCHW_FMT,np.uint8, np.uint8)
+        # ai2d预处理结果直接写入kmodel输入tensor
+        self.bind_ai2d_output()
 
     # 配置预处理操作，这里使用了resize，Ai2d支持crop/shift/pad/resize/affine，具体代码请打开/sdcard/app/libs/AI2D.py查看
     def config_preprocess(self,input_image_size=None):
@@ -85,35 +119,18 @@ class YOLOv5(AIBase):
                 return cls_res
             elif self.task_type=="detect":
                 output_data = results[0][0]
-                boxes_ori = output_data[:,0:4]
-                score_ori = output_data[:,4]
+                # 输出为(N,5+class_num)，每行为x,y,w,h,obj_conf,class_scores
+                boxes_ori = (output_data[:,0],output_data[:,1],output_data[:,2],output_data[:,3])
                 class_ori = output_data[:,5:]
                 class_res=np.argmax(class_ori,axis=-1)
-                scores_ = score_ori*np.max(class_ori,axis=-1)
-                boxes,inds,scores=[],[],[]
-                for i in range(len(boxes_ori)):
-                    if scores_[i]>self.conf_thresh:
-                        x,y,w,h=boxes_ori[i][0],boxes_ori[i][1],boxes_ori[i][2],boxes_ori[i][3]
-                        x1 = int((x - 0.5 * w)/self.scale)
-                        y1 = int((y - 0.5 * h)/self.scale)
-                        x2 = int((x + 0.5 * w)/self.scale)
-                        y2 = int((y + 0.5 * h)/self.scale)
-                        boxes.append([x1,y1,x2,y2])
-                        inds.append(class_res[i])
-                        scores.append(scores_[i])
-                if len(boxes)==0:
+                scores_ = output_data[:,4]*np.max(class_ori,axis=-1)
+                # 置信度过滤、xywh转xyxy、还原letterbox缩放，全部为数组操作
+                dets = yolo_decode(boxes_ori,scores_,class_res,self.conf_thresh,self.scale)
+                if len(dets)==0:
                     return []
-                boxes = np.array(boxes)
-                scores = np.array(scores)
-                inds = np.array(inds)
                 # NMS过程
-                keep = self.nms(boxes,scores,self.nms_thresh)
-                dets = np.concatenate((boxes, scores.reshape((len(boxes),1)), inds.reshape((len(boxes),1))), axis=1)
-                det_res = []
-                for keep_i in keep:
-                    det_res.append(dets[keep_i])
-                det_res = np.array(det_res)
-                det_res = det_res[:self.max_boxes_num, :]
+                keep = self.nms(dets[:,0:4],dets[:,4],self.nms_thresh,dets[:,5])
+                det_res = np.take(dets,keep,axis=0)
                 return det_res
             elif self.task_type=="segment":
                 if self.mode=="image":
@@ -134,7 +151,7 @@ class YOLOv5(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         img.clear()
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
@@ -147,7 +164,7 @@ class YOLOv5(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         img.clear()
                         mask_img=image.Image(self.display_size[0], self.display_size[1], image.ARGB8888,alloc=image.ALLOC_REF,data=self.masks)
                         img.copy_from(mask_img)
@@ -167,7 +184,7 @@ class YOLOv5(AIBase):
                         img.draw_string_advanced(5,5,32,mes,color=(0,255,0))
                     img.compress_for_ide()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
                             x,y=int(x1),int(y1)
@@ -177,7 +194,7 @@ class YOLOv5(AIBase):
                             img.draw_string_advanced( x , y-25,20," " + self.labels[int(det[5])] + " " + str(round(det[4],2)) , color=self.colors[int(det[5])])
                     img.compress_for_ide()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         mask_rgb=self.masks[0,:,:,1:4]
                         mask_img=image.Image(self.rgb888p_size[0], self.rgb888p_size[1], image.RGB888,alloc=image.ALLOC_REF,data=mask_rgb.copy())
                         dets,ids,scores = res[0],res[1],res[2]
@@ -189,46 +206,13 @@ class YOLOv5(AIBase):
                     pass
 
 
-    # 多目标检测 非最大值抑制方法实现
-    def nms(self,boxes,scores,thresh):
-        """Pure Python NMS baseline."""
-        x1,y1,x2,y2 = boxes[:, 0],boxes[:, 1],boxes[:, 2],boxes[:, 3]
-        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-        order = np.argsort(scores,axis = 0)[::-1]
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            new_x1,new_y1,new_x2,new_y2,new_areas = [],[],[],[],[]
-            for order_i in order:
-                new_x1.append(x1[order_i])
-                new_x2.append(x2[order_i])
-                new_y1.append(y1[order_i])
-                new_y2.append(y2[order_i])
-                new_areas.append(areas[order_i])
-            new_x1 = np.array(new_x1)
-            new_x2 = np.array(new_x2)
-            new_y1 = np.array(new_y1)
-            new_y2 = np.array(new_y2)
-            xx1 = np.maximum(x1[i], new_x1)
-            yy1 = np.maximum(y1[i], new_y1)
-            xx2 = np.minimum(x2[i], new_x2)
-            yy2 = np.minimum(y2[i], new_y2)
-            w = np.maximum(0.0, xx2 - xx1 + 1)
-            h = np.maximum(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            new_areas = np.array(new_areas)
-            ovr = inter / (areas[i] + new_areas - inter)
-            new_order = []
-            for ovr_i,ind in enumerate(ovr):
-                if ind < thresh:
-                    new_order.append(order[ovr_i])
-            order = np.array(new_order,dtype=np.uint8)
-        return keep
+    # 多目标检测 非最大值抑制方法实现，具体实现请打开/sdcard/app/libs/NMS.py查看
+    def nms(self,boxes,scores,thresh,class_ids=None):
+        return nms(boxes,scores,thresh,class_ids,self.agnostic_nms,self.nms_top_k,self.max_boxes_num)
 
 
 class YOLOv8(AIBase):
-    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0):
+    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0,agnostic_nms=True,nms_top_k=0):
         if task_type not in ["classify","detect","segment"]:
             print("Please select the correct task_type parameter, including 'classify', 'detect', 'segment'.")
             return
@@ -249,6 +233,10 @@ class YOLOv8(AIBase):
         self.nms_thresh=nms_thresh
         self.mask_thresh=mask_thresh
         self.max_boxes_num=max_boxes_num
+        # True为类别无关NMS，False为按类别分别做NMS
+        self.agnostic_nms=agnostic_nms
+        # NMS之前按分数保留的最大候选框数，0表示不限制
+        self.nms_top_k=nms_top_k
         self.debug_mode=debug_mode
 
         self.scale=1.0
@@ -263,6 +251,8 @@ class YOLOv8(AIBase):
         self.ai2d=Ai2d(self.debug_mode)
         # 设置Ai2d的输入输出格式和类型
         self.ai2d.set_ai2d_dtype(nn.ai2d_format.NCHW_FMT,nn.ai2d_format.NCHW_FMT,np.uint8, np.uint8)
+        # ai2d预处理结果直接写入kmodel输入tensor
+        self.bind_ai2d_output()
 
     # 配置预处理操作，这里使用了resize，Ai2d支持crop/shift/pad/resize/affine，具体代码请打开/sdcard/app/libs/AI2D.py查看
     def config_preprocess(self,input_image_size=None):
@@ -297,35 +287,18 @@ class YOLOv8(AIBase):
                 return cls_res
             elif self.task_type=="detect":
                 output_data = results[0][0]
-                output_data=output_data.transpose()
-                boxes_ori = output_data[:,0:4]
-                class_ori = output_data[:,4:]
-                class_res=np.argmax(class_ori,axis=-1)
-                scores_ = np.max(class_ori,axis=-1)
-                boxes,inds,scores=[],[],[]
-                for i in range(len(boxes_ori)):
-                    if scores_[i]>self.conf_thresh:
-                        x,y,w,h=boxes_ori[i][0],boxes_ori[i][1],boxes_ori[i][2],boxes_ori[i][3]
-                        x1 = int((x - 0.5 * w)/self.scale)
-                        y1 = int((y - 0.5 * h)/self.scale)
-                        x2 = int((x + 0.5 * w)/self.scale)
-                        y2 = int((y + 0.5 * h)/self.scale)
-                        boxes.append([x1,y1,x2,y2])
-                        inds.append(class_res[i])
-                        scores.append(scores_[i])
-                if len(boxes)==0:
+                # 输出为(4+class_num,N)，直接按行取数据，不再转置拷贝整个输出
+                boxes_ori = (output_data[0],output_data[1],output_data[2],output_data[3])
+                class_ori = output_data[4:,:]
+                class_res=np.argmax(class_ori,axis=0)
+                scores_ = np.max(class_ori,axis=0)
+                # 置信度过滤、xywh转xyxy、还原letterbox缩放，全部为数组操作
+                dets = yolo_decode(boxes_ori,scores_,class_res,self.conf_thresh,self.scale)
+                if len(dets)==0:
                     return []
-                boxes = np.array(boxes)
-                scores = np.array(scores)
-                inds = np.array(inds)
                 # NMS过程
-                keep = self.nms(boxes,scores,self.nms_thresh)
-                dets = np.concatenate((boxes, scores.reshape((len(boxes),1)), inds.reshape((len(boxes),1))), axis=1)
-                det_res = []
-                for keep_i in keep:
-                    det_res.append(dets[keep_i])
-                det_res = np.array(det_res)
-                det_res = det_res[:self.max_boxes_num, :]
+                keep = self.nms(dets[:,0:4],dets[:,4],self.nms_thresh,dets[:,5])
+                det_res = np.take(dets,keep,axis=0)
                 return det_res
             elif self.task_type=="segment":
                 new_result=results[0][0].transpose()
@@ -347,7 +320,7 @@ class YOLOv8(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         img.clear()
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
@@ -360,7 +333,7 @@ class YOLOv8(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         img.clear()
                         mask_img=image.Image(self.display_size[0], self.display_size[1], image.ARGB8888,alloc=image.ALLOC_REF,data=self.masks)
                         img.copy_from(mask_img)
@@ -380,7 +353,7 @@ class YOLOv8(AIBase):
                         img.draw_string_advanced(5,5,32,mes,color=(0,255,0))
                     img.compress_for_ide()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
                             x,y=int(x1),int(y1)
@@ -390,7 +363,7 @@ class YOLOv8(AIBase):
                             img.draw_string_advanced( x , y-25,20," " + self.labels[int(det[5])] + " " + str(round(det[4],2)) , color=self.colors[int(det[5])])
                     img.compress_for_ide()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         mask_rgb=self.masks[0,:,:,1:4]
                         mask_img=image.Image(self.rgb888p_size[0], self.rgb888p_size[1], image.RGB888,alloc=image.ALLOC_REF,data=mask_rgb.copy())
                         dets,ids,scores = res[0],res[1],res[2]
@@ -402,46 +375,13 @@ class YOLOv8(AIBase):
                     pass
 
 
-    # 多目标检测 非最大值抑制方法实现
-    def nms(self,boxes,scores,thresh):
-        """Pure Python NMS baseline."""
-        x1,y1,x2,y2 = boxes[:, 0],boxes[:, 1],boxes[:, 2],boxes[:, 3]
-        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-        order = np.argsort(scores,axis = 0)[::-1]
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            new_x1,new_y1,new_x2,new_y2,new_areas = [],[],[],[],[]
-            for order_i in order:
-                new_x1.append(x1[order_i])
-                new_x2.append(x2[order_i])
-                new_y1.append(y1[order_i])
-                new_y2.append(y2[order_i])
-                new_areas.append(areas[order_i])
-            new_x1 = np.array(new_x1)
-            new_x2 = np.array(new_x2)
-            new_y1 = np.array(new_y1)
-            new_y2 = np.array(new_y2)
-            xx1 = np.maximum(x1[i], new_x1)
-            yy1 = np.maximum(y1[i], new_y1)
-            xx2 = np.minimum(x2[i], new_x2)
-            yy2 = np.minimum(y2[i], new_y2)
-            w = np.maximum(0.0, xx2 - xx1 + 1)
-            h = np.maximum(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            new_areas = np.array(new_areas)
-            ovr = inter / (areas[i] + new_areas - inter)
-            new_order = []
-            for ovr_i,ind in enumerate(ovr):
-                if ind < thresh:
-                    new_order.append(order[ovr_i])
-            order = np.array(new_order,dtype=np.uint8)
-        return keep
+    # 多目标检测 非最大值抑制方法实现，具体实现请打开/sdcard/app/libs/NMS.py查看
+    def nms(self,boxes,scores,thresh,class_ids=None):
+        return nms(boxes,scores,thresh,class_ids,self.agnostic_nms,self.nms_top_k,self.max_boxes_num)
 
 
 class YOLO11(AIBase):
-    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0):
+    def __init__(self,task_type="detect",mode="video",kmodel_path="",labels=[],rgb888p_size=[320,320],model_input_size=[320,320],display_size=[1920,1080],conf_thresh=0.5,nms_thresh=0.45,mask_thresh=0.5,max_boxes_num=50,debug_mode=0,agnostic_nms=True,nms_top_k=0):
         if task_type not in ["classify","detect","segment"]:
             print("Please select the correct task_type parameter, including 'classify', 'detect', 'segment'.")
             return
@@ -462,6 +402,10 @@ class YOLO11(AIBase):
         self.nms_thresh=nms_thresh
         self.mask_thresh=mask_thresh
         self.max_boxes_num=max_boxes_num
+        # True为类别无关NMS，False为按类别分别做NMS
+        self.agnostic_nms=agnostic_nms
+        # NMS之前按分数保留的最大候选框数，0表示不限制
+        self.nms_top_k=nms_top_k
         self.debug_mode=debug_mode
 
         self.scale=1.0
@@ -476,6 +420,8 @@ class YOLO11(AIBase):
         self.ai2d=Ai2d(self.debug_mode)
         # 设置Ai2d的输入输出格式和类型
         self.ai2d.set_ai2d_dtype(nn.ai2d_format.NCHW_FMT,nn.ai2d_format.NCHW_FMT,np.uint8, np.uint8)
+        # ai2d预处理结果直接写入kmodel输入tensor
+        self.bind_ai2d_output()
 
     # 配置预处理操作，这里使用了resize，Ai2d支持crop/shift/pad/resize/affine，具体代码请打开/sdcard/app/libs/AI2D.py查看
     def config_preprocess(self,input_image_size=None):
@@ -510,35 +456,18 @@ class YOLO11(AIBase):
                 return cls_res
             elif self.task_type=="detect":
                 output_data = results[0][0]
-                output_data=output_data.transpose()
-                boxes_ori = output_data[:,0:4]
-                class_ori = output_data[:,4:]
-                class_res=np.argmax(class_ori,axis=-1)
-                scores_ = np.max(class_ori,axis=-1)
-                boxes,inds,scores=[],[],[]
-                for i in range(len(boxes_ori)):
-                    if scores_[i]>self.conf_thresh:
-                        x,y,w,h=boxes_ori[i][0],boxes_ori[i][1],boxes_ori[i][2],boxes_ori[i][3]
-                        x1 = int((x - 0.5 * w)/self.scale)
-                        y1 = int((y - 0.5 * h)/self.scale)
-                        x2 = int((x + 0.5 * w)/self.scale)
-                        y2 = int((y + 0.5 * h)/self.scale)
-                        boxes.append([x1,y1,x2,y2])
-                        inds.append(class_res[i])
-                        scores.append(scores_[i])
-                if len(boxes)==0:
+                # 输出为(4+class_num,N)，直接按行取数据，不再转置拷贝整个输出
+                boxes_ori = (output_data[0],output_data[1],output_data[2],output_data[3])
+                class_ori = output_data[4:,:]
+                class_res=np.argmax(class_ori,axis=0)
+                scores_ = np.max(class_ori,axis=0)
+                # 置信度过滤、xywh转xyxy、还原letterbox缩放，全部为数组操作
+                dets = yolo_decode(boxes_ori,scores_,class_res,self.conf_thresh,self.scale)
+                if len(dets)==0:
                     return []
-                boxes = np.array(boxes)
-                scores = np.array(scores)
-                inds = np.array(inds)
                 # NMS过程
-                keep = self.nms(boxes,scores,self.nms_thresh)
-                dets = np.concatenate((boxes, scores.reshape((len(boxes),1)), inds.reshape((len(boxes),1))), axis=1)
-                det_res = []
-                for keep_i in keep:
-                    det_res.append(dets[keep_i])
-                det_res = np.array(det_res)
-                det_res = det_res[:self.max_boxes_num, :]
+                keep = self.nms(dets[:,0:4],dets[:,4],self.nms_thresh,dets[:,5])
+                det_res = np.take(dets,keep,axis=0)
                 return det_res
             elif self.task_type=="segment":
                 new_result=results[0][0].transpose()
@@ -560,7 +489,7 @@ class YOLO11(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         img.clear()
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
@@ -573,7 +502,7 @@ class YOLO11(AIBase):
                     else:
                         img.clear()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         img.clear()
                         mask_img=image.Image(self.display_size[0], self.display_size[1], image.ARGB8888,alloc=image.ALLOC_REF,data=self.masks)
                         img.copy_from(mask_img)
@@ -593,7 +522,7 @@ class YOLO11(AIBase):
                         img.draw_string_advanced(5,5,32,mes,color=(0,255,0))
                     img.compress_for_ide()
                 elif self.task_type=="detect":
-                    if res:
+                    if len(res)>0:
                         for det in res:
                             x1, y1, x2, y2 = map(lambda x: int(round(x, 0)), det[:4])
                             x,y=int(x1),int(y1)
@@ -603,7 +532,7 @@ class YOLO11(AIBase):
                             img.draw_string_advanced( x , y-25,20," " + self.labels[int(det[5])] + " " + str(round(det[4],2)) , color=self.colors[int(det[5])])
                     img.compress_for_ide()
                 elif self.task_type=="segment":
-                    if res[0]:
+                    if len(res[0])>0:
                         mask_rgb=self.masks[0,:,:,1:4]
                         mask_img=image.Image(self.rgb888p_size[0], self.rgb888p_size[1], image.RGB888,alloc=image.ALLOC_REF,data=mask_rgb.copy())
                         dets,ids,scores = res[0],res[1],res[2]
@@ -615,39 +544,6 @@ class YOLO11(AIBase):
                     pass
 
 
-    # 多目标检测 非最大值抑制方法实现
-    def nms(self,boxes,scores,thresh):
-        """Pure Python NMS baseline."""
-        x1,y1,x2,y2 = boxes[:, 0],boxes[:, 1],boxes[:, 2],boxes[:, 3]
-        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-        order = np.argsort(scores,axis = 0)[::-1]
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            new_x1,new_y1,new_x2,new_y2,new_areas = [],[],[],[],[]
-            for order_i in order:
-                new_x1.append(x1[order_i])
-                new_x2.append(x2[order_i])
-                new_y1.append(y1[order_i])
-                new_y2.append(y2[order_i])
-                new_areas.append(areas[order_i])
-            new_x1 = np.array(new_x1)
-            new_x2 = np.array(new_x2)
-            new_y1 = np.array(new_y1)
-            new_y2 = np.array(new_y2)
-            xx1 = np.maximum(x1[i], new_x1)
-            yy1 = np.maximum(y1[i], new_y1)
-            xx2 = np.minimum(x2[i], new_x2)
-            yy2 = np.minimum(y2[i], new_y2)
-            w = np.maximum(0.0, xx2 - xx1 + 1)
-            h = np.maximum(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            new_areas = np.array(new_areas)
-            ovr = inter / (areas[i] + new_areas - inter)
-            new_order = []
-            for ovr_i,ind in enumerate(ovr):
-                if ind < thresh:
-                    new_order.append(order[ovr_i])
-            order = np.array(new_order,dtype=np.uint8)
-        return keep
\ No newline at end of file
+    # 多目标检测 非最大值抑制方法实现，具体实现请打开/sdcard/app/libs/NMS.py查看
+    def nms(self,boxes,scores,thresh,class_ids=None):
+        return nms(boxes,scores,thresh,class_ids,self.agnostic_nms,self.nms_top_k,self.max_boxes_num)
@@ -0,0 +1,75 @@
+# image替身，仅用于主机仿真
+# Image以NumPy数组保存像素，clear、copy_from和填充矩形会修改像素，其余绘制接口只记录调用次数
+import numpy as np
+
+ARGB8888=0
+RGB888=1
+RGB565=2
+GRAYSCALE=3
+RGBP888=4
+YUV420=5
+ALLOC_REF=1
+ALLOC_HEAP=0
+
+# 每种格式的通道数，RGBP888为planar格式
+CHANNELS={ARGB8888:4,RGB888:3,RGB565:2,GRAYSCALE:1,RGBP888:3}
+
+class Image:
+    def __init__(self,width,height,format=ARGB8888,alloc=ALLOC_HEAP,data=None,**kwargs):
+        self.w=width
+        self.h=height
+        self.format=format
+        c=CHANNELS.get(format,1)
+        if format==RGBP888:
+            shape=(c,height,width)
+        else:
+            shape=(height,width,c)
+        if data is not None:
+            # ALLOC_REF时与data共享内存
+            buf=np.frombuffer(data,dtype=np.uint8) if isinstance(data,(bytes,bytearray)) else np.asarray(data).view(np.uint8)
+            self.data=buf.reshape(shape)
+        else:
+            self.data=np.zeros(shape,dtype=np.uint8)
+        # 各绘制接口的调用次数
+        self.calls={}
+
+    def width(self):
+        return self.w
+
+    def height(self):
+        return self.h
+
+    def to_numpy_ref(self):
+        return self.data
+
+    def count(self,name):
+        self.calls[name]=self.calls.get(name,0)+1
+
+    def clear(self):
+        self.count("clear")
+        self.data[...]=0
+
+    def copy_from(self,src):
+        self.count("copy_from")
+        self.data.reshape(-1)[:]=src.data.reshape(-1)
+
+    def copy_to(self,dst):
+        self.count("copy_to")
+        dst.copy_from(self)
+
+    def draw_rectangle(self,*args,**kwargs):
+        self.count("draw_rectangle")
+        if kwargs.get("fill") and self.format!=RGBP888:
+            x,y,w,h=args[0][:4] if isinstance(args[0],tuple) else args[:4]
+            color=kwargs.get("color",0)
+            c=self.data.shape[2]
+            value=np.array(color if isinstance(color,tuple) else [color]*c,dtype=np.uint8)[:c]
+            self.data[max(0,y):y+h,max(0,x):x+w]=value
+
+    # 其它绘制接口只记录调用
+    def __getattr__(self,name):
+        if name.startswith("draw"):
+            def draw(*args,**kwargs):
+                self.count(name)
+            return draw
+        raise AttributeError(name)
@@ -0,0 +1 @@
+# media替身包，仅用于主机仿真
@@ -0,0 +1,34 @@
+# media.display替身，仅用于主机仿真，show_image只记录显示的帧数和最后一次显示的图像
+from media.media import ALIGN_UP
+
+class Display:
+    LT9611=0
+    ST7701=1
+    VIRT=2
+    LAYER_VIDEO1=0
+    LAYER_VIDEO2=1
+    LAYER_OSD0=2
+    LAYER_OSD1=3
+    LAYER_OSD2=4
+    LAYER_OSD3=5
+    # 显示的帧数和最后一次显示的图像
+    shown=0
+    last_image=None
+
+    @staticmethod
+    def init(*args,**kwargs):
+        Display.shown=0
+        Display.last_image=None
+
+    @staticmethod
+    def deinit():
+        pass
+
+    @staticmethod
+    def bind_layer(*args,**kwargs):
+        pass
+
+    @staticmethod
+    def show_image(img,x=0,y=0,layer=None,**kwargs):
+        Display.shown+=1
+        Display.last_image=img
@@ -0,0 +1,14 @@
+# media.media替身，仅用于主机仿真
+
+# 向上对齐
+def ALIGN_UP(x,align):
+    return (x+align-1)//align*align
+
+class MediaManager:
+    @staticmethod
+    def init():
+        return 0
+
+    @staticmethod
+    def deinit():
+        return 0
@@ -0,0 +1,56 @@
+# media.pyaudio替身，仅用于主机仿真
+# 输入流返回静音数据，输出流丢弃写入的数据，均按数据时长阻塞以模拟实时音频
+import time
+
+paInt16=8
+paInt24=4
+paInt32=2
+LEFT=1
+RIGHT=2
+AUDIO_3A_ENABLE_ANS=1
+
+class Stream:
+    def __init__(self,format=paInt16,channels=1,rate=16000,input=False,output=False,frames_per_buffer=1024,**kwargs):
+        self.channels=channels
+        self.rate=rate
+        self.frames_per_buffer=frames_per_buffer
+        self.sample_width={paInt16:2,paInt24:3,paInt32:4}.get(format,2)
+        self.vol=100
+
+    def read(self,frames=None):
+        frames=frames if frames else self.frames_per_buffer
+        time.sleep(frames/self.rate)
+        return bytes(frames*self.channels*self.sample_width)
+
+    def write(self,data):
+        time.sleep(len(data)/(self.rate*self.channels*self.sample_width))
+
+    def volume(self,vol=None,channel=None):
+        if vol is not None:
+            self.vol=vol
+        return self.vol
+
+    def enable_audio3a(self,flags):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+class PyAudio:
+    def initialize(self,chunk):
+        pass
+
+    def open(self,**kwargs):
+        return Stream(**kwargs)
+
+    def get_sample_size(self,format):
+        return {paInt16:2,paInt24:3,paInt32:4}.get(format,2)
+
+    def get_format_from_width(self,width):
+        return {2:paInt16,3:paInt24,4:paInt32}.get(width,paInt16)
+
+    def terminate(self):
+        pass
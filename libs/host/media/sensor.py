@@ -0,0 +1,59 @@
+# media.sensor替身，仅用于主机仿真
+# snapshot按Sim.install传入的frames循环回放RGB888 planar格式的图像帧，未提供时返回全0图像
+import numpy as np
+import image
+from media.media import ALIGN_UP
+
+CAM_CHN_ID_0=0
+CAM_CHN_ID_1=1
+CAM_CHN_ID_2=2
+PIXEL_FORMAT_YUV_SEMIPLANAR_420=0
+PIXEL_FORMAT_RGB_888=1
+PIXEL_FORMAT_RGB_888_PLANAR=2
+PIXEL_FORMAT_RGB_565=3
+PIXEL_FORMAT_GRAYSCALE=4
+
+class Sensor:
+    def __init__(self,id=0,width=1920,height=1080,fps=30,**kwargs):
+        self.fps=fps
+        # 各通道的分辨率
+        self.sizes={}
+        self.frame_index=0
+        self.running=False
+
+    def reset(self):
+        pass
+
+    def set_hmirror(self,enable):
+        pass
+
+    def set_vflip(self,enable):
+        pass
+
+    def set_framesize(self,w=None,h=None,chn=CAM_CHN_ID_0,**kwargs):
+        self.sizes[chn]=(w,h)
+
+    def set_pixformat(self,fmt,chn=CAM_CHN_ID_0):
+        pass
+
+    def bind_info(self,x=0,y=0,chn=CAM_CHN_ID_0):
+        return {}
+
+    def run(self):
+        self.running=True
+
+    def stop(self):
+        self.running=False
+
+    # 获取一帧RGB888 planar图像
+    def snapshot(self,chn=CAM_CHN_ID_0):
+        from libs.Sim import config
+        w,h=self.sizes.get(chn,(1920,1080))
+        img=image.Image(w,h,image.RGBP888)
+        frames=config["frames"]
+        if frames:
+            path=frames[self.frame_index%len(frames)]
+            data=np.fromfile(path,dtype=np.uint8)
+            img.data.reshape(-1)[:data.size]=data[:img.data.size]
+        self.frame_index+=1
+        return img
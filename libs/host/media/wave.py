@@ -0,0 +1,44 @@
+# media.wave替身，仅用于主机仿真，封装Python标准库wave，接口与板端一致
+import wave as _wave
+
+class Wave_read:
+    def __init__(self,f):
+        self.f=f
+
+    def read_frames(self,n):
+        return self.f.readframes(n)
+
+    def get_channels(self):
+        return self.f.getnchannels()
+
+    def get_sampwidth(self):
+        return self.f.getsampwidth()
+
+    def get_framerate(self):
+        return self.f.getframerate()
+
+    def close(self):
+        self.f.close()
+
+class Wave_write:
+    def __init__(self,f):
+        self.f=f
+
+    def set_channels(self,n):
+        self.f.setnchannels(n)
+
+    def set_sampwidth(self,n):
+        self.f.setsampwidth(n)
+
+    def set_framerate(self,n):
+        self.f.setframerate(n)
+
+    def write_frames(self,data):
+        self.f.writeframes(data)
+
+    def close(self):
+        self.f.close()
+
+def open(path,mode="rb"):
+    f=_wave.open(path,mode)
+    return Wave_read(f) if "r" in mode else Wave_write(f)
@@ -0,0 +1,158 @@
+# nncase_runtime替身，仅用于主机仿真
+# kpu按Sim中的回放数据输出录制的tensor，ai2d按输出shape做最近邻缩放
+import numpy as np
+
+# tensor替身，默认与创建它的NumPy数组共享内存
+class RuntimeTensor:
+    def __init__(self,data):
+        self.data=data
+        self.shape=data.shape
+        self.dtype=data.dtype
+
+    # 与板端一致，返回拷贝
+    def to_numpy(self):
+        return self.data.copy()
+
+# Sim.config["tensor_alias"]为False时拷贝数据，模拟tensor与array不共享内存的情况
+def from_numpy(data):
+    from libs.Sim import config
+    return RuntimeTensor(data if config["tensor_alias"] else data.copy())
+
+def shrink_memory_pool():
+    pass
+
+class kpu:
+    def __init__(self):
+        self.name=None
+        self.inputs=[]
+        self.outputs=[]
+        self.output_info=[]
+        # 回放的帧序号和推理次数
+        self.frame_index=0
+        self.run_count=0
+        # 回放目录中可用的帧数，None表示尚未统计
+        self.frame_num=None
+
+    def load_kmodel(self,kmodel_path):
+        from libs import Sim
+        info=Sim.load_model_info(kmodel_path)
+        self.name=Sim.model_name(kmodel_path)
+        self.inputs=[RuntimeTensor(np.zeros(t["shape"],dtype=t["dtype"])) for t in info["inputs"]]
+        self.output_info=info["outputs"]
+        self.outputs=[RuntimeTensor(np.zeros(t["shape"],dtype=t["dtype"])) for t in info["outputs"]]
+
+    def inputs_size(self):
+        return len(self.inputs)
+
+    def outputs_size(self):
+        return len(self.outputs)
+
+    def get_input_tensor(self,index):
+        return self.inputs[index]
+
+    def set_input_tensor(self,index,tensor):
+        self.inputs[index]=tensor
+
+    def get_output_tensor(self,index):
+        return self.outputs[index]
+
+    def set_output_tensor(self,index,tensor):
+        self.outputs[index]=tensor
+
+    # 统计回放目录中的帧数
+    def count_frames(self):
+        from libs.Sim import config
+        import os
+        self.frame_num=0
+        if not config["replay_dir"]:
+            return
+        model_dir=os.path.join(config["replay_dir"],self.name)
+        if not os.path.isdir(model_dir):
+            return
+        while os.path.exists(os.path.join(model_dir,"{}_0.bin".format(self.frame_num))):
+            self.frame_num+=1
+
+    # 推理，将当前帧的回放数据写入输出tensor，没有回放数据时输出保持不变
+    def run(self):
+        from libs.Sim import config
+        import os
+        if self.frame_num is None:
+            self.count_frames()
+        self.run_count+=1
+        if self.frame_num==0:
+            return
+        model_dir=os.path.join(config["replay_dir"],self.name)
+        for i in range(len(self.outputs)):
+            info=self.output_info[i]
+            data=np.fromfile(os.path.join(model_dir,"{}_{}.bin".format(self.frame_index,i)),dtype=info["dtype"])
+            self.outputs[i].data[...]=data.reshape(self.outputs[i].shape)
+        self.frame_index=(self.frame_index+1)%self.frame_num
+
+# ai2d相关枚举
+class ai2d_format:
+    YUV420_NV12=0
+    YUV420_NV21=1
+    YUV420_I420=2
+    NCHW_FMT=3
+    RGB_packed=4
+    RAW16=5
+    NHWC_FMT=6
+
+class interp_method:
+    tf_nearest=0
+    tf_bilinear=1
+    cv2_nearest=2
+    cv2_bilinear=3
+
+class interp_mode:
+    none=0
+    align_corner=1
+    half_pixel=2
+
+class pad_mode:
+    constant=0
+    copy=1
+    mirror=2
+
+# ai2d构造器，run时按输出shape对输入做最近邻缩放，忽略crop/pad/affine等参数
+class ai2d_builder:
+    def __init__(self,input_shape,output_shape):
+        self.input_shape=list(input_shape)
+        self.output_shape=list(output_shape)
+
+    def run(self,input_tensor,output_tensor):
+        src=input_tensor.data
+        dst=output_tensor.data
+        if src.ndim==3:
+            src=src[None]
+        if src.ndim!=4 or dst.ndim!=4 or src.shape[1]!=dst.shape[1]:
+            dst[...]=0
+            return
+        ys=np.arange(dst.shape[2])*src.shape[2]//dst.shape[2]
+        xs=np.arange(dst.shape[3])*src.shape[3]//dst.shape[3]
+        dst[...]=src[:dst.shape[0]][:,:,ys][:,:,:,xs]
+
+class ai2d:
+    def __init__(self):
+        self.params={}
+
+    def set_dtype(self,*args):
+        self.params["dtype"]=args
+
+    def set_crop_param(self,*args):
+        self.params["crop"]=args
+
+    def set_shift_param(self,*args):
+        self.params["shift"]=args
+
+    def set_pad_param(self,*args):
+        self.params["pad"]=args
+
+    def set_resize_param(self,*args):
+        self.params["resize"]=args
+
+    def set_affine_param(self,*args):
+        self.params["affine"]=args
+
+    def build(self,input_shape,output_shape):
+        return ai2d_builder(input_shape,output_shape)
@@ -0,0 +1,2 @@
+# ujson替身，仅用于主机仿真
+from json import *
@@ -0,0 +1 @@
+# ulab替身包，仅用于主机仿真
@@ -0,0 +1,6 @@
+# ulab.numpy替身，主机仿真时直接使用NumPy，补齐ulab特有的名称
+from numpy import *
+import numpy
+
+# ulab的float为单精度浮点
+float = numpy.float32
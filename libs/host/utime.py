@@ -0,0 +1,2 @@
+# utime替身，仅用于主机仿真，Sim.install已为time补齐sleep_ms/ticks_ms等接口
+from time import *